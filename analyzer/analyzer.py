@@ -1,8 +1,16 @@
-from typing import Optional, Any, List
+import glob
+import os
+import re
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Any, List, Union
 
 from langchain_aws import BedrockLLM
 from langchain_community.embeddings import BedrockEmbeddings
 from langchain_core.documents import Document
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables import RunnableLambda
 from langchain_openai import OpenAIEmbeddings,ChatOpenAI
 from langchain_text_splitters import RecursiveCharacterTextSplitter, CharacterTextSplitter
 from langchain_classic.chains.retrieval import create_retrieval_chain
@@ -13,17 +21,66 @@ from langchain_ollama import ChatOllama, OllamaEmbeddings
 from langchain_community.document_loaders import TextLoader
 from pydantic import SecretStr
 
-from utils.prompts import prompt_template
+from utils.anomaly import detect_anomalies, is_anomaly_question, load_anomalies, save_anomalies
+from utils.cascade import CascadeMetrics, LLMCascade
+from utils.chunk_store import ChunkStore, group_records, upsert_references
+from utils.conversation import Conversation, Conversations, follow_up_window, is_follow_up, \
+    names_new_entities
+from utils.correlation import CorrelationIndex
+from utils.embedding_batcher import BatchingEmbeddings
+from utils.local_rerank import LocalMMRRetriever, Reranker, VectorCache
+from utils.log_parser import parse_file
+from utils.prompts import conversation_prompt_template, prompt_template, rewrite_prompt_template, \
+    summary_prompt_template
+from utils.quantized_store import QuantizedVectorStore
+from utils.record_cache import RecordCache, fingerprint, path_key, question_levels
+from utils.sampling import SamplingReport, annotate, budget_from_cost, stratified_sample
+from utils.rate_limiter import RateBudget, RateLimitedEmbeddings, RateLimitedLLM
+from utils.retrieval_config import RetrievalConfig
+from utils.sharded_ingest import parse_sharded
+from utils.summary_tree import SummaryTree, is_summary_question, node_label, parse_time_range, segment_records
+from utils.triage import TriageAnswer, TriageSet, load_questions
+from utils.trigram_index import GrepIntent, TrigramIndex, grep_intent
+
+# every time range parse_time_range understands has a clock time in it
+_CLOCK = re.compile(r"\b\d{1,2}:\d{2}\b")
+# grep-like answers list at most this many lines
+_GREP_LIMIT = 50
 
 
 class Analyzer:
 
     def __init__(self, openai_api_key: Optional[str] = None, pinecone_api_key: Optional[str] = None,
                  index_name: Optional[str] = None, model_vendor: str = None,
-                 llm_model: str = None, embedding_model: str = None, skip_create_index = True):
+                 llm_model: str = None, embedding_model: str = None, skip_create_index = True,
+                 vector_backend: str = "pinecone", local_index_path: Optional[str] = None,
+                 embedding_dimension: int = 1024, quantization: str = "int8", truncate_dim: Optional[int] = None,
+                 rate_limits: Optional[dict] = None, chunk_store: bool = False, compress_chunks: bool = False,
+                 explain_matches: bool = False, id_patterns: Optional[List[str]] = None,
+                 retrieval_config: Optional[Union[str, RetrievalConfig]] = None, local_mmr: bool = False,
+                 reranker: Optional[Reranker] = None, vector_cache_size: int = 50_000,
+                 query_batching: Optional[dict] = None, record_cache: bool = False,
+                 fast_llm_model: Optional[str] = None, fast_llm_vendor: str = "ollama",
+                 triage_questions: Optional[Union[str, List[str]]] = None, triage_workers: int = 2):
         self.openai_api_key = openai_api_key
         self.pinecone_api_key = pinecone_api_key
         self.index_name = index_name
+        self.vector_backend = vector_backend
+        self.local_index_path = local_index_path or f"indexes/{index_name}"
+        self.embedding_dimension = embedding_dimension
+        self.anomalies = {}
+        self.summary_trees = {}
+        self.compress_chunks = compress_chunks
+        self.sampling = {}
+        self.ingest_stats = {}
+        self.trigram_indexes = {}
+        self.explain_matches = explain_matches
+        self.conversations = Conversations()
+        # chunking and retriever settings, e.g. the recommendation written by `cli.py tune`
+        self.retrieval_config = RetrievalConfig.resolve(retrieval_config)
+        self.local_mmr = local_mmr
+        self.reranker = reranker
+        self.vector_cache = VectorCache(vector_cache_size)
         if model_vendor == "ollama":
             self.llm = ChatOllama(model=llm_model)
             self.embeddings = PineconeEmbeddings(model="llama-text-embed-v2", pinecone_api_key = SecretStr(self.pinecone_api_key))
@@ -37,20 +94,126 @@ class Analyzer:
                 credentials_profile_name="default",
                 model_id=llm_model)
 
+        if rate_limits:
+            # budgets are shared per model, so concurrent ingests and queries in this process draw from one limit
+            self.embeddings = RateLimitedEmbeddings(
+                self.embeddings, RateBudget.shared(f"{model_vendor}:{embedding_model}", **rate_limits))
+            self.llm = RateLimitedLLM(self.llm, RateBudget.shared(f"{model_vendor}:{llm_model}", **rate_limits))
+        self.cascade = None
+        if fast_llm_model:
+            # lookup questions are answered by the fast model first, see utils/cascade.py
+            fast_llm = self._chat_model(fast_llm_vendor, fast_llm_model)
+            if rate_limits:
+                fast_llm = RateLimitedLLM(fast_llm, RateBudget.shared(f"{fast_llm_vendor}:{fast_llm_model}",
+                                                                      **rate_limits))
+            self.cascade = LLMCascade(fast_llm, self.llm, CascadeMetrics(
+                os.path.join(self.local_index_path, "metrics", "cascade.jsonl")))
+        if query_batching is not None:
+            # questions asked concurrently by analyzers with the same model and client settings share one request
+            self.embeddings = BatchingEmbeddings.shared(f"{model_vendor}:{embedding_model}", self.embeddings,
+                                                        **query_batching)
+
         self.vector_store = None
-        self.pc = Pinecone(api_key=self.pinecone_api_key)
+        self.pc = None
+        if self.vector_backend != "local":
+            self.pc = Pinecone(api_key=self.pinecone_api_key)
         if not skip_create_index:
             self.create_index()
-        self.vector_store = PineconeVectorStore(index_name=self.index_name, embedding=self.embeddings)
+        if self.vector_backend == "local":
+            # int8 / binary codes in memory, full precision vectors memory-mapped from disk for rescoring
+            self.vector_store = QuantizedVectorStore(self.local_index_path, embedding=self.embeddings,
+                                                     dimension=embedding_dimension, quantization=quantization,
+                                                     truncate_dim=truncate_dim)
+        else:
+            self.vector_store = PineconeVectorStore(index_name=self.index_name, embedding=self.embeddings)
+        # vectors only carry a chunk id, texts are read back from the log file through the chunk store
+        self.chunk_store = ChunkStore(os.path.join(self.local_index_path, "chunks")) if chunk_store else None
+        # parsed records by file fingerprint, re-ingesting an unchanged log skips parsing
+        self.record_cache = RecordCache(os.path.join(self.local_index_path, "records")) if record_cache else None
+        self._load_trigram_indexes()
+        self._load_summary_trees()
+        self._load_sampling_reports()
+        self._load_anomalies()
+        self.triage_questions = load_questions(triage_questions)
+        self.triage_workers = triage_workers
+        self.triage = {}
+        self._triage_pool = None
+        self._load_triage()
+        # trace / request ids of every ingested file, loaded from an earlier ingest when there is one
+        self.correlation = CorrelationIndex(os.path.join(self.local_index_path, "correlation"), id_patterns)
+
 
+    @staticmethod
+    def _chat_model(vendor: str, model: str):
+        if vendor == "ollama":
+            return ChatOllama(model=model)
+        if vendor == "openai":
+            return ChatOpenAI(model=model)
+        if vendor == "bedrock":
+            return BedrockLLM(credentials_profile_name="default", model_id=model)
+        raise ValueError(f"unknown model vendor {vendor}")
 
-    def ingest(self, file_path: str) -> int:
+    def ingest(self, file_path: str, anomalies: bool = False, window_seconds: float = 60.0,
+               summaries: bool = False, summary_mode: str = "time", summary_workers: int = 4,
+               max_vectors: Optional[int] = None, max_cost: Optional[float] = None, trigrams: bool = False,
+               correlation: bool = False, shard_workers: int = 1, triage: bool = False) -> int:
 
         print("ingestion started......")
 
+        if trigrams:
+            self.build_trigram_index(file_path)
+
+        budgeted = max_vectors is not None or max_cost is not None
+        chunks = None
+        key = fingerprint(file_path) if self.record_cache is not None else None
+        cached = self.record_cache.metadata(file_path, key) if key else None
+        if cached is not None:
+            records = list(self.record_cache.scan(file_path, meta=cached))
+            print(f"records read from cache {len(records)}......")
+        elif shard_workers > 1:
+            # one big file is parsed, templated and chunked in byte range shards on worker processes
+            queue_path = self._artifact_path("queue", file_path)
+            print(f"sharding through {queue_path}, more machines can help with `cli.py worker {queue_path}`......")
+            parsed = parse_sharded(file_path, queue_path,
+                                   workers=shard_workers, chunk_size=self.retrieval_config.chunk_size)
+            self.ingest_stats[file_path] = parsed.stats
+            print(f"parsed {parsed.stats.records} records in {parsed.shards} shards......")
+            records, chunks = parsed.records, parsed.chunks
+            if self.record_cache is not None:
+                self.record_cache.write(file_path, records, key)
+        elif self.record_cache is not None:
+            records = self.record_cache.records(file_path, key)
+        else:
+            records = parse_file(file_path) \
+                if anomalies or summaries or budgeted or correlation or self.chunk_store is not None else None
+        if correlation:
+            print(f"correlation ids indexed {self.correlation.add_records(file_path, records)}")
+        if anomalies:
+            self.anomalies[file_path] = detect_anomalies(records, window_seconds=window_seconds)
+            save_anomalies(self._artifact_path("anomalies", file_path, ".json"), self.anomalies[file_path], file_path)
+            print(f"anomalies detected {len(self.anomalies[file_path])}")
+        if summaries:
+            self.build_summaries(file_path, records, summary_mode, summary_workers)
+
+        # cached records are chunked and embedded from the cache, never parsed again from the raw text
+        if self.chunk_store is not None or budgeted or chunks is not None or self.record_cache is not None:
+            count = self._ingest_records(file_path, records, max_vectors, max_cost, chunks)
+        else:
+            count = self._ingest_text(file_path)
+        if triage:
+            # the usual first questions are answered in the background while the user reads the ingest result
+            self.start_triage(file_path)
+        return count
+
+    def _artifact_path(self, kind: str, file_path: str, suffix: str = "") -> str:
+        # keyed by the absolute path, logs with the same name in different directories get their own artifacts
+        return os.path.join(self.local_index_path, kind, f"{path_key(file_path)}{suffix}")
+
+    def _ingest_text(self, file_path: str) -> int:
         loaded_docs :list[Document] = TextLoader(file_path).load()
 
-        splitter = RecursiveCharacterTextSplitter(chunk_size=100, chunk_overlap=0)
+        splitter = RecursiveCharacterTextSplitter(chunk_size=self.retrieval_config.chunk_size,
+                                                  chunk_overlap=self.retrieval_config.chunk_overlap)
         chunks = splitter.split_documents(loaded_docs)
 
         print(f"chunks to ingest {len(chunks)}")
@@ -60,30 +223,347 @@ class Analyzer:
         print("ingestion completed......")
         return len(chunks)
 
+    def _ingest_records(self, file_path: str, records, max_vectors: Optional[int] = None,
+                        max_cost: Optional[float] = None, chunks=None) -> int:
+        if chunks is None:
+            chunks = group_records(records, chunk_size=self.retrieval_config.chunk_size)
+        kept, weights = list(range(len(chunks))), [1.0] * len(chunks)
+        if max_vectors is not None or max_cost is not None:
+            budgets = [max_vectors, budget_from_cost(chunks, max_cost) if max_cost is not None else None]
+            kept, weights, report = stratified_sample(chunks, min(b for b in budgets if b is not None))
+            report.source = file_path
+            report.save(self._artifact_path("sampling", file_path, ".json"))
+            self.sampling[file_path] = report
+            print(f"sampled {report.kept_chunks} of {report.total_chunks} chunks......")
+
+        print(f"chunks to ingest {len(kept)}")
+        texts = ["\n".join(r.text for r in chunks[i]) for i in kept]
+        if self.chunk_store is not None:
+            # every chunk goes into the chunk store so skipped ones are still there as neighbouring context
+            file_id = self.chunk_store.add_file(file_path, compress=self.compress_chunks)
+            chunk_ids = self.chunk_store.add_chunks(file_id, chunks)
+            metadatas = [{**self.chunk_store.metadata(chunk_ids[i]), "sample_weight": w} for i, w in zip(kept, weights)]
+            upsert_references(self.vector_store, texts, metadatas, [str(chunk_ids[i]) for i in kept])
+        else:
+            self.vector_store.add_documents([Document(page_content=text, metadata={"source": file_path, "sample_weight": w})
+                                             for text, w in zip(texts, weights)])
+        print("ingestion completed......")
+        return len(kept)
+
+    def _annotate_samples(self, docs: List[Document]) -> List[Document]:
+        return [Document(id=d.id, page_content=annotate(d.page_content, d.metadata.get("sample_weight")),
+                         metadata=d.metadata) for d in docs]
+
+    def build_summaries(self, file_path: str, records, mode: str = "time", workers: int = 4) -> SummaryTree:
+        summarize_chain = summary_prompt_template | self.llm | StrOutputParser()
+        segments = segment_records(records, mode=mode)
+        print(f"summarizing {len(segments)} segments......")
+        tree = SummaryTree.build(segments, lambda text: summarize_chain.invoke({"input": text}),
+                                 workers=workers, source=file_path)
+        tree.save(self._artifact_path("summaries", file_path, ".json"))
+        self.summary_trees[file_path] = tree
+        return tree
+
+    def summary_documents(self, prompt: str) -> List[Document]:
+        docs = []
+        for source, tree in self.summary_trees.items():
+            if tree.root is None:
+                continue
+            start, end = parse_time_range(prompt, tree.root.start)
+            for node in tree.covering(start, end):
+                docs.append(Document(page_content=f"{node_label(node)}\n{node.summary}",
+                                     metadata={"source": source, "kind": "summary", "level": node.level}))
+        return docs
+
+    def _load_trigram_indexes(self):
+        # indexes from an earlier ingest, so a query-only process still answers lookups exactly
+        for path in sorted(glob.glob(os.path.join(self.local_index_path, "trigrams", "*.npz"))):
+            index = TrigramIndex.load(path)
+            if os.path.exists(index.file_path):
+                self.trigram_indexes[index.file_path] = index
+
+    def _load_summary_trees(self):
+        # trees from an earlier ingest, so a query-only process still answers summary questions from them
+        for path in sorted(glob.glob(os.path.join(self.local_index_path, "summaries", "*.json"))):
+            tree = SummaryTree.load(path)
+            if tree.source and os.path.exists(tree.source):
+                self.summary_trees[tree.source] = tree
+
+    def _load_sampling_reports(self):
+        # answers in a query-only process still mark sampled hits with the weights stored on the vectors
+        for path in sorted(glob.glob(os.path.join(self.local_index_path, "sampling", "*.json"))):
+            report = SamplingReport.load(path)
+            if report.source:
+                self.sampling[report.source] = report
+
+    def _load_anomalies(self):
+        # anomalies from an earlier ingest, "what went wrong" questions in a query-only process still get them
+        for path in sorted(glob.glob(os.path.join(self.local_index_path, "anomalies", "*.json"))):
+            source, found = load_anomalies(path)
+            if source and os.path.exists(source):
+                self.anomalies[source] = found
+
+    def _load_triage(self):
+        # answers from an earlier ingest are served as long as the log did not change since
+        for path in sorted(glob.glob(os.path.join(self.local_index_path, "triage", "*.json"))):
+            triage = TriageSet.load(path)
+            if triage.is_current():
+                self.triage[triage.file_path] = triage
+
+    def start_triage(self, file_path: str, refresh: bool = False) -> TriageSet:
+        """Answer the triage questions about a file in the background, at most triage_workers at a time."""
+        if self._triage_pool is None:
+            self._triage_pool = ThreadPoolExecutor(max_workers=self.triage_workers, thread_name_prefix="triage")
+        triage = self.triage.get(file_path)
+        if triage is None or not triage.is_current():
+            path = self._artifact_path("triage", file_path, ".json")
+            triage = TriageSet(path, file_path, self.triage_questions)
+        # latest ingest first, its answers win when several files were triaged
+        self.triage.pop(file_path, None)
+        self.triage[file_path] = triage
+        triage.start(lambda question: self.rag(question, use_triage=False), self._triage_pool, refresh=refresh)
+        print(f"triage started for {len(triage.questions)} questions......")
+        return triage
+
+    def refresh_triage(self, file_path: Optional[str] = None) -> Optional[TriageSet]:
+        """Recompute the triage answers of a file, the latest triaged file by default."""
+        file_path = file_path or next(reversed(self.triage), None)
+        return self.start_triage(file_path, refresh=True) if file_path else None
+
+    def triage_answer(self, prompt: str, file_path: Optional[str] = None) -> Optional[TriageAnswer]:
+        """
+        The stored answer about file_path, or about the only triaged file when none
+        is given. With several files the question could be about any of them, so
+        it goes through retrieval instead.
+        """
+        if file_path is None:
+            if len(self.triage) != 1:
+                return None
+            file_path = next(iter(self.triage))
+        triage = self.triage.get(file_path)
+        if triage is None or not triage.is_current():
+            return None
+        return triage.get(prompt)
+
+    def build_trigram_index(self, file_path: str) -> TrigramIndex:
+        index = TrigramIndex.build(file_path)
+        index.save(self._artifact_path("trigrams", file_path, ".npz"))
+        self.trigram_indexes[file_path] = index
+        print(f"trigram index built, {index.nbytes} bytes......")
+        return index
+
+    def grep_documents(self, intent: GrepIntent, limit: int = _GREP_LIMIT) -> List[Document]:
+        docs = []
+        for source, index in self.trigram_indexes.items():
+            for hit in index.search(intent.pattern, regex=intent.regex, limit=limit - len(docs)):
+                docs.append(Document(page_content=hit.text, metadata={"source": source, "offset": hit.offset,
+                                                                      "line": hit.line + 1, "kind": "match"}))
+            if len(docs) >= limit:
+                break
+        return docs
+
+    def _grep_answer(self, intent: GrepIntent, docs: List[Document], truncated: bool = False):
+        if not docs:
+            answer = f"No lines match '{intent.pattern}'."
+        else:
+            lines = "\n".join(f"{d.metadata['source']}:{d.metadata['line']}: {d.page_content}" for d in docs)
+            # the search stops at the limit, past it the total is unknown
+            count = f"More than {len(docs)} lines match '{intent.pattern}', the first {len(docs)}" if truncated \
+                else f"{len(docs)} lines match '{intent.pattern}'"
+            answer = f"{count}:\n{lines}"
+        sources = sorted({d.metadata["source"] for d in docs})
+        contexts = [d.page_content for d in docs]
+        print(f"answer : {answer}")
+        print("rag flow completed......")
+        return answer, sources, contexts
+
     def create_index(self):
+        if self.vector_backend == "local":
+            shutil.rmtree(self.local_index_path, ignore_errors=True)
+            print(f"index {self.local_index_path} created......")
+            return
+
         if self.pc.has_index(self.index_name):
             self.pc.delete_index(self.index_name)
 
         self.pc.create_index(
             name=self.index_name,
             spec=ServerlessSpec(cloud="aws", region="us-east-1"),
-            dimension=1024
+            dimension=self.embedding_dimension
         )
         print(f"index {self.index_name} created......")
 
-    def rag(self, prompt: str):
+    def anomaly_documents(self, top_n: int = 5) -> List[Document]:
+        ranked = sorted(((a, source) for source, found in self.anomalies.items() for a in found),
+                        key=lambda item: item[0].score, reverse=True)
+        return [Document(page_content=a.describe(), metadata={"source": source, "offset": a.offset, "kind": "anomaly"})
+                for a, source in ranked[:top_n]]
+
+    def timeline_documents(self, text: str, max_ids: int = 2) -> List[Document]:
+        docs = []
+        for identifier in self.correlation.find_ids(text)[:max_ids]:
+            events = self.correlation.timeline(identifier)
+            if len(events) < 2:
+                continue
+            lines = "\n".join(f"{os.path.basename(e.source)}: {e.text}" for e in events)
+            docs.append(Document(page_content=f"Timeline of {identifier} across services:\n{lines}",
+                                 metadata={"source": events[0].source, "kind": "timeline", "id": identifier,
+                                           "sources": sorted({e.source for e in events})}))
+        return docs
+
+    def _with_timelines(self, retriever):
+        # ids in the question, or else in the top hit, pull the whole request across every ingested log
+        def retrieve(query):
+            docs = retriever.invoke(query)
+            timelines = self.timeline_documents(query)
+            if not timelines and docs:
+                timelines = self.timeline_documents(docs[0].page_content, max_ids=1)
+            return timelines + docs
+        return RunnableLambda(retrieve)
+
+    @staticmethod
+    def _retrieval_step(retriever):
+        # create_retrieval_chain hands anything but a BaseRetriever the whole input dict, our wrappers take the question
+        if isinstance(retriever, BaseRetriever):
+            return retriever
+        return RunnableLambda(lambda inputs: inputs["input"]) | retriever
+
+    def _with_anomalies(self, retriever):
+        # "what went wrong" questions get the strongest anomalies first, then the similarity hits
+        return RunnableLambda(lambda query: self.anomaly_documents() + retriever.invoke(query))
+
+    def time_range_documents(self, prompt: str, limit: int = 50) -> List[Document]:
+        """Cached records inside a time range named in the question, only row groups overlapping it are read."""
+        if not _CLOCK.search(prompt):
+            return []
+        docs = []
+        for source in self.record_cache.sources():
+            stats = self.record_cache.stats(source)
+            start, end = parse_time_range(prompt, stats["first_timestamp"])
+            if start is None:
+                continue
+            for record in self.record_cache.scan(source, start, end, question_levels(prompt)):
+                docs.append(Document(page_content=record.text,
+                                     metadata={"source": source, "offset": record.offset, "kind": "time_range"}))
+                if len(docs) >= limit:
+                    return docs
+        return docs
+
+    def _with_time_range(self, retriever):
+        # "what happened between 10:00 and 10:05" gets the records of that window, then the similarity hits
+        return RunnableLambda(lambda query: self.time_range_documents(query) + retriever.invoke(query))
+
+    def _neighbour_documents(self, conversation: Conversation, before: int, after: int) -> List[Document]:
+        known = conversation.chunk_ids()
+        ids = sorted({n for chunk_id in conversation.last_chunk_ids
+                      for n in self.chunk_store.neighbours(chunk_id, before, after)} - known)
+        return [Document(page_content=self.chunk_store.text(i), metadata=self.chunk_store.metadata(i)) for i in ids]
+
+    def _rewrite(self, conversation: Conversation, prompt: str) -> str:
+        # rewriting a follow-up is a lookup sized task, the fast model does it when there is one
+        llm = self.cascade.fast if self.cascade is not None else self.llm
+        rewrite_chain = rewrite_prompt_template | llm | StrOutputParser()
+        query = rewrite_chain.invoke({"previous": conversation.last_question, "input": prompt}).strip()
+        print(f"follow-up rewritten : {query}")
+        return query or prompt
+
+    def _converse(self, prompt: str, session_id: str, retriever):
+        conversation = self.conversations.get(session_id)
+        follow_up = bool(conversation.context) and is_follow_up(prompt)
+        # a follow-up bringing up new times or entities still needs a search, the neighbours may not cover them
+        walk = follow_up and not names_new_entities(prompt)
+        if walk and self.chunk_store is not None and conversation.last_chunk_ids:
+            # the follow-up refers back, walk to the neighbouring chunks instead of searching again
+            docs = self._neighbour_documents(conversation, *follow_up_window(prompt))
+        else:
+            if not follow_up:
+                conversation.reset_context()
+            # only a follow-up that needs a fresh search pays for a rewrite
+            docs = retriever.invoke(self._rewrite(conversation, prompt) if follow_up else prompt)
+        context = conversation.extend(docs)
+
+        answer = self._answer(conversation_prompt_template,
+                              {"context": context, "input": prompt, "history": list(conversation.history)}, prompt)
+        conversation.record(prompt, answer)
+
+        sources = sorted({d.metadata.get("source") for d in context if d.metadata.get("source")})
+        contexts = [d.page_content for d in context]
+        print(f"answer : {answer}")
+        print(f"sources : {sources}")
+        print("rag flow completed......")
+        return answer, sources, contexts
+
+    def _answer(self, template, inputs: dict, prompt: str) -> str:
+        if self.cascade is None:
+            return create_stuff_documents_chain(self.llm, template).invoke(inputs)
+        return self.cascade.answer(lambda llm: create_stuff_documents_chain(llm, template), inputs, prompt,
+                                   inputs["context"])
+
+    def local_retriever(self) -> LocalMMRRetriever:
+        """Candidates without embeddings from the vector store, vectors from the local cache, MMR on this side."""
+        cfg = self.retrieval_config
+        return LocalMMRRetriever(self.vector_store, self.embeddings, self.vector_cache, k=cfg.k, fetch_k=cfg.fetch_k,
+                                 lambda_mult=cfg.lambda_mult if cfg.search_type == "mmr" else 1.0,
+                                 reranker=self.reranker,
+                                 resolve=self.chunk_store.resolve if self.chunk_store is not None else None)
+
+    def rag(self, prompt: str, session_id: Optional[str] = None, use_triage: bool = True,
+            file_path: Optional[str] = None):
         print("rag flow started......")
+        cached = self.triage_answer(prompt, file_path) if use_triage and prompt and self.triage else None
+        if cached is not None:
+            print("answer served from triage......")
+            if session_id is not None:
+                conversation = self.conversations.get(session_id)
+                conversation.reset_context()
+                conversation.extend([Document(page_content=c) for c in cached.contexts])
+                conversation.record(prompt, cached.answer)
+            return cached.answer, cached.sources, cached.contexts
         # search_kwargs = {"k": 1000} for similarity_search
         # retrieval
-        retriever = self.vector_store.as_retriever(search_type="mmr") #, search_kwargs=search_kwargs
+        retriever = RunnableLambda(self.local_retriever()) if self.local_mmr else \
+            self.vector_store.as_retriever(search_type=self.retrieval_config.search_type,
+                                           search_kwargs=self.retrieval_config.search_kwargs())
+        intent = grep_intent(prompt) if self.trigram_indexes else None
+        # one match past the limit tells a complete answer from a truncated one
+        matches = self.grep_documents(intent, limit=_GREP_LIMIT + 1) if intent else []
+        truncated = len(matches) > _GREP_LIMIT
+        matches = matches[:_GREP_LIMIT]
+        if matches or (intent and intent.explicit):
+            # grep-like questions are answered exactly from the trigram index, the llm only explains the hits
+            if not self.explain_matches or not matches:
+                return self._grep_answer(intent, matches, truncated)
+            retriever = RunnableLambda(lambda query: matches)
+        elif self.summary_trees and is_summary_question(prompt):
+            # whole-log and time range summaries are read from the precomputed tree instead of a few MMR chunks
+            retriever = RunnableLambda(self.summary_documents)
+        else:
+            if self.anomalies and is_anomaly_question(prompt):
+                retriever = self._with_anomalies(retriever)
+            # "what happened between 10:00 and 10:05" is an anomaly question too, the window still comes first
+            if self.record_cache is not None:
+                retriever = self._with_time_range(retriever)
+        if self.chunk_store is not None:
+            retriever = retriever | RunnableLambda(self.chunk_store.resolve)
+        if self.sampling:
+            retriever = retriever | RunnableLambda(self._annotate_samples)
+        if len(self.correlation):
+            retriever = self._with_timelines(retriever)
+        if session_id is not None and prompt:
+            return self._converse(prompt, session_id, retriever)
 
         # chain
         qa_chain = create_stuff_documents_chain(self.llm, prompt_template)
         # augmentation (query + context)
-        rag_chain = create_retrieval_chain(retriever, qa_chain)
+        rag_chain = create_retrieval_chain(self._retrieval_step(retriever), qa_chain)
 
         if prompt:
-            response = rag_chain.invoke({"input": prompt})
+            if self.cascade is not None:
+                docs = retriever.invoke(prompt)
+                response = {"answer": self._answer(prompt_template, {"context": docs, "input": prompt}, prompt),
+                            "context": docs}
+            else:
+                response = rag_chain.invoke({"input": prompt})
 
             answer: str = response["answer"]
             docs: List[Document] = response["context"]
@@ -2,8 +2,10 @@ import streamlit as st
 from analyzer.analyzer import Analyzer
 import os
 from utils.validator import FileValidator
+from utils.local_rerank import LexicalRecencyReranker
 from dotenv import load_dotenv
 import tempfile
+import uuid
 
 load_dotenv()
 
@@ -15,6 +17,35 @@ llm_model = os.getenv("LLM_MODEL")
 embedding_model = os.getenv("EMBEDDING_MODEL")
 skip_create_index = os.getenv("SKIP_INDEX_CREATE")
 skip_ingest = os.getenv("SKIP_INGEST")
+vector_backend = os.getenv("VECTOR_BACKEND", "pinecone")
+local_index_path = os.getenv("LOCAL_INDEX_PATH")
+quantization = os.getenv("QUANTIZATION", "int8")
+truncate_dim = int(os.getenv("TRUNCATE_DIM")) if os.getenv("TRUNCATE_DIM") else None
+detect_anomalies = os.getenv("ANOMALY_DETECTION") == "true"
+build_summaries = os.getenv("SUMMARY_TREE") == "true"
+trigram_index = os.getenv("TRIGRAM_INDEX") == "true"
+explain_matches = os.getenv("EXPLAIN_MATCHES") == "true"
+correlation_index = os.getenv("CORRELATION_INDEX") == "true"
+retrieval_config = os.getenv("RETRIEVAL_CONFIG")
+local_mmr = os.getenv("LOCAL_MMR") == "true"
+rerank = os.getenv("RERANK") == "true"
+query_batching = {"max_wait": float(os.getenv("QUERY_BATCH_WAIT_MS")) / 1000,
+                  "max_batch": int(os.getenv("QUERY_BATCH_SIZE", 64))} if os.getenv("QUERY_BATCH_WAIT_MS") else None
+ingest_workers = int(os.getenv("INGEST_WORKERS", 1))
+chunk_store = os.getenv("CHUNK_STORE") == "true"
+record_cache = os.getenv("RECORD_CACHE") == "true"
+fast_llm_model = os.getenv("FAST_LLM_MODEL")
+fast_llm_vendor = os.getenv("FAST_LLM_VENDOR", "ollama")
+triage = os.getenv("TRIAGE") == "true"
+triage_questions = os.getenv("TRIAGE_QUESTIONS")
+triage_workers = int(os.getenv("TRIAGE_WORKERS", 2))
+max_vectors = int(os.getenv("INGEST_MAX_VECTORS")) if os.getenv("INGEST_MAX_VECTORS") else None
+max_cost = float(os.getenv("INGEST_MAX_COST")) if os.getenv("INGEST_MAX_COST") else None
+compress_chunks = os.getenv("COMPRESS_CHUNKS") == "true"
+rate_limits = {key: float(os.getenv(env)) for key, env in
+               (("requests_per_minute", "RATE_LIMIT_RPM"), ("tokens_per_minute", "RATE_LIMIT_TPM")) if os.getenv(env)}
+if rate_limits and os.getenv("RATE_LIMIT_TARGET_LATENCY"):
+    rate_limits["target_latency"] = float(os.getenv("RATE_LIMIT_TARGET_LATENCY"))
 
 if 'skip_ingest' not in st.session_state:
     st.session_state.skip_ingest = False
@@ -22,6 +53,8 @@ if 'analyzer' not in st.session_state:
     st.session_state.analyzer = None
 if 'skip_create_index' not in st.session_state:
     st.session_state.skip_create_index = False
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = str(uuid.uuid4())
 
 if skip_create_index == "true":
     st.session_state.skip_create_index = True
@@ -58,7 +91,16 @@ if uploaded_file is not None:
             analyzer = Analyzer(openai_api_key=OPENAI_API_KEY, pinecone_api_key=PINECONE_API_KEY,
                                 index_name=index_name, model_vendor=model_vendor,
                                 llm_model=llm_model, embedding_model=embedding_model,
-                                skip_create_index=st.session_state.skip_create_index)
+                                skip_create_index=st.session_state.skip_create_index,
+                                vector_backend=vector_backend, local_index_path=local_index_path,
+                                quantization=quantization, truncate_dim=truncate_dim,
+                                rate_limits=rate_limits or None, chunk_store=chunk_store,
+                                compress_chunks=compress_chunks, explain_matches=explain_matches,
+                                retrieval_config=retrieval_config, local_mmr=local_mmr,
+                                reranker=LexicalRecencyReranker() if rerank else None,
+                                query_batching=query_batching, record_cache=record_cache,
+                                fast_llm_model=fast_llm_model, fast_llm_vendor=fast_llm_vendor,
+                                triage_questions=triage_questions, triage_workers=triage_workers)
             st.session_state.analyzer = analyzer
         else:
             analyzer = st.session_state.analyzer
@@ -66,7 +108,10 @@ if uploaded_file is not None:
         if not st.session_state.skip_ingest:
             with st.spinner("Ingesting log"):
                 try:
-                    chunk_size = analyzer.ingest(path)
+                    chunk_size = analyzer.ingest(path, anomalies=detect_anomalies, summaries=build_summaries,
+                                                 max_vectors=max_vectors, max_cost=max_cost,
+                                                 trigrams=trigram_index, correlation=correlation_index,
+                                                 shard_workers=ingest_workers, triage=triage)
                     st.success(f"Chunks ingested : {chunk_size}")
                     st.session_state.skip_ingest = True
                     st.session_state.skip_create_index = True
@@ -74,12 +119,28 @@ if uploaded_file is not None:
                     print("Error ingesting log file", e)
                     st.error(f"Error ingesting log file {e}")
 
+        triage_set = analyzer.triage.get(path) if analyzer else None
+        if triage_set is not None:
+            # answered in the background right after ingest, asking one of these again is instant
+            st.header("Triage")
+            if st.button("Refresh triage answers"):
+                triage_set = analyzer.refresh_triage(path)
+            for question, state in triage_set.status().items():
+                cached = triage_set.peek(question)
+                with st.expander(question if state == "ready" else f"{question} ({state})"):
+                    if cached is not None:
+                        st.write(cached.answer)
+                        st.caption(f"sources : {', '.join(cached.sources)}")
+                    else:
+                        st.caption("Being answered in the background, reload the page to see it")
+
         if analyzer:
             st.header("Ask a question about the uploaded log")
             prompt = st.text_input("Enter a question")
             if prompt:
                 try:
-                    answer, sources , contexts = analyzer.rag(prompt)
+                    answer, sources , contexts = analyzer.rag(prompt, session_id=st.session_state.session_id,
+                                                               file_path=path)
                     container = st.empty()
                     container.write(f"{answer}")
                 except Exception as e:
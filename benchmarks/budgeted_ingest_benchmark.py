@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark for budgeted stratified ingestion against full ingestion.
+A synthetic log of repetitive INFO/DEBUG traffic with a few injected incidents
+is ingested in full and under several vector budgets. For each run it reports
+vectors embedded, ingest time (with a simulated embedding latency), recall@k
+of the incident lines for incident questions, and the error of a record count
+estimated from the sampling weights.
+
+    python benchmarks/budgeted_ingest_benchmark.py --lines 200000 --budgets 0.01 0.05 0.2
+"""
+import argparse
+import hashlib
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.chunk_store import group_records
+from utils.log_parser import parse_file
+from utils.quantized_store import QuantizedIndex
+from utils.sampling import stratified_sample
+
+INCIDENTS = [
+    "ERROR payment gateway timeout after 30000ms for merchant acme",
+    "ERROR disk quota exceeded on volume backup-07",
+    "WARN certificate for api.internal expires in 2 days",
+    "ERROR deadlock detected ORA-00060 while updating orders",
+    "FATAL worker pool exhausted, shutting down scheduler",
+]
+QUESTIONS = ["payment gateway timeout merchant", "disk quota exceeded volume", "certificate expires",
+             "deadlock ORA-00060 orders", "worker pool exhausted scheduler"]
+NOISE = ["INFO request {n} served in {ms}ms", "DEBUG cache hit for key user:{n}", "INFO heartbeat from node-{k}",
+         "INFO user {n} logged in", "DEBUG query took {ms}ms rows={k}"]
+
+
+def write_log(path: str, lines: int, seed: int = 3):
+    rng = random.Random(seed)
+    incident_at = {int(lines * (i + 1) / (len(INCIDENTS) + 1)): text for i, text in enumerate(INCIDENTS)}
+    with open(path, "w") as f:
+        for i in range(lines):
+            stamp = f"2024-01-01 {i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d}"
+            text = incident_at.get(i) or rng.choice(NOISE).format(n=rng.randrange(10 ** 6), ms=rng.randrange(500),
+                                                                  k=rng.randrange(16))
+            f.write(f"{stamp} {text}\n")
+
+
+def hashed_embedding(text: str, dimension: int = 256) -> np.ndarray:
+    vector = np.zeros(dimension, dtype=np.float32)
+    for word in re.findall(r"[a-z][a-z\-]+|ora-\d+", text.lower()):
+        vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % dimension] += 1.0
+    return vector
+
+
+def run(lines: int, budgets, k: int, latency_per_1k: float):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.log")
+        write_log(path, lines)
+        start = time.perf_counter()
+        chunks = group_records(parse_file(path))
+        parse_time = time.perf_counter() - start
+        served = sum(1 for chunk in chunks for r in chunk if "served in" in r.text)
+        print(f"{len(chunks)} chunks, parse+chunk {parse_time:.1f}s, simulated embedding {latency_per_1k}s per 1k chunks")
+        print(f"{'budget':>8}{'vectors':>10}{'ingest s':>10}{'recall@' + str(k):>10}{'count err':>11}")
+
+        for budget in [None] + list(budgets):
+            start = time.perf_counter()
+            if budget is None:
+                kept, weights = list(range(len(chunks))), [1.0] * len(chunks)
+            else:
+                kept, weights, _ = stratified_sample(chunks, max(1, int(len(chunks) * budget)))
+            texts = ["\n".join(r.text for r in chunks[i]) for i in kept]
+            index = QuantizedIndex(os.path.join(tmp, f"index-{budget}"), dimension=256, quantization="none")
+            for i in range(0, len(texts), 10000):
+                batch = texts[i:i + 10000]
+                index.add([str(j) for j in range(i, i + len(batch))], np.stack([hashed_embedding(t) for t in batch]))
+            elapsed = time.perf_counter() - start + len(texts) / 1000 * latency_per_1k
+
+            hits = 0
+            for incident, question in zip(INCIDENTS, QUESTIONS):
+                found = [texts[row] for row, _ in index.search(hashed_embedding(question), k)]
+                hits += any(incident in text for text in found)
+            estimate = sum(w for i, w in zip(kept, weights) for r in chunks[i] if "served in" in r.text)
+            label = "full" if budget is None else f"{budget:.0%}"
+            print(f"{label:>8}{len(texts):>10}{elapsed:>10.1f}{hits / len(INCIDENTS):>10.2f}"
+                  f"{abs(estimate - served) / served:>10.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=100000)
+    parser.add_argument("--budgets", type=float, nargs="+", default=[0.01, 0.05, 0.2])
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--latency-per-1k", type=float, default=2.0,
+                        help="simulated provider seconds per 1000 embedded chunks")
+    args = parser.parse_args()
+    run(args.lines, args.budgets, args.k, args.latency_per_1k)
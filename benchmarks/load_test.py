@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Load test for concurrent app sessions against local stand-ins, no network needed.
+Every simulated session follows what app.py does for one browser session:
+upload a log into its own temp dir, build its own Analyzer, ingest, then fire a
+burst of questions. Pinecone, the embeddings and the LLM are replaced by local
+fakes with configurable latency, so the numbers show the cost of our own code
+and of waiting on providers, not of a real network.
+
+Reported: ingest and question throughput, p50/p95/p99 latency, resident memory
+per session (retained while sessions are alive, as in st.session_state) and
+peak thread / socket / file descriptor counts.
+
+    python benchmarks/load_test.py --sessions 20 --questions 10 --lines 5000 --llm-latency 0.5
+"""
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from unittest.mock import patch
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.runnables import RunnableLambda
+from langchain_core.vectorstores import InMemoryVectorStore
+
+from analyzer.analyzer import Analyzer
+from utils.embedding_batcher import BatchingEmbeddings
+
+QUESTIONS = ["What went wrong?", "Summarize the errors", "Which service timed out?",
+             "and what happened right after that?", "show lines containing ORA-00060",
+             "Why did the payment fail?", "How many requests were served?"]
+NOISE = ["INFO [api] request {n} served in {ms}ms request_id=r{n}", "DEBUG [cache] hit for key user:{n}",
+         "INFO [node] heartbeat from node-{k}", "WARN [db] slow query took {ms}ms rows={k}"]
+INCIDENTS = ["ERROR [billing] payment gateway timeout after 30000ms", "ERROR [db] deadlock detected ORA-00060"]
+
+
+def jitter(latency: float) -> float:
+    return latency * random.uniform(0.5, 1.5) if latency else 0.0
+
+
+class FakeEmbeddings(Embeddings):
+    """Hashed bag of words vectors with a provider style delay per call."""
+
+    def __init__(self, dimension: int = 1024, latency: float = 0.0, latency_per_text: float = 0.0):
+        self.dimension = dimension
+        self.latency = latency
+        self.latency_per_text = latency_per_text
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in re.findall(r"[a-z][a-z\-]+|\d+", text.lower()):
+            vector[int(hashlib.md5(word.encode()).hexdigest()[:8], 16) % self.dimension] += 1.0
+        return (vector / (np.linalg.norm(vector) or 1.0)).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(jitter(self.latency) + self.latency_per_text * len(texts))
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(jitter(self.latency))
+        return self._vector(text)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(jitter(self.latency) + self.latency_per_text * len(texts))
+        return [self._vector(t) for t in texts]
+
+
+def fake_llm(latency: float):
+    def respond(prompt) -> str:
+        time.sleep(jitter(latency))
+        return f"answer based on {len(str(prompt))} prompt characters"
+    return RunnableLambda(respond)
+
+
+class FakePinecone:
+    """Control plane stand-in, index creation only records the name."""
+
+    indexes = set()
+
+    def __init__(self, api_key=None, **kwargs):
+        pass
+
+    def has_index(self, name):
+        return name in self.indexes
+
+    def delete_index(self, name):
+        self.indexes.discard(name)
+        FakePineconeVectorStore.stores.pop(name, None)
+
+    def create_index(self, name, **kwargs):
+        self.indexes.add(name)
+
+
+class FakeIndex:
+    """Data plane stand-in over a store's records: the upsert, query and fetch calls the analyzer makes directly."""
+
+    def __init__(self, store: dict, text_key: str = "text"):
+        self.store = store
+        self.text_key = text_key
+
+    def upsert(self, vectors, **kwargs):
+        time.sleep(jitter(FakePineconeVectorStore.latency))
+        for id_, vector, metadata in vectors:
+            metadata = dict(metadata)
+            self.store[id_] = {"id": id_, "vector": list(vector), "text": metadata.pop(self.text_key, ""),
+                               "metadata": metadata}
+        return {"upserted_count": len(vectors)}
+
+    def query(self, vector, top_k: int = 4, include_metadata: bool = True, **kwargs):
+        time.sleep(jitter(FakePineconeVectorStore.latency))
+        records = list(self.store.values())
+        if not records:
+            return {"matches": []}
+        matrix = np.array([r["vector"] for r in records], dtype=np.float32)
+        scores = matrix @ np.asarray(vector, dtype=np.float32)
+        scores /= np.maximum(np.linalg.norm(matrix, axis=1) * np.linalg.norm(vector), 1e-12)
+        return {"matches": [{"id": records[i]["id"], "score": float(scores[i]),
+                             "metadata": {**records[i]["metadata"], self.text_key: records[i]["text"]}}
+                            for i in np.argsort(-scores)[:top_k]]}
+
+    def fetch(self, ids, **kwargs):
+        return {"vectors": {id_: {"values": self.store[id_]["vector"]} for id_ in ids if id_ in self.store}}
+
+
+class FakePineconeVectorStore(InMemoryVectorStore):
+    """In memory index shared by every session using the same index name, like the hosted index."""
+
+    stores = {}
+    latency = 0.0
+
+    def __init__(self, index_name: str, embedding: Embeddings, **kwargs):
+        super().__init__(embedding=embedding)
+        self.store = self.stores.setdefault(index_name, {})
+        # chunk store ingests and local MMR talk to the index itself, not the LangChain wrapper
+        self._text_key = "text"
+        self.index = FakeIndex(self.store, self._text_key)
+
+    def add_documents(self, documents, **kwargs):
+        time.sleep(jitter(self.latency))
+        return super().add_documents(documents, **kwargs)
+
+    def max_marginal_relevance_search_by_vector(self, *args, **kwargs):
+        time.sleep(jitter(self.latency))
+        return super().max_marginal_relevance_search_by_vector(*args, **kwargs)
+
+
+def write_log(path: str, lines: int, seed: int):
+    rng = random.Random(seed)
+    with open(path, "w") as f:
+        for i in range(lines):
+            stamp = f"2024-01-01 {i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d}"
+            text = rng.choice(INCIDENTS) if rng.random() < 0.002 else \
+                rng.choice(NOISE).format(n=rng.randrange(10 ** 6), ms=rng.randrange(500), k=rng.randrange(16))
+            f.write(f"{stamp} {text}\n")
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def open_handles():
+    """(file descriptors, sockets) of this process, (None, None) where /proc is not available."""
+    try:
+        fds = os.listdir("/proc/self/fd")
+    except OSError:
+        return None, None
+    sockets = 0
+    for fd in fds:
+        with contextlib.suppress(OSError):
+            sockets += os.readlink(f"/proc/self/fd/{fd}").startswith("socket:")
+    return len(fds), sockets
+
+
+class Sampler(threading.Thread):
+    """Peak threads, sockets, descriptors and memory while the load runs."""
+
+    def __init__(self, interval: float = 0.1):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = {"threads": 0, "fds": 0, "sockets": 0, "rss": 0}
+        self._stop_event = threading.Event()
+
+    def sample(self):
+        fds, sockets = open_handles()
+        for key, value in (("threads", threading.active_count()), ("fds", fds), ("sockets", sockets),
+                           ("rss", rss_bytes())):
+            if value is not None:
+                self.peak[key] = max(self.peak[key], value)
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.sample()
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.sample()
+
+
+class Session:
+    """One simulated browser session: upload, ingest, question burst."""
+
+    def __init__(self, number: int, args, workdir: str):
+        self.number = number
+        self.args = args
+        self.workdir = workdir
+        self.analyzer = None
+        self.ingest_latency = None
+        self.question_latencies = []
+        self.errors = []
+
+    def run(self, start_at: float):
+        time.sleep(max(0.0, start_at - time.perf_counter()))
+        rng = random.Random(self.number)
+        # app.py writes each upload to a fresh temp dir and keeps one Analyzer per session
+        upload_dir = tempfile.mkdtemp(dir=self.workdir)
+        path = os.path.join(upload_dir, f"session-{self.number}.log")
+        write_log(path, self.args.lines, seed=self.number)
+        try:
+            start = time.perf_counter()
+            self.analyzer = Analyzer(index_name=self.args.index_name, model_vendor="openai",
+                                     vector_backend=self.args.backend,
+                                     local_index_path=os.path.join(upload_dir, "index"),
+                                     chunk_store=self.args.chunk_store, skip_create_index=True,
+                                     query_batching={"max_wait": self.args.batch_wait_ms / 1000}
+                                     if self.args.batch_wait_ms is not None else None)
+            self.analyzer.ingest(path, trigrams=self.args.trigrams)
+            self.ingest_latency = time.perf_counter() - start
+        except Exception as e:
+            self.errors.append(f"ingest: {e}")
+            return
+        for i in range(self.args.questions):
+            time.sleep(jitter(self.args.think))
+            start = time.perf_counter()
+            try:
+                self.analyzer.rag(rng.choice(QUESTIONS), session_id=f"session-{self.number}")
+                self.question_latencies.append(time.perf_counter() - start)
+            except Exception as e:
+                self.errors.append(f"rag: {e}")
+
+
+def percentiles(values: List[float]) -> str:
+    if not values:
+        return "n/a"
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return f"p50 {p50 * 1000:.0f}ms  p95 {p95 * 1000:.0f}ms  p99 {p99 * 1000:.0f}ms  max {max(values) * 1000:.0f}ms"
+
+
+def run(args) -> dict:
+    FakePineconeVectorStore.latency = args.index_latency
+    workdir = tempfile.mkdtemp(prefix="load-test-")
+    embeddings = FakeEmbeddings(dimension=1024, latency=args.embed_latency, latency_per_text=args.embed_latency_per_text)
+    sessions = [Session(n, args, workdir) for n in range(args.sessions)]
+    baseline_rss = rss_bytes()
+    sampler = Sampler()
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(patch("analyzer.analyzer.Pinecone", FakePinecone))
+        stack.enter_context(patch("analyzer.analyzer.PineconeVectorStore", FakePineconeVectorStore))
+        stack.enter_context(patch("analyzer.analyzer.OpenAIEmbeddings", lambda **kwargs: embeddings))
+        stack.enter_context(patch("analyzer.analyzer.ChatOpenAI", lambda **kwargs: fake_llm(args.llm_latency)))
+        if not args.verbose:
+            stack.enter_context(contextlib.redirect_stdout(open(os.devnull, "w")))
+        sampler.start()
+        start = time.perf_counter()
+        # Streamlit runs every session script on its own thread
+        with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+            for future in [pool.submit(s.run, start + n * args.ramp) for n, s in enumerate(sessions)]:
+                future.result()
+        elapsed = time.perf_counter() - start
+        sampler.stop()
+    # sessions are still referenced here, like analyzers kept in st.session_state
+    retained_rss = rss_bytes() - baseline_rss
+
+    batchers = {id(s.analyzer.embeddings): s.analyzer.embeddings.batcher for s in sessions
+                if isinstance(getattr(s.analyzer, "embeddings", None), BatchingEmbeddings)}
+    batcher = next(iter(batchers.values()), None)
+    ingests = [s.ingest_latency for s in sessions if s.ingest_latency is not None]
+    questions = [latency for s in sessions for latency in s.question_latencies]
+    errors = [e for s in sessions for e in s.errors]
+    report = {
+        "sessions": args.sessions, "elapsed_s": elapsed,
+        "ingests": len(ingests), "ingest_latency_s": ingests,
+        "questions": len(questions), "question_latency_s": questions,
+        "questions_per_s": len(questions) / elapsed if elapsed else 0.0,
+        "errors": errors,
+        "query_embed_batches": batcher.batches if batcher else None,
+        "mean_query_batch": batcher.mean_batch_size if batcher else None,
+        "rss_per_session_bytes": retained_rss / max(1, args.sessions),
+        "peak_rss_bytes": sampler.peak["rss"], "peak_threads": sampler.peak["threads"],
+        "peak_fds": sampler.peak["fds"], "peak_sockets": sampler.peak["sockets"],
+    }
+    del sessions
+    shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+def print_report(report: dict):
+    print(f"{report['sessions']} sessions in {report['elapsed_s']:.1f}s, {len(report['errors'])} errors")
+    print(f"ingest    {report['ingests']:>6}  {percentiles(report['ingest_latency_s'])}")
+    print(f"question  {report['questions']:>6}  {percentiles(report['question_latency_s'])}  "
+          f"{report['questions_per_s']:.1f}/s")
+    if report["query_embed_batches"] is not None:
+        print(f"batching  {report['query_embed_batches']} query embedding calls, "
+              f"{report['mean_query_batch']:.1f} questions per call")
+    print(f"memory    {report['rss_per_session_bytes'] / 2 ** 20:.1f} MiB retained per session, "
+          f"peak rss {report['peak_rss_bytes'] / 2 ** 20:.0f} MiB")
+    print(f"handles   peak threads {report['peak_threads']}, fds {report['peak_fds']}, "
+          f"sockets {report['peak_sockets']}")
+    for error in report["errors"][:5]:
+        print(f"error     {error}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--questions", type=int, default=5, help="questions asked by each session")
+    parser.add_argument("--lines", type=int, default=2000, help="lines of each uploaded log")
+    parser.add_argument("--ramp", type=float, default=0.1, help="seconds between session starts")
+    parser.add_argument("--think", type=float, default=0.0, help="mean seconds between questions of a session")
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="seconds per embedding call")
+    parser.add_argument("--embed-latency-per-text", type=float, default=0.0005)
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="seconds per llm call")
+    parser.add_argument("--index-latency", type=float, default=0.02, help="seconds per vector index call")
+    parser.add_argument("--backend", choices=["pinecone", "local"], default="pinecone",
+                        help="fake hosted index shared by all sessions, or a local quantized index per session")
+    parser.add_argument("--batch-wait-ms", type=float, help="batch question embeddings across sessions")
+    parser.add_argument("--index-name", default="load-test")
+    parser.add_argument("--chunk-store", action="store_true")
+    parser.add_argument("--trigrams", action="store_true")
+    parser.add_argument("--json", help="also write the full report to this file")
+    parser.add_argument("--verbose", action="store_true", help="keep the analyzer progress output")
+    args = parser.parse_args()
+    report = run(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
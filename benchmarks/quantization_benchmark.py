@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the quantized local vector index.
+Measures resident memory and recall@k against exact float32 search on
+synthetic embeddings that live near a low dimensional subspace, like real
+sentence embeddings of repetitive log chunks.
+
+    python benchmarks/quantization_benchmark.py --vectors 200000 --dimension 1024
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.quantized_store import QuantizedIndex, truncate
+
+
+def synthetic_vectors(n: int, dimension: int, rank: int, seed: int = 7) -> np.ndarray:
+    basis = np.random.default_rng(0).standard_normal((rank, dimension)).astype(np.float32)
+    rng = np.random.default_rng(seed)
+    latent = rng.standard_normal((n, rank)).astype(np.float32)
+    return latent @ basis + 0.5 * rng.standard_normal((n, dimension)).astype(np.float32)
+
+
+def exact_neighbours(data: np.ndarray, queries: np.ndarray, dimension: int, k: int):
+    exact = truncate(data, dimension)
+    return [set(np.argsort(-(exact @ q))[:k].tolist()) for q in truncate(queries, dimension)]
+
+
+def recall_at_k(index: QuantizedIndex, queries: np.ndarray, truth, k: int):
+    hits = 0
+    start = time.perf_counter()
+    for query, expected in zip(queries, truth):
+        hits += len(expected & {row for row, _ in index.search(query, k)})
+    elapsed = (time.perf_counter() - start) / len(queries) * 1000
+    return hits / (k * len(queries)), elapsed
+
+
+def run_benchmark(n: int, dimension: int, queries: int, k: int, rank: int, rescore_factor):
+    data = synthetic_vectors(n, dimension, rank)
+    query_vectors = synthetic_vectors(queries, dimension, rank, seed=11)
+    ids = [str(i) for i in range(n)]
+    float_bytes = n * dimension * 4
+
+    # synthetic vectors are not Matryoshka trained, so truncated rows are a lower bound on real recall
+    settings = [("none", None), ("int8", None), ("binary", None),
+                ("int8", dimension // 2), ("binary", dimension // 2)]
+    print(f"{'quantization':<14}{'dims':>6}{'memory MB':>12}{'reduction':>11}{'recall@' + str(k):>11}{'ms/query':>10}")
+    for quantization, truncate_dim in settings:
+        with tempfile.TemporaryDirectory() as path:
+            index = QuantizedIndex(path, dimension=dimension, quantization=quantization,
+                                   truncate_dim=truncate_dim, rescore_factor=rescore_factor)
+            for i in range(0, n, 50000):
+                index.add(ids[i:i + 50000], data[i:i + 50000])
+            # recall is measured against exact search in the full model dimension
+            truth = exact_neighbours(data, query_vectors, dimension, k)
+            recall, elapsed = recall_at_k(index, query_vectors, truth, k)
+            memory = index.memory_bytes()
+            print(f"{quantization:<14}{index.dimension:>6}{memory / 2 ** 20:>12.1f}"
+                  f"{float_bytes / memory:>10.1f}x{recall:>11.3f}{elapsed:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=50000)
+    parser.add_argument("--dimension", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rank", type=int, default=64)
+    parser.add_argument("--rescore-factor", type=int, default=None)
+    args = parser.parse_args()
+    run_benchmark(args.vectors, args.dimension, args.queries, args.k, args.rank, args.rescore_factor)
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Command line entry point for the Log Analyzer.
+
+Runs the same Analyzer engine as app.py without Streamlit, so it can be used
+from cron jobs, CI failure triage or incident bots.
+
+    python cli.py ingest logs/*.log --create-index --workers 4
+    python cli.py query --questions questions.txt --output answers.jsonl --workers 8
+    python cli.py run logs/*.log --questions questions.txt --output answers.jsonl
+    python cli.py worker /shared/indexes/logs/queue/huge.log-3f9c2a7d41b08e65
+    python cli.py tune sample.log --pairs pairs.jsonl --output retrieval.json
+"""
+import argparse
+import contextlib
+import glob
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from dotenv import load_dotenv
+
+from analyzer.analyzer import Analyzer
+from utils.local_rerank import LexicalRecencyReranker
+from utils.sharded_ingest import run_worker
+from utils.tuner import format_report, read_pairs, recommend, sweep
+
+
+def expand_paths(patterns: List[str], missing: Optional[List[str]] = None) -> List[str]:
+    """Files matching the patterns, explicit paths that are not files are added to missing."""
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            if os.path.isfile(path):
+                if path not in paths:
+                    paths.append(path)
+            elif missing is not None and not glob.has_magic(pattern):
+                missing.append(path)
+    return paths
+
+
+def read_questions(path: str) -> List[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        lines = [line.strip() for line in f]
+    return [line for line in lines if line and not line.startswith("#")]
+
+
+def rate_limits(rpm: Optional[float], tpm: Optional[float], target_latency: Optional[float] = None) -> Optional[dict]:
+    limits = {}
+    if rpm:
+        limits["requests_per_minute"] = rpm
+    if tpm:
+        limits["tokens_per_minute"] = tpm
+    if limits and target_latency:
+        limits["target_latency"] = target_latency
+    return limits or None
+
+
+def query_batching(wait_ms: Optional[float], batch_size: int) -> Optional[dict]:
+    if wait_ms is None:
+        return None
+    return {"max_wait": wait_ms / 1000, "max_batch": batch_size}
+
+
+def build_analyzer(args, skip_create_index: bool = True) -> Analyzer:
+    return Analyzer(openai_api_key=os.getenv("OPENAI_API_KEY"), pinecone_api_key=os.getenv("PINECONE_API_KEY"),
+                    index_name=args.index_name, model_vendor=args.model_vendor,
+                    llm_model=args.llm_model, embedding_model=args.embedding_model,
+                    skip_create_index=skip_create_index,
+                    vector_backend=args.vector_backend, local_index_path=args.local_index_path,
+                    quantization=args.quantization, truncate_dim=args.truncate_dim,
+                    rate_limits=rate_limits(args.rpm, args.tpm, args.target_latency), chunk_store=args.chunk_store,
+                    compress_chunks=args.compress_chunks, explain_matches=args.explain_matches,
+                    id_patterns=args.id_patterns, retrieval_config=args.retrieval_config,
+                    local_mmr=args.local_mmr, reranker=LexicalRecencyReranker() if args.rerank else None,
+                    query_batching=query_batching(args.batch_wait_ms, args.batch_size),
+                    record_cache=args.record_cache, fast_llm_model=args.fast_llm_model,
+                    fast_llm_vendor=args.fast_llm_vendor,
+                    triage_questions=getattr(args, "triage_questions", None),
+                    triage_workers=getattr(args, "triage_workers", 2))
+
+
+def ingest_files(analyzer: Analyzer, paths: List[str], workers: int = 1, **ingest_kwargs) -> dict:
+    def _ingest(path):
+        try:
+            return path, analyzer.ingest(path, **ingest_kwargs), None
+        except Exception as e:
+            return path, 0, str(e)
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for path, chunks, error in pool.map(_ingest, paths):
+            results[path] = {"chunks": chunks, "error": error}
+            if error:
+                print(f"Error ingesting {path} : {error}", file=sys.stderr)
+    return results
+
+
+def answer_questions(analyzer: Analyzer, questions: List[str], workers: int = 1):
+    def _ask(question):
+        try:
+            answer, sources, contexts = analyzer.rag(question)
+            return {"question": question, "answer": answer, "sources": sources, "contexts": contexts}
+        except Exception as e:
+            return {"question": question, "error": str(e)}
+
+    # results are yielded in question order so the output file is stable across runs
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        yield from pool.map(_ask, questions)
+
+
+def write_jsonl(records, out) -> int:
+    count = 0
+    for record in records:
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+        count += 1
+    return count
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Headless log analysis with the Log Analyzer RAG engine")
+    parser.add_argument("--index-name", default=os.getenv("INDEX_LOG"))
+    parser.add_argument("--model-vendor", default=os.getenv("MODEL_VENDOR"))
+    parser.add_argument("--llm-model", default=os.getenv("LLM_MODEL"))
+    parser.add_argument("--embedding-model", default=os.getenv("EMBEDDING_MODEL"))
+    parser.add_argument("--vector-backend", choices=["pinecone", "local"], default=os.getenv("VECTOR_BACKEND", "pinecone"))
+    parser.add_argument("--local-index-path", default=os.getenv("LOCAL_INDEX_PATH"))
+    parser.add_argument("--quantization", choices=["none", "int8", "binary"], default=os.getenv("QUANTIZATION", "int8"))
+    parser.add_argument("--truncate-dim", type=int, default=int(os.getenv("TRUNCATE_DIM", 0)) or None,
+                        help="keep only the leading dimensions of Matryoshka embeddings")
+    parser.add_argument("--chunk-store", action="store_true", default=os.getenv("CHUNK_STORE") == "true",
+                        help="keep chunk texts in a local offset store instead of the vector metadata")
+    parser.add_argument("--compress-chunks", action="store_true", default=os.getenv("COMPRESS_CHUNKS") == "true",
+                        help="keep a block compressed copy of ingested logs for the chunk store")
+    parser.add_argument("--record-cache", action="store_true", default=os.getenv("RECORD_CACHE") == "true",
+                        help="keep parsed records in a columnar cache, re-ingesting an unchanged log skips parsing")
+    parser.add_argument("--explain-matches", action="store_true", default=os.getenv("EXPLAIN_MATCHES") == "true",
+                        help="have the llm explain exact line lookups instead of listing the hits")
+    parser.add_argument("--id-pattern", action="append", dest="id_patterns",
+                        help="regex capturing a trace / request id in its first group, repeatable")
+    parser.add_argument("--retrieval-config", default=os.getenv("RETRIEVAL_CONFIG"),
+                        help="JSON file with chunking and retriever settings, as written by the tune command")
+    parser.add_argument("--fast-llm-model", default=os.getenv("FAST_LLM_MODEL"),
+                        help="small model answering lookup questions first, escalating to --llm-model when needed")
+    parser.add_argument("--fast-llm-vendor", default=os.getenv("FAST_LLM_VENDOR", "ollama"),
+                        choices=["ollama", "openai", "bedrock"])
+    parser.add_argument("--local-mmr", action="store_true", default=os.getenv("LOCAL_MMR") == "true",
+                        help="run MMR locally over cached vectors instead of fetching them with every query")
+    parser.add_argument("--rerank", action="store_true", default=os.getenv("RERANK") == "true",
+                        help="rerank local MMR candidates by query words and recency")
+    parser.add_argument("--batch-wait-ms", type=float,
+                        default=float(os.getenv("QUERY_BATCH_WAIT_MS")) if os.getenv("QUERY_BATCH_WAIT_MS") else None,
+                        help="batch question embeddings of concurrent queries, waiting at most this long")
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("QUERY_BATCH_SIZE", 64)),
+                        help="most question embeddings sent in one batch")
+    parser.add_argument("--rpm", type=float, default=float(os.getenv("RATE_LIMIT_RPM", 0)) or None,
+                        help="provider requests per minute, enables adaptive rate limiting")
+    parser.add_argument("--tpm", type=float, default=float(os.getenv("RATE_LIMIT_TPM", 0)) or None,
+                        help="provider tokens per minute, enables adaptive rate limiting")
+    parser.add_argument("--target-latency", type=float,
+                        default=float(os.getenv("RATE_LIMIT_TARGET_LATENCY", 0)) or None,
+                        help="seconds per provider call above which concurrency backs off, "
+                             "3x the observed median when not set")
+    parser.add_argument("--workers", type=int, default=4, help="number of files or questions processed in parallel")
+
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    ingest = sub.add_parser("ingest", help="ingest log files into the index")
+    ingest.add_argument("files", nargs="+", help="log files or glob patterns")
+    ingest.add_argument("--create-index", action="store_true", help="drop and recreate the index before ingesting")
+    ingest.add_argument("--anomalies", action="store_true", help="detect template rate anomalies during ingest")
+    ingest.add_argument("--summaries", action="store_true", help="precompute a hierarchical summary tree during ingest")
+    ingest.add_argument("--trigrams", action="store_true", help="build a trigram index for exact line lookups")
+    ingest.add_argument("--correlation", action="store_true",
+                        help="index trace / request ids to pull cross-service timelines into context")
+    ingest.add_argument("--shard-workers", type=int, default=1,
+                        help="parse each file in byte range shards on this many processes")
+    ingest.add_argument("--triage", action="store_true",
+                        help="answer the triage questions about each file right after it is ingested")
+    ingest.add_argument("--triage-questions", default=os.getenv("TRIAGE_QUESTIONS"),
+                        help="file with the triage questions, one per line")
+    ingest.add_argument("--triage-workers", type=int, default=int(os.getenv("TRIAGE_WORKERS", 2)),
+                        help="triage questions answered in parallel")
+    ingest.add_argument("--max-vectors", type=int, help="embed at most this many chunks per file, sampling the rest")
+    ingest.add_argument("--max-cost", type=float, help="embedding budget per file in dollars")
+
+    query = sub.add_parser("query", help="answer a question set against an existing index")
+    query.add_argument("--questions", required=True, help="file with one question per line")
+    query.add_argument("--output", default="-", help="JSON lines output file, '-' for stdout")
+
+    run = sub.add_parser("run", help="ingest then answer a question set")
+    run.add_argument("files", nargs="+", help="log files or glob patterns")
+    run.add_argument("--create-index", action="store_true", help="drop and recreate the index before ingesting")
+    run.add_argument("--anomalies", action="store_true", help="detect template rate anomalies during ingest")
+    run.add_argument("--summaries", action="store_true", help="precompute a hierarchical summary tree during ingest")
+    run.add_argument("--trigrams", action="store_true", help="build a trigram index for exact line lookups")
+    run.add_argument("--correlation", action="store_true",
+                        help="index trace / request ids to pull cross-service timelines into context")
+    run.add_argument("--shard-workers", type=int, default=1,
+                        help="parse each file in byte range shards on this many processes")
+    run.add_argument("--triage", action="store_true",
+                        help="answer the triage questions about each file right after it is ingested")
+    run.add_argument("--triage-questions", default=os.getenv("TRIAGE_QUESTIONS"),
+                        help="file with the triage questions, one per line")
+    run.add_argument("--triage-workers", type=int, default=int(os.getenv("TRIAGE_WORKERS", 2)),
+                        help="triage questions answered in parallel")
+    run.add_argument("--max-vectors", type=int, help="embed at most this many chunks per file, sampling the rest")
+    run.add_argument("--max-cost", type=float, help="embedding budget per file in dollars")
+    run.add_argument("--questions", required=True, help="file with one question per line")
+    run.add_argument("--output", default="-", help="JSON lines output file, '-' for stdout")
+
+    worker = sub.add_parser("worker", help="process shards from an ingest work queue, e.g. on another machine")
+    worker.add_argument("queue", help="work queue directory on a shared filesystem, printed by ingest --shard-workers")
+
+    tune = sub.add_parser("tune", help="sweep chunking and retriever settings on a sample log")
+    tune.add_argument("file", help="sample log file")
+    tune.add_argument("--pairs", required=True, help="JSON lines of {\"question\": ..., \"expected\": ...}")
+    tune.add_argument("--output", default="retrieval.json", help="where the recommended settings are written")
+    tune.add_argument("--report", help="also write every setting with its metrics as JSON lines")
+    tune.add_argument("--chunk-sizes", type=int, nargs="+")
+    tune.add_argument("--overlaps", type=int, nargs="+")
+    tune.add_argument("--search-types", choices=["similarity", "mmr"], nargs="+")
+    tune.add_argument("--k", type=int, nargs="+")
+    tune.add_argument("--fetch-k", type=int, nargs="+")
+    tune.add_argument("--lambdas", type=float, nargs="+")
+    tune.add_argument("--recall-tolerance", type=float, default=0.0,
+                      help="accept this much less recall than the best setting for a cheaper one")
+    tune.add_argument("--record-chunks", action="store_true",
+                      help="chunk whole records without overlap, as ingest does with --max-vectors, --max-cost or "
+                           "--shard-workers, implied by --chunk-store and --record-cache")
+
+    return parser.parse_args(argv)
+
+
+def tune(analyzer: Analyzer, args, out) -> int:
+    grid = {key: value for key, value in (("chunk_size", args.chunk_sizes), ("chunk_overlap", args.overlaps),
+                                          ("search_type", args.search_types), ("k", args.k),
+                                          ("fetch_k", args.fetch_k), ("lambda_mult", args.lambdas)) if value}
+    # score the chunks ingest will actually embed, record chunking ignores the overlap
+    records = args.record_chunks or args.chunk_store or args.record_cache
+    results = sweep(args.file, read_pairs(args.pairs), analyzer.embeddings, grid, records)
+    best = recommend(results, args.recall_tolerance)
+    print(format_report(results, best), file=out)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            write_jsonl((r.to_dict() for r in results), f)
+    if best is None:
+        return 1
+    best.config.save(args.output)
+    print(f"recommended {best.config.describe()} written to {args.output}", file=out)
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    load_dotenv()
+    args = parse_args(argv)
+
+    if args.command == "worker":
+        print(json.dumps({"shards": run_worker(args.queue)}))
+        return 0
+
+    to_stdout = args.command in ("ingest", "tune") or args.output == "-"
+    out = sys.stdout
+    # Analyzer reports progress with print, keep it off stdout when stdout carries the results
+    with contextlib.redirect_stdout(sys.stderr) if to_stdout else contextlib.nullcontext():
+        status = 0
+        analyzer = build_analyzer(args, skip_create_index=not getattr(args, "create_index", False))
+
+        if args.command == "tune":
+            return tune(analyzer, args, out)
+
+        if args.command in ("ingest", "run"):
+            missing = []
+            paths = expand_paths(args.files, missing)
+            for path in missing:
+                print(f"No such log file: {path}", file=sys.stderr)
+            if missing:
+                return 1
+            if not paths:
+                print("No log files matched", file=sys.stderr)
+                return 1
+            results = ingest_files(analyzer, paths, args.workers, anomalies=args.anomalies,
+                                   summaries=args.summaries, max_vectors=args.max_vectors,
+                                   max_cost=args.max_cost, trigrams=args.trigrams,
+                                   correlation=args.correlation, shard_workers=args.shard_workers,
+                                   triage=args.triage)
+            if any(r["error"] for r in results.values()):
+                status = 1
+            if args.triage:
+                # stored with the index for the app and later queries, finish before exiting
+                for triage in analyzer.triage.values():
+                    triage.wait()
+            if args.command == "ingest":
+                print(json.dumps(results), file=out)
+
+        if args.command in ("query", "run"):
+            questions = read_questions(args.questions)
+            records = answer_questions(analyzer, questions, args.workers)
+            if to_stdout:
+                write_jsonl(records, out)
+            else:
+                with open(args.output, "w", encoding="utf-8") as f:
+                    write_jsonl(records, f)
+            if args.fast_llm_model:
+                print(f"cascade : {json.dumps(analyzer.cascade.metrics.summary())}", file=sys.stderr)
+
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,7 +4,9 @@ Unit tests for the Analyzer class in analyzer/analyzer.py
 import pytest
 from unittest.mock import Mock, MagicMock, patch, call
 from analyzer.analyzer import Analyzer
+from utils.record_cache import path_key
 from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda
 
 
 class TestAnalyzerInitialization:
@@ -573,3 +575,780 @@ class TestAnalyzerRAGFlow:
         # Should handle gracefully - sources should be empty
         assert len(sources) == 0
         assert len(contexts) == 1
+
+
+class TestAnalyzerLocalBackend:
+    """Tests for the local quantized vector backend"""
+
+    @patch('analyzer.analyzer.QuantizedVectorStore')
+    @patch('analyzer.analyzer.ChatOpenAI')
+    @patch('analyzer.analyzer.OpenAIEmbeddings')
+    @patch('analyzer.analyzer.Pinecone')
+    @patch('analyzer.analyzer.PineconeVectorStore')
+    def test_local_backend_skips_pinecone(self, mock_vector_store_class, mock_pinecone_class,
+                                          mock_embeddings, mock_llm, mock_local_store_class, tmp_path):
+        """Test that the local backend uses the quantized store and never calls Pinecone"""
+        analyzer = Analyzer(
+            index_name="test-index",
+            model_vendor="openai",
+            skip_create_index=False,
+            vector_backend="local",
+            local_index_path=str(tmp_path / "index"),
+            quantization="binary",
+            truncate_dim=256
+        )
+
+        mock_pinecone_class.assert_not_called()
+        mock_vector_store_class.assert_not_called()
+        assert analyzer.vector_store == mock_local_store_class.return_value
+        call_kwargs = mock_local_store_class.call_args[1]
+        assert call_kwargs['quantization'] == "binary"
+        assert call_kwargs['truncate_dim'] == 256
+
+
+class TestAnalyzerAnomalies:
+    """Tests for anomaly detection at ingest and anomaly context in rag"""
+
+    @patch('analyzer.analyzer.create_retrieval_chain')
+    @patch('analyzer.analyzer.create_stuff_documents_chain')
+    @patch('analyzer.analyzer.ChatOpenAI')
+    @patch('analyzer.analyzer.OpenAIEmbeddings')
+    @patch('analyzer.analyzer.Pinecone')
+    @patch('analyzer.analyzer.PineconeVectorStore')
+    def test_rag_pulls_anomalies_for_triage_questions(self, mock_vector_store_class, mock_pinecone_class,
+                                                      mock_embeddings, mock_llm, mock_qa_chain_class,
+                                                      mock_rag_chain_class, tmp_path):
+        """Test that ingest detects anomalies and rag puts them ahead of similarity hits"""
+        lines = [f"2024-01-01 00:{m:02d}:00 INFO tick {m}" for m in range(30)]
+        lines += [f"2024-01-01 00:25:{s:02d} ERROR connection refused" for s in range(10)]
+        log = tmp_path / "app.log"
+        log.write_text("\n".join(sorted(lines)) + "\n")
+
+        mock_vector_store = MagicMock()
+        hit = Document(page_content="tick 3", metadata={"source": str(log)})
+        mock_vector_store.as_retriever.return_value = RunnableLambda(lambda query: [hit])
+        mock_vector_store_class.return_value = mock_vector_store
+        mock_rag_chain_class.return_value.invoke.return_value = {"answer": "db down", "context": []}
+
+        analyzer = Analyzer(index_name="test-index", model_vendor="openai", local_index_path=str(tmp_path / "index"))
+        analyzer.ingest(str(log), anomalies=True)
+        analyzer.rag("What went wrong?")
+
+        retriever = mock_rag_chain_class.call_args[0][0]
+        docs = retriever.invoke({"input": "What went wrong?"})
+        assert docs[0].metadata["kind"] == "anomaly"
+        assert "connection refused" in docs[0].page_content
+        assert docs[-1].page_content == "tick 3"
+
+        analyzer.rag("List the endpoints")
+        assert mock_rag_chain_class.call_args[0][0].invoke({"input": "List the endpoints"}) == [hit]
+
+        # stored next to the index, a query-only process reads them back
+        reloaded = Analyzer(index_name="test-index", model_vendor="openai", local_index_path=str(tmp_path / "index"))
+        assert reloaded.anomalies == analyzer.anomalies
+
+
+class TestAnalyzerRealChain:
+    """Tests for plain rag through the real LangChain retrieval chain"""
+
+    @patch('analyzer.analyzer.ChatOpenAI')
+    @patch('analyzer.analyzer.OpenAIEmbeddings')
+    @patch('analyzer.analyzer.Pinecone')
+    def test_wrapped_retrievers_get_the_question(self, mock_pinecone_class, mock_embeddings, mock_llm, tmp_path):
+        """Test that every retriever wrapper receives the question, not the chain input dict"""
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        from langchain_core.language_models.fake import FakeListLLM
+        mock_embeddings.return_value = DeterministicFakeEmbedding(size=32)
+        mock_llm.return_value = FakeListLLM(responses=["db down"] * 10)
+        log = tmp_path / "app.log"
+        lines = [f"2024-01-01 00:{m:02d}:00 INFO tick {m} request_id=ab12cd{m:02d}" for m in range(30)]
+        lines += [f"2024-01-01 00:25:{s:02d} ERROR connection refused" for s in range(10)]
+        log.write_text("\n".join(sorted(lines)) + "\n")
+
+        analyzer = Analyzer(index_name="test-index", model_vendor="openai", vector_backend="local",
+                            local_index_path=str(tmp_path / "index"), embedding_dimension=32, chunk_store=True,
+                            record_cache=True)
+        analyzer.ingest(str(log), anomalies=True, correlation=True, max_vectors=20)
+
+        for question in ("What went wrong?", "What happened between 00:24 and 00:26?",
+                         "Why did request ab12cd03 fail?", "List the endpoints"):
+            answer, sources, contexts = analyzer.rag(question)
+            assert answer == "db down"
+            assert sources == [str(log)] and contexts
+
+
+class TestAnalyzerSummaries:
+    """Tests for the precomputed summary tree"""
+
+    @patch('analyzer.analyzer.create_retrieval_chain')
+    @patch('analyzer.analyzer.create_stuff_documents_chain')
+    @patch('analyzer.analyzer.ChatOpenAI')
+    @patch('analyzer.analyzer.OpenAIEmbeddings')
+    @patch('analyzer.analyzer.Pinecone')
+    @patch('analyzer.analyzer.PineconeVectorStore')
+    def test_summary_questions_read_the_tree(self, mock_vector_store_class, mock_pinecone_class,
+                                             mock_embeddings, mock_llm, mock_qa_chain_class,
+                                             mock_rag_chain_class, tmp_path):
+        """Test that ingest builds and stores the tree and summary questions read its root"""
+        from langchain_core.language_models.fake import FakeListLLM
+        mock_llm.return_value = FakeListLLM(responses=["segment summary"] * 50)
+        log = tmp_path / "app.log"
+        log.write_text("".join(f"2024-01-01 {h:02d}:00:00 INFO job {h} done\n" for h in range(12)))
+        mock_rag_chain_class.return_value.invoke.return_value = {"answer": "all good", "context": []}
+
+        analyzer = Analyzer(index_name="test-index", model_vendor="openai",
+                            local_index_path=str(tmp_path / "index"))
+        analyzer.ingest(str(log), summaries=True)
+        analyzer.rag("Summarize this log")
+
+        assert (tmp_path / "index" / "summaries" / f"{path_key(str(log))}.json").exists()
+        retriever = mock_rag_chain_class.call_args[0][0]
+        docs = retriever.invoke({"input": "Summarize this log"})
+        assert len(docs) == 1
+        assert docs[0].metadata["level"] == analyzer.summary_trees[str(log)].root.level
+        assert docs[0].page_content.endswith("segment summary")
+
+        # a query-only process reads the stored tree, the tree of a deleted log is skipped
+        reloaded = Analyzer(index_name="test-index", model_vendor="openai", local_index_path=str(tmp_path / "index"))
+        assert reloaded.summary_trees[str(log)].root.summary == "segment summary"
+        log.unlink()
+        assert Analyzer(index_name="test-index", model_vendor="openai",
+                        local_index_path=str(tmp_path / "index")).summary_trees == {}
+
+
+class TestAnalyzerRateLimits:
+    """Tests for wrapping model clients with rate limits"""
+
+    @patch('analyzer.analyzer.ChatOpenAI')
+    @patch('analyzer.analyzer.OpenAIEmbeddings')
+    @patch('analyzer.analyzer.Pinecone')
+    @patch('analyzer.analyzer.PineconeVectorStore')
+    def test_clients_are_wrapped_with_shared_budgets(self, mock_vector_store_class, mock_pinecone_class,
+                                                     mock_embeddings, mock_llm):
+        """Test that rate_limits wraps embeddings and llm and shares budgets between analyzers"""
+        from utils.rate_limiter import RateLimitedEmbeddings, RateLimitedLLM
+        kwargs = dict(index_name="test-index", model_vendor="openai", llm_model="small",
+                      embedding_model="embed", rate_limits={"requests_per_minute": 100})
+        first, second = Analyzer(**kwargs), Analyzer(**kwargs)
+
+        assert isinstance(first.embeddings, RateLimitedEmbeddings)
+        assert isinstance(first.llm, RateLimitedLLM)
+        assert first.embeddings.embeddings == mock_embeddings.return_value
+        assert first.llm.budget is second.llm.budget
+        assert first.llm.budget is not first.embeddings.budget
+        assert mock_vector_store_class.call_args[1]["embedding"] is second.embeddings
+
+    @patch('analyzer.analyzer.ChatOpenAI')
+    @patch('analyzer.analyzer.OpenAIEmbeddings')
+    @patch('analyzer.analyzer.Pinecone')
+    @patch('analyzer.analyzer.PineconeVectorStore')
+    def test_query_batching_is_shared(self, mock_vector_store_class, mock_pinecone_class, mock_embeddings,
+                                      mock_llm):
+        """Test that analyzers of one model embed their questions through one batcher"""
+        from utils.embedding_batcher import BatchingEmbeddings
+        BatchingEmbeddings._batchers.clear()
+        kwargs = dict(index_name="test-index", model_vendor="openai", embedding_model="embed-batch",
+                      query_batching={"max_wait": 0.001})
+        first, second = Analyzer(**kwargs), Analyzer(**kwargs)
+
+        assert isinstance(first.embeddings, BatchingEmbeddings)
+        assert first.embeddings.batcher is second.embeddings.batcher
+        assert mock_vector_store_class.call_args[1]["embedding"] is second.embeddings
+        BatchingEmbeddings._batchers.clear()
+
+
+class TestAnalyzerChunkStore:
+    """Tests for ingesting chunk references instead of chunk text"""
+
+    @patch('analyzer.analyzer.create_retrieval_chain')
+    @patch('analyzer.analyzer.create_stuff_documents_chain')
+    @patch('analyzer.analyzer.ChatOpenAI')
+    @patch('analyzer.analyzer.OpenAIEmbeddings')
+    @patch('analyzer.analyzer.Pinecone')
+    def test_vectors_carry_only_chunk_ids(self, mock_pinecone_class, mock_embeddings, mock_llm,
+                                          mock_qa_chain_class, mock_rag_chain_class, tmp_path):
+        """Test that the index stores no text and rag resolves it from the log file"""
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        mock_embeddings.return_value = DeterministicFakeEmbedding(size=32)
+        log = tmp_path / "app.log"
+        log.write_text("".join(f"2024-01-01 00:00:{i:02d} INFO step {i} finished\n" for i in range(20)))
+        mock_rag_chain_class.return_value.invoke.return_value = {"answer": "ok", "context": []}
+
+        analyzer = Analyzer(index_name="test-index", model_vendor="openai", vector_backend="local",
+                            local_index_path=str(tmp_path / "index"), embedding_dimension=32,
+                            chunk_store=True)
+        count = analyzer.ingest(str(log))
+
+        stored = analyzer.vector_store._docs
+        assert len(stored) == count
+        assert all(d["page_content"] == "" for d in stored)
+        assert stored[0]["metadata"]["chunk_id"] == 0
+
+        analyzer.rag("what finished?")
+        retriever = mock_rag_chain_class.call_args[0][0]
+        docs = retriever.invoke({"input": "2024-01-01 00:00:03 INFO step 3 finished"})
+        assert all(d.page_content.startswith("2024-01-01") for d in docs)
+        assert docs[0].metadata["source"] == str(log)
+
+
+class TestAnalyzerBudgetedIngest:
+    """Tests for budgeted stratified ingestion"""
+
+    @patch('analyzer.analyzer.create_retrieval_chain')
+    @patch('analyzer.analyzer.create_stuff_documents_chain')
+    @patch('analyzer.analyzer.ChatOpenAI')
+    @patch('analyzer.analyzer.OpenAIEmbeddings')
+    @patch('analyzer.analyzer.Pinecone')
+    @patch('analyzer.analyzer.PineconeVectorStore')
+    def test_max_vectors(self, mock_vector_store_class, mock_pinecone_class, mock_embeddings, mock_llm,
+                         mock_qa_chain_class, mock_rag_chain_class, tmp_path):
+        """Test that at most max_vectors chunks are embedded with their weights recorded"""
+        log = tmp_path / "app.log"
+        lines = [f"2024-01-01 00:{i // 60:02d}:{i % 60:02d} INFO request {i} served in 5ms" for i in range(600)]
+        lines[300] = "2024-01-01 00:05:00 ERROR database connection lost"
+        log.write_text("\n".join(lines) + "\n")
+        mock_vector_store = MagicMock()
+        mock_vector_store_class.return_value = mock_vector_store
+
+        analyzer = Analyzer(index_name="test-index", model_vendor="openai",
+                            local_index_path=str(tmp_path / "index"))
+        count = analyzer.ingest(str(log), max_vectors=50)
+
+        docs = mock_vector_store.add_documents.call_args[0][0]
+        assert count == len(docs) <= 50
+        assert any("database connection lost" in d.page_content for d in docs)
+        assert sum(d.metadata["sample_weight"] for d in docs) == pytest.approx(count_chunks(lines), rel=0.05)
+        assert (tmp_path / "index" / "sampling" / f"{path_key(str(log))}.json").exists()
+
+        mock_rag_chain_class.return_value.invoke.return_value = {"answer": "ok", "context": []}
+        sampled = next(d for d in docs if d.metadata["sample_weight"] > 1)
+        mock_vector_store.as_retriever.return_value = RunnableLambda(lambda q: [sampled])
+        analyzer.rag("how many requests were served?")
+        context = mock_rag_chain_class.call_args[0][0].invoke({"input": "q"})
+        assert context[0].page_content.startswith("[sampled: stands for")
+
+        # a query-only process knows the index was sampled from the stored report
+        reloaded = Analyzer(index_name="test-index", model_vendor="openai", local_index_path=str(tmp_path / "index"))
+        assert reloaded.sampling[str(log)].kept_chunks == count
+        reloaded.rag("how many requests were served?")
+        context = mock_rag_chain_class.call_args[0][0].invoke({"input": "q"})
+        assert context[0].page_content.startswith("[sampled: stands for")
+
+
+def count_chunks(lines):
+    from utils.chunk_store import group_records
+    from utils.log_parser import parse_record
+    return len(group_records([parse_record(line + "\n") for line in lines]))
+
+
+class TestAnalyzerTrigramIndex:
+    """Tests for answering grep-like questions from the trigram index"""
+
+    @patch('analyzer.analyzer.create_retrieval_chain')
+    @patch('analyzer.analyzer.create_stuff_documents_chain')
+    @patch('analyzer.analyzer.ChatOpenAI')
+    @patch('analyzer.analyzer.OpenAIEmbeddings')
+    @patch('analyzer.analyzer.Pinecone')
+    @patch('analyzer.analyzer.PineconeVectorStore')
+    def test_lookups_skip_retrieval(self, mock_vector_store_class, mock_pinecone_class, mock_embeddings, mock_llm,
+                                    mock_qa_chain_class, mock_rag_chain_class, tmp_path):
+        """Test that literal lookups are answered exactly and other questions still use rag"""
+        log = tmp_path / "app.log"
+        lines = [f"2024-01-01 00:00:{i:02d} INFO request {i} served" for i in range(40)]
+        lines[7] = "2024-01-01 00:00:07 ERROR ORA-00060: deadlock detected"
+        log.write_text("\n".join(lines) + "\n")
+        mock_rag_chain_class.return_value.invoke.return_value = {"answer": "ok", "context": []}
+
+        analyzer = Analyzer(index_name="test-index", model_vendor="openai",
+                            local_index_path=str(tmp_path / "index"))
+        analyzer.ingest(str(log), trigrams=True)
+        assert (tmp_path / "index" / "trigrams" / f"{path_key(str(log))}.npz").exists()
+
+        answer, sources, contexts = analyzer.rag("show lines containing ORA-00060")
+        assert contexts == [lines[7]]
+        assert sources == [str(log)]
+        assert f"{log}:8:" in answer
+        mock_rag_chain_class.assert_not_called()
+
+        answer, _, contexts = analyzer.rag("show lines containing ORA-99999")
+        assert contexts == [] and answer.startswith("No lines match")
+
+        # the answer says when the listing stops at the limit instead of claiming a total
+        answer, _, contexts = analyzer.rag("show lines containing INFO")
+        assert len(contexts) == 39 and answer.startswith("39 lines match 'INFO':")
+        with patch('analyzer.analyzer._GREP_LIMIT', 20):
+            answer, _, contexts = analyzer.rag("show lines containing INFO")
+        assert len(contexts) == 20 and answer.startswith("More than 20 lines match 'INFO', the first 20:")
+
+        analyzer.rag("what went wrong?")
+        mock_rag_chain_class.assert_called_once()
+
+        # ordinary questions and inferred lookups without hits are answered by the llm
+        for prompt in ("find the root cause of the failure", "Can you find why the db connection failed?",
+                       "where does db-77 appear?"):
+            assert analyzer.rag(prompt)[0] == "ok"
+        assert mock_rag_chain_class.call_count == 4
+
+    @patch('analyzer.analyzer.create_retrieval_chain')
+    @patch('analyzer.analyzer.create_stuff_documents_chain')
+    @patch('analyzer.analyzer.ChatOpenAI')
+    @patch('analyzer.analyzer.OpenAIEmbeddings')
+    @patch('analyzer.analyzer.Pinecone')
+    @patch('analyzer.analyzer.PineconeVectorStore')
+    def test_explain_matches(self, mock_vector_store_class, mock_pinecone_class, mock_embeddings, mock_llm,
+                             mock_qa_chain_class, mock_rag_chain_class, tmp_path):
+        """Test that explain_matches hands only the verified hits to the llm"""
+        log = tmp_path / "app.log"
+        log.write_text("a ok\nb ERROR disk full on /var\nc ok\n")
+        mock_rag_chain_class.return_value.invoke.return_value = {"answer": "the disk filled up", "context": []}
+
+        analyzer = Analyzer(index_name="test-index", model_vendor="openai",
+                            local_index_path=str(tmp_path / "index"), explain_matches=True)
+        analyzer.ingest(str(log), trigrams=True)
+        answer, _, _ = analyzer.rag("grep for 'disk full'")
+
+        assert answer == "the disk filled up"
+        docs = mock_rag_chain_class.call_args[0][0].invoke({"input": "grep for 'disk full'"})
+        assert [d.page_content for d in docs] == ["b ERROR disk full on /var"]
+        assert docs[0].metadata["line"] == 2
+
+
+class TestAnalyzerConversations:
+    """Tests for session follow-ups"""
+
+    @patch('analyzer.analyzer.create_stuff_documents_chain')
+    @patch('analyzer.analyzer.ChatOpenAI')
+    @patch('analyzer.analyzer.OpenAIEmbeddings')
+    @patch('analyzer.analyzer.Pinecone')
+    def test_follow_up_expands_neighbours(self, mock_pinecone_class, mock_embeddings, mock_llm,
+                                          mock_qa_chain_class, tmp_path):
+        """Test that a follow-up reuses the context and adds the next chunks without searching"""
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        mock_embeddings.return_value = DeterministicFakeEmbedding(size=32)
+        log = tmp_path / "app.log"
+        log.write_text("".join(f"2024-01-01 00:00:{i:02d} INFO step {i} finished\n" for i in range(20)))
+        mock_qa_chain_class.return_value.invoke.side_effect = ["first", "second", "third"]
+
+        analyzer = Analyzer(index_name="test-index", model_vendor="openai", vector_backend="local",
+                            local_index_path=str(tmp_path / "index"), embedding_dimension=32, chunk_store=True)
+        analyzer.ingest(str(log))
+        searches = []
+        hit = Document(page_content="", metadata={"chunk_id": 3, "source": str(log)})
+        analyzer.vector_store.as_retriever = MagicMock(
+            return_value=RunnableLambda(lambda query: searches.append(query) or [hit]))
+
+        answer, _, contexts = analyzer.rag("when did step 3 finish?", session_id="s1")
+        assert answer == "first" and searches == ["when did step 3 finish?"]
+        assert contexts == [analyzer.chunk_store.text(3)]
+
+        answer, _, contexts = analyzer.rag("and what happened right after that?", session_id="s1")
+        assert answer == "second" and len(searches) == 1
+        assert contexts == [analyzer.chunk_store.text(i) for i in (3, 4, 5)]
+        inputs = mock_qa_chain_class.return_value.invoke.call_args[0][0]
+        assert inputs["history"] == [("human", "when did step 3 finish?"), ("ai", "first")]
+        assert inputs["input"] == "and what happened right after that?"
+
+        analyzer.rag("when did step 9 finish?", session_id="s2")
+        assert len(searches) == 2
+
+    @patch('analyzer.analyzer.create_stuff_documents_chain')
+    @patch('analyzer.analyzer.ChatOpenAI')
+    @patch('analyzer.analyzer.OpenAIEmbeddings')
+    @patch('analyzer.analyzer.Pinecone')
+    def test_follow_up_with_new_time_searches(self, mock_pinecone_class, mock_embeddings, mock_llm,
+                                              mock_qa_chain_class, tmp_path):
+        """Test that a follow-up naming a time of its own searches instead of walking neighbours"""
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        from langchain_core.language_models.fake import FakeListLLM
+        mock_embeddings.return_value = DeterministicFakeEmbedding(size=32)
+        log = tmp_path / "app.log"
+        log.write_text("".join(f"2024-01-01 00:00:{i:02d} INFO step {i} finished\n" for i in range(20)))
+        mock_qa_chain_class.return_value.invoke.side_effect = ["first", "second", "third"]
+
+        analyzer = Analyzer(index_name="test-index", model_vendor="openai", vector_backend="local",
+                            local_index_path=str(tmp_path / "index"), embedding_dimension=32, chunk_store=True)
+        analyzer.ingest(str(log))
+        analyzer.llm = FakeListLLM(responses=["what happened at 00:00:15?"])
+        searches = []
+        hit = Document(page_content="", metadata={"chunk_id": 3, "source": str(log)})
+        analyzer.vector_store.as_retriever = MagicMock(
+            return_value=RunnableLambda(lambda query: searches.append(query) or [hit]))
+
+        analyzer.rag("when did step 3 finish?", session_id="s1")
+        analyzer.rag("and what happened at 00:00:15?", session_id="s1")
+        assert searches == ["when did step 3 finish?", "what happened at 00:00:15?"]
+
+        analyzer.rag("Is there a timeout?", session_id="s1")
+        assert searches[-1] == "Is there a timeout?"
+
+
+class TestAnalyzerCorrelation:
+    """Tests for cross-service timelines in rag"""
+
+    @patch('analyzer.analyzer.create_retrieval_chain')
+    @patch('analyzer.analyzer.create_stuff_documents_chain')
+    @patch('analyzer.analyzer.ChatOpenAI')
+    @patch('analyzer.analyzer.OpenAIEmbeddings')
+    @patch('analyzer.analyzer.Pinecone')
+    @patch('analyzer.analyzer.PineconeVectorStore')
+    def test_timeline_from_question_or_top_hit(self, mock_vector_store_class, mock_pinecone_class, mock_embeddings,
+                                               mock_llm, mock_qa_chain_class, mock_rag_chain_class, tmp_path):
+        """Test that a request id pulls every service's records into the context"""
+        gateway, billing = tmp_path / "gateway.log", tmp_path / "billing.log"
+        gateway.write_text("2024-01-01 10:00:00 INFO POST /pay request_id=ab12cd34\n"
+                           "2024-01-01 10:00:05 ERROR upstream failed request_id=ab12cd34\n")
+        billing.write_text("2024-01-01 10:00:02 ERROR card declined request_id=ab12cd34\n")
+        mock_vector_store = MagicMock()
+        hit = Document(page_content="2024-01-01 10:00:05 ERROR upstream failed request_id=ab12cd34",
+                       metadata={"source": str(gateway)})
+        mock_vector_store.as_retriever.return_value = RunnableLambda(lambda query: [hit])
+        mock_vector_store_class.return_value = mock_vector_store
+        mock_rag_chain_class.return_value.invoke.return_value = {"answer": "card declined", "context": []}
+
+        analyzer = Analyzer(index_name="test-index", model_vendor="openai", local_index_path=str(tmp_path / "index"))
+        analyzer.ingest(str(gateway), correlation=True)
+        analyzer.ingest(str(billing), correlation=True)
+
+        analyzer.rag("why did request ab12cd34 fail?")
+        docs = mock_rag_chain_class.call_args[0][0].invoke({"input": "why did request ab12cd34 fail?"})
+        assert docs[0].metadata["kind"] == "timeline"
+        assert docs[0].page_content.splitlines()[1:] == [
+            "gateway.log: 2024-01-01 10:00:00 INFO POST /pay request_id=ab12cd34",
+            "billing.log: 2024-01-01 10:00:02 ERROR card declined request_id=ab12cd34",
+            "gateway.log: 2024-01-01 10:00:05 ERROR upstream failed request_id=ab12cd34"]
+        assert docs[1] == hit
+
+        docs = mock_rag_chain_class.call_args[0][0].invoke({"input": "why did the payment fail?"})
+        assert docs[0].metadata["id"] == "ab12cd34"
+
+
+class TestAnalyzerRetrievalConfig:
+    """Tests for loading chunking and retriever settings"""
+
+    @patch('analyzer.analyzer.create_retrieval_chain')
+    @patch('analyzer.analyzer.create_stuff_documents_chain')
+    @patch('analyzer.analyzer.TextLoader')
+    @patch('analyzer.analyzer.RecursiveCharacterTextSplitter')
+    @patch('analyzer.analyzer.ChatOpenAI')
+    @patch('analyzer.analyzer.OpenAIEmbeddings')
+    @patch('analyzer.analyzer.Pinecone')
+    @patch('analyzer.analyzer.PineconeVectorStore')
+    def test_config_file_drives_splitter_and_retriever(self, mock_vector_store_class, mock_pinecone_class,
+                                                       mock_embeddings, mock_llm, mock_splitter_class,
+                                                       mock_loader_class, mock_qa_chain_class,
+                                                       mock_rag_chain_class, tmp_path):
+        """Test that chunk size, overlap and search settings come from the config file"""
+        from utils.retrieval_config import RetrievalConfig
+        path = tmp_path / "retrieval.json"
+        RetrievalConfig(chunk_size=400, chunk_overlap=40, search_type="mmr", k=6, fetch_k=30,
+                        lambda_mult=0.25).save(str(path))
+        mock_splitter_class.return_value.split_documents.return_value = []
+        mock_vector_store = MagicMock()
+        mock_vector_store_class.return_value = mock_vector_store
+        mock_rag_chain_class.return_value.invoke.return_value = {"answer": "ok", "context": []}
+
+        analyzer = Analyzer(index_name="test-index", model_vendor="openai", retrieval_config=str(path))
+        analyzer.ingest("/path/to/test.log")
+        analyzer.rag("what failed?")
+
+        mock_splitter_class.assert_called_once_with(chunk_size=400, chunk_overlap=40)
+        mock_vector_store.as_retriever.assert_called_once_with(
+            search_type="mmr", search_kwargs={"k": 6, "fetch_k": 30, "lambda_mult": 0.25})
+
+
+class TestAnalyzerShardedIngest:
+    """Tests for ingesting one file on several worker processes"""
+
+    @patch('analyzer.analyzer.ChatOpenAI')
+    @patch('analyzer.analyzer.OpenAIEmbeddings')
+    @patch('analyzer.analyzer.Pinecone')
+    @patch('analyzer.analyzer.PineconeVectorStore')
+    def test_workers_shard_the_parse(self, mock_vector_store_class, mock_pinecone_class, mock_embeddings,
+                                     mock_llm, tmp_path, capsys):
+        """Test that a sharded ingest embeds every record once, keeps the merged stats and names its queue"""
+        log = tmp_path / "app.log"
+        lines = [f"2024-01-01 00:00:{i % 60:02d} INFO request {i} served" for i in range(400)]
+        log.write_text("\n".join(lines) + "\n")
+        mock_vector_store = MagicMock()
+        mock_vector_store_class.return_value = mock_vector_store
+
+        analyzer = Analyzer(index_name="test-index", model_vendor="openai", local_index_path=str(tmp_path / "index"))
+        count = analyzer.ingest(str(log), shard_workers=2)
+
+        docs = mock_vector_store.add_documents.call_args[0][0]
+        assert count == len(docs)
+        assert "\n".join(d.page_content for d in docs).splitlines() == lines
+        assert analyzer.ingest_stats[str(log)].records == 400
+        queue = tmp_path / "index" / "queue" / path_key(str(log))
+        assert f"cli.py worker {queue}`" in capsys.readouterr().out
+
+    @patch('analyzer.analyzer.ChatOpenAI')
+    @patch('analyzer.analyzer.OpenAIEmbeddings')
+    @patch('analyzer.analyzer.Pinecone')
+    @patch('analyzer.analyzer.PineconeVectorStore')
+    def test_same_name_in_other_directories(self, mock_vector_store_class, mock_pinecone_class, mock_embeddings,
+                                            mock_llm, tmp_path):
+        """Test that concurrent ingests of logs sharing a name keep their own queues and trigram indexes"""
+        from concurrent.futures import ThreadPoolExecutor
+        logs = []
+        for service in ("svc-a", "svc-b"):
+            (tmp_path / service).mkdir()
+            log = tmp_path / service / "app.log"
+            log.write_text("".join(f"2024-01-01 00:00:{i % 60:02d} INFO {service} request {i}\n" for i in range(200)))
+            logs.append(str(log))
+        mock_vector_store_class.return_value = MagicMock()
+
+        analyzer = Analyzer(index_name="test-index", model_vendor="openai", local_index_path=str(tmp_path / "index"))
+        with ThreadPoolExecutor(2) as pool:
+            list(pool.map(lambda log: analyzer.ingest(log, shard_workers=2, trigrams=True), logs))
+
+        assert all(analyzer.ingest_stats[log].records == 200 for log in logs)
+        reloaded = Analyzer(index_name="test-index", model_vendor="openai", local_index_path=str(tmp_path / "index"))
+        assert set(reloaded.trigram_indexes) == set(logs)
+
+
+class TestAnalyzerLocalMMR:
+    """Tests for MMR over locally cached vectors"""
+
+    @patch('analyzer.analyzer.create_retrieval_chain')
+    @patch('analyzer.analyzer.create_stuff_documents_chain')
+    @patch('analyzer.analyzer.ChatOpenAI')
+    @patch('analyzer.analyzer.OpenAIEmbeddings')
+    @patch('analyzer.analyzer.Pinecone')
+    @patch('analyzer.analyzer.PineconeVectorStore')
+    def test_local_mmr_replaces_store_retriever(self, mock_vector_store_class, mock_pinecone_class,
+                                                mock_embeddings, mock_llm, mock_qa_chain_class,
+                                                mock_rag_chain_class):
+        """Test that rag retrieves through the local MMR retriever with the configured settings"""
+        mock_vector_store = MagicMock()
+        mock_vector_store_class.return_value = mock_vector_store
+        mock_rag_chain_class.return_value.invoke.return_value = {"answer": "ok", "context": []}
+
+        analyzer = Analyzer(index_name="test-index", model_vendor="openai", local_mmr=True)
+        analyzer.rag("what failed?")
+
+        mock_vector_store.as_retriever.assert_not_called()
+        retriever = analyzer.local_retriever()
+        assert (retriever.k, retriever.fetch_k, retriever.lambda_mult) == (4, 20, 0.5)
+        assert retriever.cache is analyzer.vector_cache
+
+
+class TestAnalyzerRecordCache:
+    """Tests for reusing parsed records across ingests"""
+
+    @patch('analyzer.analyzer.ChatOpenAI')
+    @patch('analyzer.analyzer.OpenAIEmbeddings')
+    @patch('analyzer.analyzer.Pinecone')
+    @patch('analyzer.analyzer.PineconeVectorStore')
+    def test_reingest_reads_cached_records(self, mock_vector_store_class, mock_pinecone_class, mock_embeddings,
+                                           mock_llm, tmp_path, mocker):
+        """Test that a second ingest of an unchanged log does not parse it again"""
+        from utils.log_parser import parse_file
+        log = tmp_path / "app.log"
+        log.write_text("".join(f"2024-01-01 00:00:{i:02d} ERROR step {i} failed\n" for i in range(30)))
+        parse = mocker.patch("utils.record_cache.parse_file", side_effect=parse_file)
+
+        kwargs = dict(index_name="test-index", model_vendor="openai", local_index_path=str(tmp_path / "index"),
+                      record_cache=True)
+        first = Analyzer(**kwargs).ingest(str(log), anomalies=True)
+        second = Analyzer(**kwargs).ingest(str(log), anomalies=True)
+
+        assert parse.call_count == 1
+        assert first == second
+        assert (tmp_path / "index" / "records").is_dir()
+        # chunks come from the cached records, not from splitting the raw text again
+        docs = mock_vector_store_class.return_value.add_documents.call_args[0][0]
+        assert "\n".join(d.page_content for d in docs).splitlines() == log.read_text().splitlines()
+
+    @patch('analyzer.analyzer.create_retrieval_chain')
+    @patch('analyzer.analyzer.create_stuff_documents_chain')
+    @patch('analyzer.analyzer.ChatOpenAI')
+    @patch('analyzer.analyzer.OpenAIEmbeddings')
+    @patch('analyzer.analyzer.Pinecone')
+    @patch('analyzer.analyzer.PineconeVectorStore')
+    def test_time_range_question_scans_cache(self, mock_vector_store_class, mock_pinecone_class, mock_embeddings,
+                                             mock_llm, mock_qa_chain_class, mock_rag_chain_class, tmp_path):
+        """Test that a question naming a time window gets the cached records of that window"""
+        log = tmp_path / "app.log"
+        log.write_text("".join(f"2024-01-01 10:{i:02d}:00 {'ERROR' if i % 2 else 'INFO'} step {i}\n"
+                               for i in range(30)))
+        hit = Document(page_content="similar", metadata={"source": str(log)})
+        mock_vector_store_class.return_value.as_retriever.return_value = RunnableLambda(lambda query: [hit])
+        mock_rag_chain_class.return_value.invoke.return_value = {"answer": "", "context": []}
+
+        kwargs = dict(index_name="test-index", model_vendor="openai", local_index_path=str(tmp_path / "index"),
+                      record_cache=True)
+        Analyzer(**kwargs).ingest(str(log))
+        analyzer = Analyzer(**kwargs)
+        analyzer.rag("which errors happened between 10:03 and 10:07?")
+        retriever = mock_rag_chain_class.call_args[0][0]
+
+        docs = retriever.invoke({"input": "which errors happened between 10:03 and 10:07?"})
+        assert [d.page_content for d in docs] == ["2024-01-01 10:03:00 ERROR step 3",
+                                                  "2024-01-01 10:05:00 ERROR step 5",
+                                                  "2024-01-01 10:07:00 ERROR step 7", "similar"]
+        assert retriever.invoke({"input": "which step failed?"}) == [hit]
+
+    @patch('analyzer.analyzer.create_retrieval_chain')
+    @patch('analyzer.analyzer.create_stuff_documents_chain')
+    @patch('analyzer.analyzer.ChatOpenAI')
+    @patch('analyzer.analyzer.OpenAIEmbeddings')
+    @patch('analyzer.analyzer.Pinecone')
+    @patch('analyzer.analyzer.PineconeVectorStore')
+    def test_time_range_with_anomalies(self, mock_vector_store_class, mock_pinecone_class, mock_embeddings,
+                                       mock_llm, mock_qa_chain_class, mock_rag_chain_class, tmp_path):
+        """Test that an anomaly question naming a time window still gets the records of that window"""
+        log = tmp_path / "app.log"
+        log.write_text("".join(f"2024-01-01 10:{i:02d}:00 {'ERROR' if i % 2 else 'INFO'} step {i}\n"
+                               for i in range(30)))
+        hit = Document(page_content="similar", metadata={"source": str(log)})
+        mock_vector_store_class.return_value.as_retriever.return_value = RunnableLambda(lambda query: [hit])
+        mock_rag_chain_class.return_value.invoke.return_value = {"answer": "", "context": []}
+
+        kwargs = dict(index_name="test-index", model_vendor="openai", local_index_path=str(tmp_path / "index"),
+                      record_cache=True)
+        Analyzer(**kwargs).ingest(str(log))
+        analyzer = Analyzer(**kwargs)
+        spike = MagicMock(score=3.0, offset=0)
+        spike.describe.return_value = "error spike at 10:05"
+        analyzer.anomalies = {str(log): [spike]}
+        analyzer.rag("what happened between 10:03 and 10:05?")
+        retriever = mock_rag_chain_class.call_args[0][0]
+
+        docs = retriever.invoke({"input": "what happened between 10:03 and 10:05?"})
+        assert [d.page_content for d in docs] == ["2024-01-01 10:03:00 ERROR step 3",
+                                                  "2024-01-01 10:04:00 INFO step 4",
+                                                  "2024-01-01 10:05:00 ERROR step 5",
+                                                  "error spike at 10:05", "similar"]
+
+
+class TestAnalyzerCascade:
+    """Tests for answering through a fast and a strong model"""
+
+    @patch('analyzer.analyzer.create_stuff_documents_chain')
+    @patch('analyzer.analyzer.ChatOllama')
+    @patch('analyzer.analyzer.ChatOpenAI')
+    @patch('analyzer.analyzer.OpenAIEmbeddings')
+    @patch('analyzer.analyzer.Pinecone')
+    @patch('analyzer.analyzer.PineconeVectorStore')
+    def test_lookup_question_uses_fast_model(self, mock_vector_store_class, mock_pinecone_class, mock_embeddings,
+                                             mock_llm, mock_fast_llm, mock_qa_chain_class, tmp_path):
+        """Test that rag answers a lookup with the fast model and records the route"""
+        docs = [Document(page_content="2024-01-01 ERROR disk full", metadata={"source": "app.log"})]
+        mock_vector_store_class.return_value.as_retriever.return_value = RunnableLambda(lambda q: docs)
+        mock_qa_chain_class.return_value.invoke.return_value = "3 ERROR lines"
+
+        analyzer = Analyzer(index_name="test-index", model_vendor="openai", fast_llm_model="llama3.2",
+                            local_index_path=str(tmp_path / "index"))
+        answer, sources, contexts = analyzer.rag("how many ERROR lines?")
+
+        assert answer == "3 ERROR lines"
+        assert sources == ["app.log"]
+        assert mock_qa_chain_class.call_args[0][0] is mock_fast_llm.return_value
+        assert analyzer.cascade.metrics.summary()["answered_by"] == {"fast": 1, "strong": 0}
+        assert (tmp_path / "index" / "metrics" / "cascade.jsonl").exists()
+
+
+class TestAnalyzerTriage:
+    """Tests for answering the triage questions after ingest"""
+
+    @patch('analyzer.analyzer.create_retrieval_chain')
+    @patch('analyzer.analyzer.create_stuff_documents_chain')
+    @patch('analyzer.analyzer.TextLoader')
+    @patch('analyzer.analyzer.RecursiveCharacterTextSplitter')
+    @patch('analyzer.analyzer.ChatOpenAI')
+    @patch('analyzer.analyzer.OpenAIEmbeddings')
+    @patch('analyzer.analyzer.Pinecone')
+    @patch('analyzer.analyzer.PineconeVectorStore')
+    def test_triage_answers_are_served_from_store(self, mock_vector_store_class, mock_pinecone_class,
+                                                  mock_embeddings, mock_llm, mock_splitter_class, mock_loader_class,
+                                                  mock_qa_chain_class, mock_rag_chain_class, tmp_path):
+        """Test that triage runs after ingest and repeated questions skip retrieval and generation"""
+        log = tmp_path / "app.log"
+        log.write_text("2024-01-01 00:00:00 ERROR [db] connection refused\n")
+        mock_splitter_class.return_value.split_documents.return_value = [Document(page_content="x")]
+        rag_chain = mock_rag_chain_class.return_value
+        rag_chain.invoke.side_effect = lambda inputs: {
+            "answer": f"answer to {inputs['input']}",
+            "context": [Document(page_content="ERROR [db] connection refused", metadata={"source": str(log)})]}
+
+        kwargs = dict(index_name="test-index", model_vendor="openai", local_index_path=str(tmp_path / "index"),
+                      triage_questions=["What failed?", "When did it start?"])
+        analyzer = Analyzer(**kwargs)
+        analyzer.ingest(str(log), triage=True)
+        next(iter(analyzer.triage.values())).wait()
+        assert rag_chain.invoke.call_count == 2
+
+        answer, sources, contexts = analyzer.rag("what failed?", session_id="s1")
+        assert answer == "answer to What failed?"
+        assert sources == [str(log)]
+        assert contexts == ["ERROR [db] connection refused"]
+        assert rag_chain.invoke.call_count == 2
+        assert analyzer.conversations.get("s1").last_question == "what failed?"
+
+        # a new process serves the stored answers too
+        assert Analyzer(**kwargs).rag("When did it start?")[0] == "answer to When did it start?"
+
+        analyzer.refresh_triage().wait()
+        assert rag_chain.invoke.call_count == 4
+
+    @patch('analyzer.analyzer.create_retrieval_chain')
+    @patch('analyzer.analyzer.create_stuff_documents_chain')
+    @patch('analyzer.analyzer.TextLoader')
+    @patch('analyzer.analyzer.RecursiveCharacterTextSplitter')
+    @patch('analyzer.analyzer.ChatOpenAI')
+    @patch('analyzer.analyzer.OpenAIEmbeddings')
+    @patch('analyzer.analyzer.Pinecone')
+    @patch('analyzer.analyzer.PineconeVectorStore')
+    def test_triage_answers_only_for_their_file(self, mock_vector_store_class, mock_pinecone_class,
+                                                mock_embeddings, mock_llm, mock_splitter_class, mock_loader_class,
+                                                mock_qa_chain_class, mock_rag_chain_class, tmp_path):
+        """Test that answers are served for the file asked about and never for changed or deleted logs"""
+        first, second = tmp_path / "a.log", tmp_path / "b.log"
+        first.write_text("2024-01-01 00:00:00 ERROR [db] connection refused\n")
+        second.write_text("2024-01-01 00:00:00 ERROR [cache] eviction storm\n")
+        mock_splitter_class.return_value.split_documents.return_value = [Document(page_content="x")]
+        rag_chain = mock_rag_chain_class.return_value
+        rag_chain.invoke.side_effect = lambda inputs: {"answer": f"live {rag_chain.invoke.call_count}", "context": []}
+
+        kwargs = dict(index_name="test-index", model_vendor="openai", local_index_path=str(tmp_path / "index"),
+                      triage_questions=["What failed?"])
+        analyzer = Analyzer(**kwargs)
+        for log in (first, second):
+            analyzer.ingest(str(log), triage=True)
+            analyzer.triage[str(log)].wait()
+        first_answer = analyzer.triage[str(first)].peek("What failed?").answer
+
+        assert analyzer.rag("What failed?", file_path=str(first))[0] == first_answer
+        # two triaged files and no file named, the stored answer could be about either
+        assert analyzer.rag("What failed?")[0] == "live 3"
+
+        with open(first, "a") as f:
+            f.write("2024-01-01 00:01:00 INFO recovered\n")
+        second.unlink()
+        reloaded = Analyzer(**kwargs)
+        assert reloaded.triage == {}
+        assert analyzer.triage_answer("What failed?", str(first)) is None
+        assert analyzer.triage_answer("What failed?", str(second)) is None
+
+    @patch('analyzer.analyzer.ChatOpenAI')
+    @patch('analyzer.analyzer.OpenAIEmbeddings')
+    @patch('analyzer.analyzer.Pinecone')
+    def test_triage_through_real_rag(self, mock_pinecone_class, mock_embeddings, mock_llm, tmp_path):
+        """Test that the default questions are answered through the real chain with a chunk store"""
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        from langchain_core.language_models.fake import FakeListLLM
+        mock_embeddings.return_value = DeterministicFakeEmbedding(size=32)
+        mock_llm.return_value = FakeListLLM(responses=["db down"] * 10)
+        log = tmp_path / "app.log"
+        log.write_text("".join(f"2024-01-01 00:00:{i:02d} ERROR [db] connection refused {i}\n" for i in range(20)))
+
+        analyzer = Analyzer(index_name="test-index", model_vendor="openai", vector_backend="local",
+                            local_index_path=str(tmp_path / "index"), embedding_dimension=32, chunk_store=True)
+        analyzer.ingest(str(log), triage=True)
+        triage = analyzer.triage[str(log)]
+        triage.wait()
+
+        assert set(triage.status().values()) == {"ready"}
+        assert triage.peek(analyzer.triage_questions[0]).answer == "db down"
+
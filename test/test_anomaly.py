@@ -0,0 +1,96 @@
+"""
+Unit tests for windowed template anomaly detection in utils/anomaly.py
+"""
+from utils.anomaly import detect_anomalies, is_anomaly_question, load_anomalies, save_anomalies
+from utils.log_parser import LogRecord, parse_record
+
+
+def make_log(minutes=30, spike_minute=None, new_from=None, stop_at=None):
+    records = []
+    for minute in range(minutes):
+        stamp = f"2024-01-01 00:{minute:02d}"
+        for second in range(5):
+            records.append(f"{stamp}:{second:02d} INFO request {minute * 10 + second} served in 5ms")
+        if spike_minute is not None and minute == spike_minute:
+            records += [f"{stamp}:30 WARN pool exhausted, waiting {i}ms" for i in range(40)]
+        elif minute % 3 == 0:
+            records.append(f"{stamp}:30 WARN pool exhausted, waiting 1ms")
+        if new_from is not None and minute >= new_from:
+            records.append(f"{stamp}:40 ERROR connection refused to db 10.0.0.{minute}")
+        if stop_at is None or minute < stop_at:
+            records += [f"{stamp}:50 INFO heartbeat {i}" for i in range(4)]
+    return [parse_record(text, offset=i) for i, text in enumerate(records)]
+
+
+class TestDetectAnomalies:
+    """Tests for spike, new template and disappearance detection"""
+
+    def test_spike(self):
+        """Test that a burst of a known template is ranked first"""
+        anomalies = detect_anomalies(make_log(spike_minute=20))
+        assert anomalies[0].kind == "spike"
+        assert "pool exhausted" in anomalies[0].template
+        assert anomalies[0].count == 40
+
+    def test_new_template(self):
+        """Test that a template appearing late is reported with its first occurrence"""
+        anomalies = detect_anomalies(make_log(new_from=25))
+        new = [a for a in anomalies if a.kind == "new"]
+        assert len(new) == 1
+        assert "connection refused" in new[0].example
+        assert "00:25" in new[0].example
+
+    def test_disappearance(self):
+        """Test that a steady template that stops is reported"""
+        anomalies = detect_anomalies(make_log(stop_at=15))
+        gone = [a for a in anomalies if a.kind == "disappeared"]
+        assert len(gone) == 1
+        assert "heartbeat" in gone[0].template
+        assert "event stopped" in gone[0].describe()
+
+    def test_steady_log_has_no_anomalies(self):
+        """Test that a log without changes yields nothing"""
+        assert detect_anomalies(make_log()) == []
+
+    def test_log_without_timestamps(self):
+        """Test that record positions are used when lines have no timestamps"""
+        records = [parse_record(f"tick {i}") for i in range(5000)] + \
+                  [parse_record(f"disk full, {i} bytes left") for i in range(20)]
+        anomalies = detect_anomalies(records)
+        new = [a for a in anomalies if a.kind == "new"]
+        assert new[0].template == "disk full, <*> bytes left"
+        assert "record 5000" in new[0].describe()
+
+    def test_empty(self):
+        """Test that no records yields no anomalies"""
+        assert detect_anomalies([]) == []
+
+    def test_many_templates_and_windows(self):
+        """Test that a sparse grid far too large to hold densely is scored from its occupied cells"""
+        # 50k templates x 2000 windows would be 800 MB of dense counts
+        records = [LogRecord(offset=i, length=1, text=f"job {i} done", timestamp=1.7e9 + i * 36,
+                             template=f"job {i} done", template_id=i) for i in range(50_000)]
+        records += [LogRecord(offset=50_000 + i, length=1, text="disk full", timestamp=1.7e9 + 1_700_000 + i,
+                              level="ERROR", template="disk full", template_id=-1) for i in range(10)]
+        anomalies = detect_anomalies(records)
+        assert anomalies[0].template == "disk full" and anomalies[0].count == 10
+
+    def test_save_and_load(self, tmp_path):
+        """Test that anomalies round trip through the file next to the index"""
+        anomalies = detect_anomalies(make_log(spike_minute=20))
+        path = str(tmp_path / "anomalies" / "app.log.json")
+        save_anomalies(path, anomalies, "app.log")
+        assert load_anomalies(path) == ("app.log", anomalies)
+
+
+class TestAnomalyQuestion:
+    """Tests for detecting what-went-wrong questions"""
+
+    def test_matching_questions(self):
+        """Test that triage questions are recognized"""
+        assert is_anomaly_question("What went wrong last night?")
+        assert is_anomaly_question("Why did the service crash")
+
+    def test_other_questions(self):
+        """Test that unrelated questions are not"""
+        assert not is_anomaly_question("List the configured endpoints")
@@ -0,0 +1,134 @@
+"""
+Unit tests for the fast / strong model cascade in utils/cascade.py
+"""
+import json
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda
+
+from utils.cascade import CascadeMetrics, LLMCascade, Route, classify_question, self_check
+
+DOCS = [Document(page_content="2024-01-01 10:00:00 ERROR [db] connection to db-7 refused, code E5002")]
+
+
+def tier(answer):
+    calls = []
+    model = RunnableLambda(lambda inputs: calls.append(inputs) or (answer(inputs) if callable(answer) else answer))
+    return model, calls
+
+
+def build(llm):
+    return llm
+
+
+class TestClassifyQuestion:
+    """Tests for the question class router"""
+
+    @pytest.mark.parametrize("question", ["how many ERROR lines?", "when did the first timeout happen?",
+                                          "list the services that logged warnings"])
+    def test_lookups(self, question):
+        """Test that counts, times and listings are lookups"""
+        assert classify_question(question) == "lookup"
+
+    @pytest.mark.parametrize("question", ["why did the db fail?", "what is the root cause of the outage?",
+                                          "how do I fix the connection errors?"])
+    def test_analysis(self, question):
+        """Test that reasoning questions go to the strong model"""
+        assert classify_question(question) == "analysis"
+
+    def test_long_questions_are_analysis(self):
+        """Test that long questions are treated as hard"""
+        assert classify_question(" ".join(["word"] * 30)) == "analysis"
+
+
+class TestSelfCheck:
+    """Tests for accepting fast tier answers"""
+
+    def test_grounded_answer_passes(self):
+        """Test that an answer citing identifiers from the context is accepted"""
+        assert self_check("One error: db-7 refused connections with E5002.", DOCS) == (True, None)
+
+    def test_hedged_answer_fails(self):
+        """Test that an answer admitting it does not know is escalated"""
+        assert self_check("I don't know, the logs do not mention it.", DOCS) == (False, "hedged")
+
+    def test_invented_identifier_fails(self):
+        """Test that identifiers absent from the context are escalated"""
+        ok, reason = self_check("The failing host was db-9.", DOCS)
+        assert not ok
+        assert reason == "ungrounded db-9"
+
+    def test_empty_answer_fails(self):
+        """Test that an empty answer is escalated"""
+        assert self_check("  ", DOCS) == (False, "empty")
+
+
+class TestLLMCascade:
+    """Tests for routing questions across tiers"""
+
+    def test_lookup_answered_by_fast_tier(self):
+        """Test that a good fast answer is returned without calling the strong model"""
+        fast, fast_calls = tier("There was 1 error, on db-7.")
+        strong, strong_calls = tier("strong")
+        cascade = LLMCascade(fast, strong)
+
+        answer = cascade.answer(build, {"input": "how many errors?"}, "how many errors?", DOCS)
+
+        assert answer == "There was 1 error, on db-7."
+        assert len(fast_calls) == 1 and not strong_calls
+        route = cascade.metrics.routes[-1]
+        assert (route.question_class, route.tiers, route.escalated) == ("lookup", ["fast"], False)
+
+    def test_failed_check_escalates(self):
+        """Test that a hedged fast answer is replaced by the strong model's"""
+        fast, _ = tier("Not enough information.")
+        strong, strong_calls = tier("db-7 refused connections")
+        cascade = LLMCascade(fast, strong)
+
+        assert cascade.answer(build, {}, "which host failed?", DOCS) == "db-7 refused connections"
+        route = cascade.metrics.routes[-1]
+        assert route.tiers == ["fast", "strong"]
+        assert route.escalated and route.reason == "hedged"
+        assert set(route.latency) == {"fast", "strong"}
+
+    def test_fast_tier_errors_escalate(self):
+        """Test that a failing fast model does not fail the question"""
+        fast = RunnableLambda(lambda inputs: (_ for _ in ()).throw(ConnectionError("ollama down")))
+        strong, _ = tier("ok")
+        cascade = LLMCascade(fast, strong)
+
+        assert cascade.answer(build, {}, "how many errors?", DOCS) == "ok"
+        assert cascade.metrics.routes[-1].reason == "error ConnectionError"
+
+    def test_analysis_skips_fast_tier(self):
+        """Test that analysis questions go straight to the strong model"""
+        fast, fast_calls = tier("fast")
+        strong, _ = tier("because the pool was exhausted")
+        cascade = LLMCascade(fast, strong)
+
+        cascade.answer(build, {}, "why did the db fail?", DOCS)
+        assert not fast_calls
+        assert cascade.metrics.routes[-1].tiers == ["strong"]
+
+
+class TestCascadeMetrics:
+    """Tests for routing metrics"""
+
+    def test_summary_and_file(self, tmp_path):
+        """Test that routes are summarised and appended as JSON lines"""
+        path = tmp_path / "metrics" / "cascade.jsonl"
+        metrics = CascadeMetrics(str(path))
+        metrics.record(Route("lookup", tiers=["fast"], latency={"fast": 0.2}))
+        metrics.record(Route("lookup", tiers=["fast", "strong"], latency={"fast": 0.2, "strong": 2.0},
+                             escalated=True, reason="hedged"))
+        metrics.record(Route("analysis", tiers=["strong"], latency={"strong": 3.0}))
+
+        summary = metrics.summary()
+        assert summary["answered_by"] == {"fast": 1, "strong": 2}
+        assert summary["classes"] == {"lookup": 2, "analysis": 1}
+        assert summary["escalation_rate"] == pytest.approx(1 / 3)
+        assert summary["latency"]["fast"]["calls"] == 2
+        assert summary["p50_answer_s"] == pytest.approx(2.2)
+        lines = [json.loads(line) for line in path.read_text().splitlines()]
+        assert [line["answered_by"] for line in lines] == ["fast", "strong", "strong"]
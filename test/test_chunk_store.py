@@ -0,0 +1,156 @@
+"""
+Unit tests for the offset referenced chunk store in utils/chunk_store.py
+"""
+import pytest
+from unittest.mock import MagicMock
+from langchain_core.documents import Document
+
+from utils.chunk_store import BlockFile, ChunkStore, group_records, upsert_references
+from utils.log_parser import parse_file
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    lines = [f"2024-01-01 00:00:{i:02d} {'ERROR' if i == 5 else 'INFO'} event number {i} ünïcode" for i in range(40)]
+    path = tmp_path / "app.log"
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return path
+
+
+def ingest(store, path, compress=False, chunk_size=100):
+    records = parse_file(str(path))
+    chunks = group_records(records, chunk_size=chunk_size)
+    file_id = store.add_file(str(path), compress=compress)
+    return chunks, store.add_chunks(file_id, chunks)
+
+
+class TestGroupRecords:
+    """Tests for packing records into chunks"""
+
+    def test_records_are_not_split(self, log_file):
+        """Test that chunks hold whole records up to the size budget"""
+        records = parse_file(str(log_file))
+        chunks = group_records(records, chunk_size=150)
+        assert sum(len(c) for c in chunks) == len(records)
+        assert all(sum(r.length for r in c) <= 150 for c in chunks)
+        assert all(len(c) > 1 for c in chunks)
+
+
+class TestChunkStore:
+    """Tests for the chunk table and text resolution"""
+
+    @pytest.mark.parametrize("compress", [False, True])
+    def test_text_is_read_from_file(self, tmp_path, log_file, compress):
+        """Test that chunk text is resolved by byte offsets from the mmapped or compressed file"""
+        store = ChunkStore(str(tmp_path / "chunks"))
+        chunks, ids = ingest(store, log_file, compress=compress)
+        for chunk, chunk_id in zip(chunks, ids):
+            assert store.text(chunk_id) == "\n".join(r.text for r in chunk)
+
+    def test_parsed_fields_and_metadata(self, tmp_path, log_file):
+        """Test that level and timestamp are kept in the table"""
+        store = ChunkStore(str(tmp_path / "chunks"))
+        _, ids = ingest(store, log_file, chunk_size=1)
+        metadata = store.metadata(ids[5])
+        assert metadata["level"] == "ERROR"
+        assert metadata["source"] == str(log_file)
+        assert metadata["chunk_id"] == ids[5]
+        assert store.table[ids[5]]["timestamp"] == pytest.approx(1704067205)
+
+    def test_persistence(self, tmp_path, log_file):
+        """Test that a reopened store resolves the same texts"""
+        store = ChunkStore(str(tmp_path / "chunks"))
+        _, ids = ingest(store, log_file)
+        reopened = ChunkStore(str(tmp_path / "chunks"))
+        assert len(reopened) == len(ids)
+        assert reopened.text(ids[3]) == store.text(ids[3])
+
+    def test_changed_file_is_not_read(self, tmp_path, log_file):
+        """Test that a log changed or removed since ingest raises instead of returning other lines"""
+        store = ChunkStore(str(tmp_path / "chunks"))
+        _, ids = ingest(store, log_file)
+        log_file.write_text("2024-01-02 00:00:00 INFO rotated\n" * 40)
+        with pytest.raises(ValueError, match="changed after it was ingested"):
+            store.text(ids[0])
+        log_file.unlink()
+        with pytest.raises(ValueError, match="removed after it was ingested"):
+            ChunkStore(str(tmp_path / "chunks")).text(ids[0])
+
+    def test_compressed_copy_survives_changes(self, tmp_path, log_file):
+        """Test that chunks kept as a compressed copy still resolve after the log changes"""
+        store = ChunkStore(str(tmp_path / "chunks"))
+        chunks, ids = ingest(store, log_file, compress=True)
+        log_file.write_text("rotated\n")
+        assert store.text(ids[0]) == "\n".join(r.text for r in chunks[0])
+
+    @pytest.mark.parametrize("compress", [False, True])
+    def test_stores_sharing_a_directory(self, tmp_path, log_file, compress):
+        """Test that two stores over one directory never hand out the same ids or lose each other's files"""
+        other = tmp_path / "b.log"
+        other.write_text("".join(f"2024-01-01 00:01:{i:02d} INFO bravo {i}\n" for i in range(40)))
+        first, second = ChunkStore(str(tmp_path / "chunks")), ChunkStore(str(tmp_path / "chunks"))
+        chunks_a, ids_a = ingest(first, log_file, compress=compress)
+        chunks_b, ids_b = ingest(second, other, compress=compress)
+        assert not set(ids_a) & set(ids_b)
+
+        reopened = ChunkStore(str(tmp_path / "chunks"))
+        assert [f["source"] for f in reopened.files] == [str(log_file), str(other)]
+        assert reopened.text(ids_a[0]) == "\n".join(r.text for r in chunks_a[0])
+        assert reopened.text(ids_b[0]) == "\n".join(r.text for r in chunks_b[0])
+        # a hit found by another store is resolved by one that has not seen it yet
+        assert first.text(ids_b[-1]) == "\n".join(r.text for r in chunks_b[-1])
+        assert first.source(ids_b[-1]) == str(other)
+
+    def test_neighbours_stay_in_file(self, tmp_path, log_file):
+        """Test that neighbours do not cross into another file"""
+        store = ChunkStore(str(tmp_path / "chunks"))
+        _, first = ingest(store, log_file)
+        _, second = ingest(store, log_file)
+        assert store.neighbours(first[-1], before=1, after=2) == [first[-2], first[-1]]
+        assert store.neighbours(second[0], before=2, after=1) == [second[0], second[1]]
+
+    def test_surrounding_lines(self, tmp_path, log_file):
+        """Test that raw lines before and after a chunk are read from the file"""
+        store = ChunkStore(str(tmp_path / "chunks"))
+        _, ids = ingest(store, log_file, chunk_size=1)
+        text = store.surrounding(ids[10], lines_before=2, lines_after=1)
+        assert [line.split()[5] for line in text.splitlines()] == ["8", "9", "10", "11"]
+
+    def test_resolve_fills_only_empty_documents(self, tmp_path, log_file):
+        """Test that retrieved reference documents get their text"""
+        store = ChunkStore(str(tmp_path / "chunks"))
+        _, ids = ingest(store, log_file)
+        docs = store.resolve([Document(page_content="", metadata={"chunk_id": ids[0]}),
+                              Document(page_content="summary", metadata={"kind": "summary"})])
+        assert docs[0].page_content == store.text(ids[0])
+        assert docs[1].page_content == "summary"
+
+
+class TestBlockFile:
+    """Tests for block compressed reads"""
+
+    def test_reads_across_blocks(self, tmp_path):
+        """Test that ranges spanning several blocks are read exactly"""
+        source = tmp_path / "data.log"
+        data = bytes(range(256)) * 100
+        source.write_bytes(data)
+        blocks = BlockFile.write(str(source), str(tmp_path / "data.zblk"), block_size=1000)
+        assert blocks.read(950, 2100) == data[950:3050]
+        assert blocks.read(25500, 500) == data[25500:]
+
+
+class TestUpsertReferences:
+    """Tests for writing vectors without chunk text"""
+
+    def test_pinecone_metadata_has_empty_text(self):
+        """Test that Pinecone upserts carry the reference and an empty text field"""
+        vector_store = MagicMock(spec=["embeddings", "index", "_text_key"])
+        vector_store._text_key = "text"
+        vector_store.embeddings.embed_documents.side_effect = lambda texts: [[1.0]] * len(texts)
+
+        upsert_references(vector_store, ["a", "b", "c"], [{"chunk_id": i} for i in range(3)],
+                          ["0", "1", "2"], batch_size=2)
+
+        batches = [c[1]["vectors"] for c in vector_store.index.upsert.call_args_list]
+        assert [len(b) for b in batches] == [2, 1]
+        assert batches[0][1] == ("1", [1.0], {"chunk_id": 1, "text": ""})
@@ -0,0 +1,182 @@
+"""
+Unit tests for the command line entry point in cli.py
+"""
+import json
+import pytest
+from unittest.mock import MagicMock, patch
+
+import cli
+
+
+@pytest.fixture
+def log_files(tmp_path):
+    for name in ("a.log", "b.log", "notes.txt"):
+        (tmp_path / name).write_text("2024-01-01 ERROR boom\n")
+    return tmp_path
+
+
+@pytest.fixture
+def questions_file(tmp_path):
+    path = tmp_path / "questions.txt"
+    path.write_text("# triage\nWhat failed?\n\nWhen did it start?\n")
+    return path
+
+
+class TestCliHelpers:
+    """Tests for path expansion and question parsing"""
+
+    def test_expand_paths_glob(self, log_files):
+        """Test that glob patterns expand to matching files only"""
+        paths = cli.expand_paths([str(log_files / "*.log")])
+        assert [p.split("/")[-1] for p in paths] == ["a.log", "b.log"]
+
+    def test_expand_paths_deduplicates_and_reports_missing(self, log_files):
+        """Test that duplicates are dropped and missing explicit paths are reported"""
+        a = str(log_files / "a.log")
+        missing = []
+        paths = cli.expand_paths([a, a, str(log_files / "missing.log"), str(log_files / "*.gz")], missing)
+        assert paths == [a]
+        assert missing == [str(log_files / "missing.log")]
+
+    def test_read_questions_skips_blank_and_comments(self, questions_file):
+        """Test that blank lines and comments are ignored"""
+        assert cli.read_questions(str(questions_file)) == ["What failed?", "When did it start?"]
+
+    def test_rate_limits_with_target_latency(self):
+        """Test that the latency target only rides along when rate limiting is on"""
+        assert cli.rate_limits(100, None, 2.5) == {"requests_per_minute": 100, "target_latency": 2.5}
+        assert cli.rate_limits(None, None, 2.5) is None
+
+
+class TestCliCommands:
+    """Tests for the ingest, query and run commands"""
+
+    @patch('cli.Analyzer')
+    def test_ingest_does_not_query(self, mock_analyzer_class, log_files):
+        """Test that ingest ingests every file and never calls rag"""
+        analyzer = MagicMock()
+        analyzer.ingest.return_value = 3
+        mock_analyzer_class.return_value = analyzer
+
+        status = cli.main(["--workers", "2", "ingest", str(log_files / "*.log"), "--create-index"])
+
+        assert status == 0
+        assert analyzer.ingest.call_count == 2
+        analyzer.rag.assert_not_called()
+        assert mock_analyzer_class.call_args[1]["skip_create_index"] is False
+
+    @patch('cli.Analyzer')
+    def test_query_writes_jsonl_in_order(self, mock_analyzer_class, questions_file, tmp_path):
+        """Test that query writes one JSON record per question in question order"""
+        analyzer = MagicMock()
+        analyzer.rag.side_effect = lambda q: (f"answer to {q}", ["a.log"], ["ctx"])
+        mock_analyzer_class.return_value = analyzer
+        output = tmp_path / "out.jsonl"
+
+        status = cli.main(["query", "--questions", str(questions_file), "--output", str(output)])
+
+        records = [json.loads(line) for line in output.read_text().splitlines()]
+        assert status == 0
+        assert [r["question"] for r in records] == ["What failed?", "When did it start?"]
+        assert records[0]["answer"] == "answer to What failed?"
+        assert records[0]["sources"] == ["a.log"]
+        assert records[0]["contexts"] == ["ctx"]
+        analyzer.ingest.assert_not_called()
+        assert mock_analyzer_class.call_args[1]["skip_create_index"] is True
+
+    @patch('cli.Analyzer')
+    def test_query_records_errors(self, mock_analyzer_class, questions_file, tmp_path):
+        """Test that a failing question is recorded instead of aborting the run"""
+        analyzer = MagicMock()
+        analyzer.rag.side_effect = RuntimeError("llm down")
+        mock_analyzer_class.return_value = analyzer
+        output = tmp_path / "out.jsonl"
+
+        cli.main(["query", "--questions", str(questions_file), "--output", str(output)])
+
+        records = [json.loads(line) for line in output.read_text().splitlines()]
+        assert records[0]["error"] == "llm down"
+
+    @patch('cli.Analyzer')
+    def test_run_to_stdout(self, mock_analyzer_class, log_files, questions_file, capsys):
+        """Test that run ingests then answers and keeps stdout as pure JSON lines"""
+        analyzer = MagicMock()
+        analyzer.ingest.side_effect = lambda path, **kwargs: print("ingestion started......") or 1
+        analyzer.rag.return_value = ("ok", [], [])
+        mock_analyzer_class.return_value = analyzer
+
+        status = cli.main(["run", str(log_files / "a.log"), "--questions", str(questions_file)])
+
+        out = capsys.readouterr().out
+        assert status == 0
+        assert [json.loads(line)["answer"] for line in out.splitlines()] == ["ok", "ok"]
+
+    @patch('cli.Analyzer')
+    def test_ingest_without_matches_fails(self, mock_analyzer_class, tmp_path):
+        """Test that ingest exits non-zero when no files match"""
+        assert cli.main(["ingest", str(tmp_path / "*.log")]) == 1
+
+    @patch('cli.Analyzer')
+    def test_ingest_with_missing_file_fails(self, mock_analyzer_class, log_files, capsys):
+        """Test that a mistyped path is an error instead of being skipped"""
+        status = cli.main(["ingest", str(log_files / "a.log"), str(log_files / "typo.log")])
+        assert status == 1
+        assert f"No such log file: {log_files / 'typo.log'}" in capsys.readouterr().err
+        mock_analyzer_class.return_value.ingest.assert_not_called()
+
+    @patch('cli.Analyzer')
+    def test_ingest_waits_for_triage(self, mock_analyzer_class, log_files):
+        """Test that ingest --triage triages every file and waits for the answers before exiting"""
+        analyzer = MagicMock()
+        analyzer.ingest.return_value = 1
+        triage = MagicMock()
+        analyzer.triage = {"a.log": triage}
+        mock_analyzer_class.return_value = analyzer
+
+        assert cli.main(["ingest", str(log_files / "a.log"), "--triage"]) == 0
+
+        assert analyzer.ingest.call_args[1]["triage"] is True
+        triage.wait.assert_called_once()
+
+    @patch('cli.Analyzer')
+    def test_query_batching_flags(self, mock_analyzer_class, questions_file, tmp_path):
+        """Test that --batch-wait-ms turns on query embedding batching"""
+        mock_analyzer_class.return_value.rag.return_value = ("ok", [], [])
+
+        cli.main(["--batch-wait-ms", "5", "--batch-size", "16", "query", "--questions", str(questions_file),
+                  "--output", str(tmp_path / "out.jsonl")])
+
+        assert mock_analyzer_class.call_args[1]["query_batching"] == {"max_wait": 0.005, "max_batch": 16}
+
+
+class TestCliTune:
+    """Tests for the tune command"""
+
+    @patch('cli.sweep')
+    @patch('cli.Analyzer')
+    def test_tune_writes_recommended_config(self, mock_analyzer_class, mock_sweep, tmp_path, capsys):
+        """Test that the grid flags reach the sweep and the recommendation is saved"""
+        from utils.retrieval_config import RetrievalConfig
+        from utils.tuner import TuningResult
+        pairs = tmp_path / "pairs.jsonl"
+        pairs.write_text(json.dumps({"question": "q", "expected": "e"}) + "\n")
+        mock_sweep.return_value = [
+            TuningResult(RetrievalConfig(chunk_size=500), recall=1.0, vectors=10, ingest_seconds=1, query_seconds=0.1),
+            TuningResult(RetrievalConfig(chunk_size=100), recall=1.0, vectors=40, ingest_seconds=2, query_seconds=0.1)]
+        output = tmp_path / "retrieval.json"
+
+        status = cli.main(["tune", str(tmp_path / "sample.log"), "--pairs", str(pairs), "--output", str(output),
+                           "--chunk-sizes", "100", "500", "--k", "4"])
+
+        assert status == 0
+        grid = mock_sweep.call_args[0][3]
+        assert grid == {"chunk_size": [100, 500], "k": [4]}
+        assert mock_sweep.call_args[0][4] is False
+        assert mock_sweep.call_args[0][1] == [("q", "e")]
+        assert RetrievalConfig.load(str(output)).chunk_size == 500
+        assert "recommended chunk 500/0" in capsys.readouterr().out
+
+        # the analyzer chunks whole records with the chunk store, the sweep has to score the same chunks
+        cli.main(["--chunk-store", "tune", str(tmp_path / "sample.log"), "--pairs", str(pairs),
+                  "--output", str(output)])
+        assert mock_sweep.call_args[0][4] is True
@@ -0,0 +1,84 @@
+"""
+Unit tests for conversation state in utils/conversation.py
+"""
+import pytest
+from langchain_core.documents import Document
+
+from utils.conversation import Conversation, Conversations, follow_up_window, is_follow_up, names_new_entities
+
+
+class TestFollowUps:
+    """Tests for recognising follow-up questions"""
+
+    @pytest.mark.parametrize("prompt", ["and what happened right after that?", "Why did it fail?",
+                                        "what about the billing service?", "show me more about that error",
+                                        "before that?"])
+    def test_follow_ups(self, prompt):
+        """Test that questions referring back are follow-ups"""
+        assert is_follow_up(prompt)
+
+    @pytest.mark.parametrize("prompt", ["What went wrong in the payment service?",
+                                        "Summarize the errors that occurred after midnight",
+                                        "Why did the payment service fail at 10:32?", "Is there a database error?",
+                                        "Are there any timeouts?", "Is this normal?", "", None])
+    def test_standalone_questions(self, prompt):
+        """Test that standalone questions start a fresh search"""
+        assert not is_follow_up(prompt)
+
+    def test_new_entities(self):
+        """Test that times, identifiers and named services count as new, back-references do not"""
+        assert names_new_entities("and what happened at 10:32?")
+        assert names_new_entities("what about the billing service?")
+        assert names_new_entities("and for request ab12cd34?")
+        assert not names_new_entities("and what happened right after that?")
+        assert not names_new_entities("and the same service?")
+        assert not names_new_entities("")
+
+    def test_window_follows_direction(self):
+        """Test that the neighbour window looks forward, backward or both ways"""
+        assert follow_up_window("and what happened right after that?") == (0, 2)
+        assert follow_up_window("what led up to it, what happened before?") == (2, 0)
+        assert follow_up_window("why did it fail?") == (1, 1)
+
+
+class TestConversation:
+    """Tests for the per-session context"""
+
+    def test_context_only_grows_by_appending(self):
+        """Test that earlier context stays first so the prompt prefix is stable"""
+        conversation = Conversation()
+        first = conversation.extend([Document(page_content="a", metadata={"chunk_id": 1})])
+        second = conversation.extend([Document(page_content="a", metadata={"chunk_id": 1}),
+                                      Document(page_content="b", metadata={"chunk_id": 2})])
+        assert [d.page_content for d in second[:len(first)]] == ["a"]
+        assert [d.page_content for d in second] == ["a", "b"]
+        assert conversation.last_chunk_ids == [2]
+        assert conversation.chunk_ids() == {1, 2}
+
+    def test_context_starts_over_when_full(self):
+        """Test that the context is bounded"""
+        conversation = Conversation(max_context_docs=3)
+        conversation.extend([Document(page_content=str(i)) for i in range(3)])
+        context = conversation.extend([Document(page_content="new")])
+        assert [d.page_content for d in context] == ["new"]
+
+    def test_history_is_bounded(self):
+        """Test that only the last max_turns turns are kept"""
+        conversation = Conversation(max_turns=2)
+        for i in range(5):
+            conversation.record(f"q{i}", f"a{i}")
+        assert conversation.history == [("human", "q3"), ("ai", "a3"), ("human", "q4"), ("ai", "a4")]
+        assert conversation.last_question == "q4"
+
+
+class TestConversations:
+    """Tests for the session registry"""
+
+    def test_sessions_are_separate_and_bounded(self):
+        """Test that sessions do not share state and old ones are dropped"""
+        conversations = Conversations(max_sessions=2)
+        conversations.get("a").record("q", "a")
+        assert conversations.get("b").history == []
+        conversations.get("c")
+        assert len(conversations) == 2
+        assert conversations.get("a").history == []
@@ -0,0 +1,110 @@
+"""
+Unit tests for the cross-service correlation index in utils/correlation.py
+"""
+import os
+
+import pytest
+
+from utils.correlation import CorrelationIndex, id_key
+from utils.log_parser import parse_file
+
+
+@pytest.fixture
+def service_logs(tmp_path):
+    gateway = tmp_path / "gateway.log"
+    gateway.write_text("2024-01-01 10:00:00 INFO [gateway] POST /pay request_id=req-7f3a91 from 10.0.0.1\n"
+                       "2024-01-01 10:00:01 INFO [gateway] GET /health request_id=req-000001\n"
+                       "2024-01-01 10:00:05 ERROR [gateway] upstream failed request_id=req-7f3a91 status=502\n")
+    billing = tmp_path / "billing.log"
+    billing.write_text("2024-01-01 10:00:02 INFO [billing] charge started reqId: req-7f3a91 user=42\n"
+                       "2024-01-01 10:00:04 ERROR [billing] card declined reqId: req-7f3a91\n"
+                       "2024-01-01 10:00:06 INFO [billing] traceparent=00-4bf92f3577b34da6a3ce929d0e0e4736-"
+                       "00f067aa0ba902b7-01 refund queued\n")
+    return gateway, billing
+
+
+def build(tmp_path, *paths, **kwargs):
+    index = CorrelationIndex(str(tmp_path / "correlation"), **kwargs)
+    for path in paths:
+        index.add_records(str(path), parse_file(str(path)))
+    return index
+
+
+class TestExtractIds:
+    """Tests for identifier extraction"""
+
+    def test_default_patterns(self, tmp_path):
+        """Test that key=value ids, traceparent and uuids are extracted"""
+        index = CorrelationIndex(str(tmp_path))
+        assert index.extract_ids("x-request-id: \"abc-123456\" trace_id=ffee0011") == ["abc-123456", "ffee0011"]
+        assert index.extract_ids("traceparent: 00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01") == \
+            ["4bf92f3577b34da6a3ce929d0e0e4736"]
+        assert index.extract_ids("job 123e4567-e89b-12d3-a456-426614174000 done") == \
+            ["123e4567-e89b-12d3-a456-426614174000"]
+        assert index.extract_ids("INFO served in 5ms") == []
+
+    def test_custom_patterns(self, tmp_path):
+        """Test that configured patterns replace the defaults"""
+        index = CorrelationIndex(str(tmp_path), patterns=[r"\border#(\d{4,})"])
+        assert index.extract_ids("order#98765 shipped request_id=abcdef") == ["98765"]
+
+
+class TestCorrelationIndex:
+    """Tests for building and reading timelines"""
+
+    def test_timeline_spans_files_in_time_order(self, tmp_path, service_logs):
+        """Test that one id brings back every record of the request across services"""
+        gateway, billing = service_logs
+        index = build(tmp_path, gateway, billing)
+        events = index.timeline("req-7f3a91")
+        assert [e.text[11:19] for e in events] == ["10:00:00", "10:00:02", "10:00:04", "10:00:05"]
+        assert {e.source for e in events} == {str(gateway), str(billing)}
+        assert index.timeline("REQ-7F3A91") == events
+
+    def test_persisted_and_reloaded(self, tmp_path, service_logs):
+        """Test that the index spans files ingested by different instances"""
+        gateway, billing = service_logs
+        build(tmp_path, gateway)
+        index = build(tmp_path, billing)
+        assert index.files == [str(gateway), str(billing)]
+        assert len(index.timeline("req-7f3a91")) == 4
+
+    def test_indexes_sharing_a_directory(self, tmp_path, service_logs):
+        """Test that two open indexes over one directory keep each other's files"""
+        gateway, billing = service_logs
+        first = CorrelationIndex(str(tmp_path / "correlation"))
+        second = CorrelationIndex(str(tmp_path / "correlation"))
+        first.add_records(str(gateway), parse_file(str(gateway)))
+        second.add_records(str(billing), parse_file(str(billing)))
+
+        reopened = CorrelationIndex(str(tmp_path / "correlation"))
+        assert reopened.files == [str(gateway), str(billing)]
+        assert len(reopened.timeline("req-7f3a91")) == 4
+        assert len(first.timeline("req-7f3a91")) == 4
+
+    def test_relative_paths_survive_a_directory_change(self, tmp_path, service_logs, monkeypatch):
+        """Test that files ingested by relative path are read back from another working directory"""
+        gateway, _ = service_logs
+        monkeypatch.chdir(tmp_path)
+        build(tmp_path, "gateway.log")
+        monkeypatch.chdir(os.path.dirname(os.path.dirname(__file__)))
+        index = CorrelationIndex(str(tmp_path / "correlation"))
+        assert index.files == [str(gateway)]
+        assert len(index.timeline("req-7f3a91")) == 2
+
+    def test_entity_ids_are_ignored(self, tmp_path, service_logs):
+        """Test that ids on too many records do not flood the context"""
+        gateway, billing = service_logs
+        index = build(tmp_path, gateway, billing, max_occurrences=3)
+        assert index.timeline("req-7f3a91") == []
+        assert len(index.timeline("req-000001")) == 1
+
+    def test_find_ids_in_questions(self, tmp_path, service_logs):
+        """Test that bare ids in a question are found when they are indexed"""
+        index = build(tmp_path, *service_logs)
+        assert index.find_ids("what happened to req-7f3a91 and req-999999?") == ["req-7f3a91"]
+        assert index.find_ids("trace 4bf92f3577b34da6a3ce929d0e0e4736 please") == ["4bf92f3577b34da6a3ce929d0e0e4736"]
+
+    def test_keys_are_case_insensitive(self):
+        """Test that ids hash the same whatever their case"""
+        assert id_key("ABC-123") == id_key("abc-123") != id_key("abc-124")
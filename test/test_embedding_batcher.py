@@ -0,0 +1,139 @@
+"""
+Unit tests for query embedding micro-batching in utils/embedding_batcher.py
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from unittest.mock import MagicMock
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from utils.embedding_batcher import BatchingEmbeddings, MicroBatcher, query_batcher
+from utils.rate_limiter import RateBudget, RateLimitedEmbeddings
+
+
+class FakeProvider(Embeddings):
+    """Embeds texts as their length and records every batched call."""
+
+    def __init__(self, latency: float = 0.02):
+        self.latency = latency
+        self.calls: List[List[str]] = []
+        self.lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [[float(len(t))] for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.latency)
+        return [float(len(text))]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        with self.lock:
+            self.calls.append(list(texts))
+        time.sleep(self.latency)
+        return [[-float(len(t))] for t in texts]
+
+
+class TestQueryBatcher:
+    """Tests for choosing the batched query call of a model"""
+
+    def test_explicit_batch_method(self):
+        """Test that an embed_queries method is used when the model has one"""
+        provider = FakeProvider(latency=0)
+        assert query_batcher(provider)(["ab"]) == [[-2.0]]
+
+    def test_unknown_model_is_not_batched(self):
+        """Test that models without a known batched query call get no batcher"""
+        assert query_batcher(MagicMock(spec=Embeddings)) is None
+
+    def test_rate_limited_batches_spend_one_request(self):
+        """Test that a batch through a rate limited model counts as one request"""
+        budget = RateBudget(requests_per_minute=600)
+        budget.call = MagicMock(side_effect=lambda fn, tokens: fn())
+        embed = query_batcher(RateLimitedEmbeddings(FakeProvider(latency=0), budget))
+        assert embed(["a", "bb"]) == [[-1.0], [-2.0]]
+        budget.call.assert_called_once()
+
+
+class TestMicroBatcher:
+    """Tests for coalescing concurrent query embeddings"""
+
+    def test_concurrent_queries_share_calls(self):
+        """Test that concurrent callers are answered from a few batched calls"""
+        provider = FakeProvider()
+        batcher = MicroBatcher(provider.embed_queries, max_batch=8, max_wait=0.02)
+        texts = [f"question {'x' * i}" for i in range(32)]
+        with ThreadPoolExecutor(max_workers=32) as pool:
+            vectors = list(pool.map(batcher.embed, texts))
+
+        assert vectors == [[-float(len(t))] for t in texts]
+        assert len(provider.calls) < 32
+        assert max(len(call) for call in provider.calls) <= 8
+        assert batcher.requests == 32
+
+    def test_duplicate_texts_embedded_once(self):
+        """Test that identical questions in one batch are sent once"""
+        provider = FakeProvider()
+        batcher = MicroBatcher(provider.embed_queries, max_wait=0.05)
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            vectors = list(pool.map(batcher.embed, ["same"] * 4))
+        assert vectors == [[-4.0]] * 4
+        assert sum(len(call) for call in provider.calls) < 4
+
+    def test_single_caller_waits_at_most_max_wait(self):
+        """Test that a lone question is not held back longer than the window"""
+        provider = FakeProvider(latency=0)
+        batcher = MicroBatcher(provider.embed_queries, max_wait=0.01)
+        start = time.monotonic()
+        batcher.embed("alone")
+        assert time.monotonic() - start < 0.5
+
+    def test_errors_reach_every_caller(self):
+        """Test that a failed batch raises in each waiting caller"""
+        batcher = MicroBatcher(MagicMock(side_effect=RuntimeError("down")), max_wait=0.01)
+        with pytest.raises(RuntimeError, match="down"):
+            batcher.embed("q")
+        batcher.embed_batch = lambda texts: [[1.0] for _ in texts]
+        assert batcher.embed("q") == [1.0]
+
+
+class TestBatchingEmbeddings:
+    """Tests for the LangChain embeddings wrapper"""
+
+    def test_documents_pass_through(self):
+        """Test that ingest embeddings are not delayed by the batcher"""
+        embeddings = BatchingEmbeddings(FakeProvider(latency=0))
+        assert embeddings.embed_documents(["abc"]) == [[3.0]]
+        assert embeddings.embed_query("abc") == [-3.0]
+
+    def test_unbatchable_model_falls_back(self):
+        """Test that models without a batched call embed queries one by one"""
+        inner = MagicMock(spec=Embeddings)
+        inner.embed_query.return_value = [0.5]
+        embeddings = BatchingEmbeddings(inner)
+        assert embeddings.batcher is None
+        assert embeddings.embed_query("q") == [0.5]
+
+    def test_shared_per_key(self):
+        """Test that analyzers of one model share a batcher but keep their own client"""
+        BatchingEmbeddings._batchers.clear()
+        first = BatchingEmbeddings.shared("vendor:model", FakeProvider(latency=0))
+        provider = FakeProvider(latency=0)
+        second = BatchingEmbeddings.shared("vendor:model", provider)
+        assert second.batcher is first.batcher
+        assert second.embeddings is provider
+        assert BatchingEmbeddings.shared("vendor:other", FakeProvider(latency=0)).batcher is not first.batcher
+        BatchingEmbeddings._batchers.clear()
+
+    def test_shared_only_with_equal_settings(self):
+        """Test that other client settings, rate budgets or batching settings get their own batcher"""
+        BatchingEmbeddings._batchers.clear()
+        first = BatchingEmbeddings.shared("vendor:model", FakeProvider(latency=0))
+        assert BatchingEmbeddings.shared("vendor:model", FakeProvider(latency=1)).batcher is not first.batcher
+        assert BatchingEmbeddings.shared("vendor:model", FakeProvider(latency=0),
+                                         max_batch=8).batcher is not first.batcher
+        limited = RateLimitedEmbeddings(FakeProvider(latency=0), RateBudget(requests_per_minute=600))
+        assert BatchingEmbeddings.shared("vendor:model", limited).batcher is not first.batcher
+        BatchingEmbeddings._batchers.clear()
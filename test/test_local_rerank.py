@@ -0,0 +1,126 @@
+"""
+Unit tests for local MMR and reranking in utils/local_rerank.py
+"""
+import numpy as np
+from unittest.mock import MagicMock
+
+from langchain_core.documents import Document
+
+from utils.local_rerank import LexicalRecencyReranker, LocalMMRRetriever, VectorCache, fetch_vectors, mmr_select
+
+
+def reference_mmr(candidates, relevance, k, lambda_mult):
+    unit = candidates / np.linalg.norm(candidates, axis=1, keepdims=True)
+    selected = [int(np.argmax(relevance))]
+    while len(selected) < min(k, len(unit)):
+        best, best_score = None, -np.inf
+        for i in range(len(unit)):
+            if i in selected:
+                continue
+            redundancy = max(float(unit[i] @ unit[j]) for j in selected)
+            score = lambda_mult * relevance[i] - (1 - lambda_mult) * redundancy
+            if score > best_score:
+                best, best_score = i, score
+        selected.append(best)
+    return selected
+
+
+class TestMMRSelect:
+    """Tests for the vectorized MMR selection"""
+
+    def test_matches_reference(self):
+        """Test that the running redundancy gives the same picks as the textbook loop"""
+        rng = np.random.default_rng(1)
+        candidates = rng.standard_normal((40, 16)).astype(np.float32)
+        relevance = rng.random(40).astype(np.float32)
+        for lambda_mult in (0.0, 0.3, 0.5, 1.0):
+            assert mmr_select(candidates, relevance, 6, lambda_mult) == \
+                reference_mmr(candidates, relevance, 6, lambda_mult)
+
+    def test_skips_duplicates(self):
+        """Test that a near duplicate of the first pick loses to a diverse candidate"""
+        candidates = np.array([[1, 0], [1, 0.01], [0, 1]], dtype=np.float32)
+        relevance = np.array([0.9, 0.89, 0.7], dtype=np.float32)
+        assert mmr_select(candidates, relevance, 2, 0.5) == [0, 2]
+
+
+class TestVectorCache:
+    """Tests for the vector LRU"""
+
+    def test_evicts_least_recently_used(self):
+        """Test that the cache keeps its capacity and counts hits and misses"""
+        cache = VectorCache(capacity=2)
+        cache.put_many({"a": np.zeros(2), "b": np.ones(2)})
+        cache.get_many(["a"])
+        cache.put_many({"c": np.ones(2)})
+        found, missing = cache.get_many(["a", "b", "c"])
+        assert sorted(found) == ["a", "c"]
+        assert missing == ["b"]
+        assert (cache.hits, cache.misses) == (3, 1)
+
+
+class TestFetchVectors:
+    """Tests for reading vectors from the vector store"""
+
+    def test_pinecone_fetch(self):
+        """Test that Pinecone backed stores fetch vectors by id"""
+        store = MagicMock(spec=["index"])
+        store.index.fetch.return_value.vectors = {"a": MagicMock(values=[0.5, 0.5])}
+        vectors = fetch_vectors(store, ["a"])
+        store.index.fetch.assert_called_once_with(ids=["a"])
+        assert np.allclose(vectors["a"], [0.5, 0.5])
+
+
+class TestLexicalRecencyReranker:
+    """Tests for the default reranker"""
+
+    def test_prefers_query_words_and_recent_chunks(self):
+        """Test that matching words and newer timestamps raise the score"""
+        docs = [Document(page_content="disk full on node-1", metadata={"timestamp": 0.0}),
+                Document(page_content="request served", metadata={"timestamp": 7200.0}),
+                Document(page_content="disk full on node-1", metadata={"timestamp": 7200.0})]
+        scores = LexicalRecencyReranker()("why is the disk full", docs, np.full(3, 0.5, dtype=np.float32))
+        assert scores[2] > scores[0] > scores[1]
+
+
+class TestLocalMMRRetriever:
+    """Tests for the local retriever"""
+
+    def make_store(self, vectors):
+        store = MagicMock(spec=["similarity_search_by_vector_with_score", "get_vectors"])
+        store.similarity_search_by_vector_with_score.return_value = [
+            (Document(id=id_, page_content=id_), 1.0 - i * 0.01) for i, id_ in enumerate(vectors)]
+        store.get_vectors.side_effect = lambda ids: {id_: vectors[id_] for id_ in ids}
+        return store
+
+    def test_vectors_are_fetched_once(self):
+        """Test that repeated queries read candidate vectors from the cache"""
+        vectors = {"a": np.array([1, 0], dtype=np.float32), "b": np.array([1, 0.01], dtype=np.float32),
+                   "c": np.array([0, 1], dtype=np.float32)}
+        store = self.make_store(vectors)
+        embeddings = MagicMock()
+        embeddings.embed_query.return_value = [1.0, 0.0]
+        retriever = LocalMMRRetriever(store, embeddings, VectorCache(), k=2, fetch_k=3)
+
+        assert [d.id for d in retriever("q")] == ["a", "c"]
+        assert [d.id for d in retriever("q")] == ["a", "c"]
+        store.get_vectors.assert_called_once()
+        store.similarity_search_by_vector_with_score.assert_called_with([1.0, 0.0], k=3)
+
+    def test_resolve_runs_before_rerank(self):
+        """Test that the reranker sees resolved chunk texts"""
+        vectors = {"a": np.array([1, 0], dtype=np.float32)}
+        seen = []
+        reranker = lambda query, docs, relevance: seen.extend(d.page_content for d in docs) or relevance
+        resolve = lambda docs: [Document(id=d.id, page_content="resolved") for d in docs]
+        retriever = LocalMMRRetriever(self.make_store(vectors), MagicMock(), VectorCache(), k=1,
+                                      reranker=reranker, resolve=resolve)
+        assert retriever("q")[0].page_content == "resolved"
+        assert seen == ["resolved"]
+
+    def test_missing_vectors_fall_back_to_relevance(self):
+        """Test that candidates without a stored vector are ranked by relevance alone"""
+        store = self.make_store({"a": None, "b": None})
+        store.get_vectors.side_effect = lambda ids: {}
+        retriever = LocalMMRRetriever(store, MagicMock(), VectorCache(), k=1)
+        assert [d.id for d in retriever("q")] == ["a"]
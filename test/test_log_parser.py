@@ -0,0 +1,72 @@
+"""
+Unit tests for the log record parser in utils/log_parser.py
+"""
+import math
+import pytest
+from utils.log_parser import iter_records, parse_record, parse_timestamp, template_of
+
+
+class TestTemplates:
+    """Tests for masking variable parts of messages"""
+
+    def test_numbers_and_ids_are_masked(self):
+        """Test that messages differing only in parameters share a template"""
+        t1, id1, params = template_of("request 42 from 10.0.0.1:8080 took 12ms id=7f3a9b2c11")
+        t2, id2, _ = template_of("request 7 from 10.0.0.2:443 took 3ms id=00ffee1234")
+        assert t1 == t2
+        assert id1 == id2
+        assert "10.0.0.1:8080" in params
+
+    def test_words_are_kept(self):
+        """Test that plain words are not masked"""
+        template, _, _ = template_of("connection refused by db-primary")
+        assert template == "connection refused by db-primary"
+
+    def test_uuid_is_single_parameter(self):
+        """Test that a uuid is masked as one parameter"""
+        template, _, params = template_of("job 123e4567-e89b-12d3-a456-426614174000 done")
+        assert template == "job <*> done"
+        assert params == ["123e4567-e89b-12d3-a456-426614174000"]
+
+
+class TestParseRecord:
+    """Tests for timestamp, level and service extraction"""
+
+    def test_iso_timestamp(self):
+        """Test ISO timestamps with milliseconds"""
+        assert parse_timestamp("2024-01-01 00:00:01,500 INFO x") == pytest.approx(1704067201.5)
+
+    def test_missing_timestamp(self):
+        """Test lines without a timestamp"""
+        assert math.isnan(parse_timestamp("no time here"))
+
+    def test_level_and_service(self):
+        """Test that level aliases are normalized and service is found"""
+        record = parse_record("2024-01-01T00:00:00 WARNING [payments] retry 3")
+        assert record.level == "WARN"
+        assert record.service == "payments"
+        assert record.template == "[payments] retry <*>"
+
+
+class TestIterRecords:
+    """Tests for reading records with byte offsets"""
+
+    def test_offsets_and_continuations(self, tmp_path):
+        """Test that stack trace lines are folded into their record and offsets are exact"""
+        content = ("2024-01-01 00:00:00 INFO started\n"
+                   "2024-01-01 00:00:01 ERROR failed\n"
+                   "Traceback (most recent call last):\n"
+                   "  File \"x.py\", line 1\n"
+                   "2024-01-01 00:00:02 INFO recovered\n")
+        path = tmp_path / "app.log"
+        path.write_text(content)
+        data = path.read_bytes()
+
+        records = list(iter_records(str(path)))
+
+        assert len(records) == 3
+        assert records[1].lines == 3
+        assert records[1].has_stack_trace
+        assert not records[0].has_stack_trace
+        for record in records:
+            assert data[record.offset:record.offset + record.length].decode().rstrip("\n") == record.text
@@ -2,7 +2,7 @@
 Unit tests for the prompts module in utils/prompts.py
 """
 import pytest
-from utils.prompts import prompt_template
+from utils.prompts import prompt_template, summary_prompt_template
 from langchain_core.prompts import ChatPromptTemplate
 
 
@@ -89,3 +89,34 @@ class TestPromptTemplate:
         input_vars = prompt_template.input_variables
         assert "context" in input_vars
         assert "input" in input_vars
+
+
+class TestSummaryPromptTemplate:
+    """Tests for the segment summary prompt"""
+
+    def test_summary_prompt_input_variables(self):
+        """Test that the summary prompt only needs the segment text"""
+        assert summary_prompt_template.input_variables == ["input"]
+
+    def test_summary_prompt_can_be_formatted(self):
+        """Test that the summary prompt formats into system and human messages"""
+        formatted = summary_prompt_template.format_messages(input="[3x] ERROR timeout")
+        assert [m.type for m in formatted] == ["system", "human"]
+
+
+class TestConversationPromptTemplate:
+    """Tests for the conversation prompt template"""
+
+    def test_context_comes_before_history(self):
+        """Test that the system prompt with the context is first and the question last"""
+        from utils.prompts import conversation_prompt_template
+        messages = conversation_prompt_template.format_messages(
+            context="CTX", history=[("human", "q1"), ("ai", "a1")], input="q2")
+        assert "CTX" in messages[0].content
+        assert [m.content for m in messages[1:]] == ["q1", "a1", "q2"]
+
+    def test_rewrite_prompt_has_previous_question(self):
+        """Test that the rewrite prompt carries the previous question"""
+        from utils.prompts import rewrite_prompt_template
+        messages = rewrite_prompt_template.format_messages(previous="why did billing fail?", input="and before that?")
+        assert "why did billing fail?" in messages[-1].content
@@ -0,0 +1,135 @@
+"""
+Unit tests for the quantized local vector store in utils/quantized_store.py
+"""
+import numpy as np
+import pytest
+from unittest.mock import MagicMock
+
+from utils.quantized_store import QuantizedIndex, QuantizedVectorStore, quantize_int8, truncate
+
+
+def low_rank_vectors(n, dimension=64, seed=0):
+    basis = np.random.default_rng(0).standard_normal((8, dimension))
+    rng = np.random.default_rng(seed)
+    return (rng.standard_normal((n, 8)) @ basis + 0.3 * rng.standard_normal((n, dimension))).astype(np.float32)
+
+
+class TestQuantizationHelpers:
+    """Tests for truncation and scalar quantization"""
+
+    def test_truncate_renormalizes(self):
+        """Test that truncated vectors are unit length"""
+        vectors = truncate(np.ones((2, 8)), 4)
+        assert vectors.shape == (2, 4)
+        assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0)
+
+    def test_int8_roundtrip_error_is_small(self):
+        """Test that int8 codes reconstruct vectors closely"""
+        vectors = truncate(low_rank_vectors(10), None)
+        codes, scales = quantize_int8(vectors)
+        assert codes.dtype == np.int8
+        assert np.abs(codes * scales[:, None] - vectors).max() < 0.01
+
+
+class TestQuantizedIndex:
+    """Tests for search, memory and persistence of the quantized index"""
+
+    @pytest.mark.parametrize("quantization,reduction", [("int8", 3.5), ("binary", 25)])
+    def test_recall_and_memory(self, tmp_path, quantization, reduction):
+        """Test that quantized search keeps recall while shrinking resident memory"""
+        data = low_rank_vectors(2000)
+        index = QuantizedIndex(str(tmp_path), dimension=64, quantization=quantization)
+        index.add([str(i) for i in range(len(data))], data)
+
+        exact = truncate(data, None)
+        hits = 0
+        for query in low_rank_vectors(20, seed=1):
+            truth = set(np.argsort(-(exact @ truncate(query, None)[0]))[:5].tolist())
+            hits += len(truth & {row for row, _ in index.search(query, 5)})
+
+        assert hits / 100 >= 0.9
+        assert len(data) * 64 * 4 / index.memory_bytes() >= reduction
+
+    def test_scores_are_full_precision(self, tmp_path):
+        """Test that returned scores come from float32 rescoring"""
+        data = low_rank_vectors(50)
+        index = QuantizedIndex(str(tmp_path), dimension=64, quantization="binary")
+        index.add([str(i) for i in range(50)], data)
+        row, score = index.search(data[3], 1)[0]
+        assert row == 3
+        assert score == pytest.approx(1.0, abs=1e-5)
+
+    def test_reopen_from_disk(self, tmp_path):
+        """Test that an index is reloaded with ids and codes"""
+        data = low_rank_vectors(20)
+        QuantizedIndex(str(tmp_path), dimension=64).add([f"id-{i}" for i in range(20)], data)
+        reopened = QuantizedIndex(str(tmp_path), dimension=64)
+        assert len(reopened) == 20
+        assert reopened.ids[reopened.search(data[7], 1)[0][0]] == "id-7"
+
+    def test_reopen_with_other_settings_fails(self, tmp_path):
+        """Test that an index can not be opened with a different layout"""
+        QuantizedIndex(str(tmp_path), dimension=64, quantization="int8")
+        with pytest.raises(ValueError):
+            QuantizedIndex(str(tmp_path), dimension=64, quantization="binary")
+
+    def test_matryoshka_truncation(self, tmp_path):
+        """Test that truncate_dim stores only the leading dimensions"""
+        index = QuantizedIndex(str(tmp_path), dimension=64, truncate_dim=16)
+        index.add(["a"], low_rank_vectors(1))
+        assert index.dimension == 16
+        assert index.full_vectors().shape == (1, 16)
+
+    def test_empty_search(self, tmp_path):
+        """Test that searching an empty index returns nothing"""
+        assert QuantizedIndex(str(tmp_path), dimension=64).search(np.ones(64), 3) == []
+
+
+class TestQuantizedVectorStore:
+    """Tests for the LangChain vector store adapter"""
+
+    @pytest.fixture
+    def store(self, tmp_path):
+        vectors = {f"text {i}": v for i, v in enumerate(low_rank_vectors(30))}
+        embedding = MagicMock()
+        embedding.embed_documents.side_effect = lambda texts: [vectors[t] for t in texts]
+        embedding.embed_query.side_effect = lambda text: vectors[text]
+        store = QuantizedVectorStore(str(tmp_path), embedding, dimension=64)
+        store.add_texts(list(vectors), metadatas=[{"source": "app.log"}] * 30)
+        return store
+
+    def test_similarity_search(self, store):
+        """Test that the closest document is returned with its metadata"""
+        docs = store.similarity_search("text 4", k=1)
+        assert docs[0].page_content == "text 4"
+        assert docs[0].metadata == {"source": "app.log"}
+
+    def test_mmr_retriever(self, store):
+        """Test that the mmr retriever used by Analyzer.rag works on the local store"""
+        docs = store.as_retriever(search_type="mmr").invoke("text 9")
+        assert len(docs) == 4
+        assert docs[0].page_content == "text 9"
+
+    def test_get_vectors_by_id(self, store):
+        """Test that stored vectors are returned by id and unknown ids are skipped"""
+        doc, _ = store.similarity_search_with_score("text 3", k=1)[0]
+        vectors = store.get_vectors([doc.id, "missing"])
+        assert list(vectors) == [doc.id]
+        assert vectors[doc.id].shape == (64,)
+
+    def test_failed_add_keeps_rows_aligned(self, store, tmp_path):
+        """Test that vectors failing validation leave no documents behind"""
+        with pytest.raises(ValueError):
+            store.add_embeddings([np.ones(32)], texts=["wrong size"])
+        assert len(store._docs) == len(store.index) == 30
+        reopened = QuantizedVectorStore(str(tmp_path), store.embedding, dimension=64)
+        assert reopened.similarity_search("text 4", k=1)[0].page_content == "text 4"
+
+    def test_concurrent_adds_keep_rows_aligned(self, tmp_path):
+        """Test that every document stays on the row of its own vector under concurrent adds"""
+        from concurrent.futures import ThreadPoolExecutor
+        store = QuantizedVectorStore(str(tmp_path), MagicMock(), dimension=64, quantization="none")
+        vectors = low_rank_vectors(200, seed=1)
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(lambda i: store.add_embeddings([vectors[i]], ids=[str(i)], texts=[str(i)]), range(200)))
+        assert [d["page_content"] for d in store._docs] == store.index.ids
@@ -0,0 +1,191 @@
+"""
+Unit tests for the adaptive rate limited clients in utils/rate_limiter.py
+"""
+import threading
+import time
+import pytest
+from langchain_core.embeddings import Embeddings
+from langchain_core.runnables import RunnableLambda
+
+from utils.rate_limiter import (AdaptiveLimiter, RateBudget, RateLimitedEmbeddings, RateLimitedLLM,
+                                TokenBucket, is_throttle_error)
+
+
+class ThrottledError(Exception):
+    status_code = 429
+
+
+class FakeProvider(Embeddings):
+    """Local fake provider that throttles when too many calls or too large batches are in flight."""
+
+    def __init__(self, max_in_flight=2, max_batch=16, latency=0.005):
+        self.max_in_flight = max_in_flight
+        self.max_batch = max_batch
+        self.latency = latency
+        self.in_flight = 0
+        self.calls = 0
+        self.throttled = 0
+        self.sizes = []
+        self.lock = threading.Lock()
+
+    def _call(self, size):
+        with self.lock:
+            self.calls += 1
+            self.sizes.append(size)
+            if self.in_flight >= self.max_in_flight or size > self.max_batch:
+                self.throttled += 1
+                raise ThrottledError("429 Too Many Requests")
+            self.in_flight += 1
+        try:
+            time.sleep(self.latency)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    def embed_documents(self, texts):
+        self._call(len(texts))
+        return [[float(len(t))] for t in texts]
+
+    def embed_query(self, text):
+        self._call(1)
+        return [float(len(text))]
+
+
+def budget(**kwargs):
+    return RateBudget(requests_per_minute=60000, tokens_per_minute=10_000_000, sleep=lambda s: None,
+                      max_retries=50, **kwargs)
+
+
+class TestThrottleDetection:
+    """Tests for recognizing provider throttling"""
+
+    def test_status_code(self):
+        """Test that HTTP 429 errors are throttling"""
+        assert is_throttle_error(ThrottledError("x"))
+
+    def test_message(self):
+        """Test that throttling messages from SDKs are recognized"""
+        assert is_throttle_error(RuntimeError("ThrottlingException: Rate exceeded"))
+        assert not is_throttle_error(ValueError("bad input"))
+
+
+class TestTokenBucket:
+    """Tests for the token bucket"""
+
+    def test_waits_for_refill(self):
+        """Test that acquiring beyond capacity waits for the refill rate"""
+        bucket = TokenBucket(rate_per_minute=6000, capacity=10)
+        start = time.monotonic()
+        for _ in range(20):
+            bucket.acquire()
+        # 10 tokens over capacity at 100/s
+        assert time.monotonic() - start >= 0.09
+
+    def test_oversized_request_does_not_deadlock(self):
+        """Test that a request larger than capacity passes once the bucket is full"""
+        TokenBucket(rate_per_minute=60, capacity=5).acquire(100)
+
+
+class TestAdaptiveLimiter:
+    """Tests for AIMD control"""
+
+    def test_additive_increase_multiplicative_decrease(self):
+        """Test that successes grow the limits and throttling halves them"""
+        limiter = AdaptiveLimiter(concurrency=4, batch_size=64)
+        for _ in range(8):
+            limiter.acquire()
+            limiter.release(0.01)
+        assert 5.0 < limiter.limit < 6.0
+        grown = limiter.batch_size
+        limiter.acquire()
+        limiter.release(0.01, throttled=True)
+        assert limiter.limit < 3.0
+        assert limiter.batch_size == grown // 2
+
+    def test_slow_calls_reduce_concurrency(self):
+        """Test that calls over the latency target back off without throttling"""
+        limiter = AdaptiveLimiter(concurrency=10, target_latency=0.1)
+        limiter.acquire()
+        limiter.release(0.5)
+        assert limiter.limit == pytest.approx(9.0)
+
+    def test_default_target_from_observed_median(self):
+        """Test that without a target, calls far slower than the median so far back off"""
+        limiter = AdaptiveLimiter(concurrency=10, max_concurrency=10, min_samples=5)
+        for _ in range(5):
+            limiter.acquire()
+            limiter.release(0.1)
+        assert limiter.limit == 10.0
+        assert limiter.current_target == pytest.approx(0.3)
+        limiter.acquire()
+        limiter.release(1.0)
+        assert limiter.limit == pytest.approx(9.0)
+
+
+class TestRateLimitedClients:
+    """Tests against a local fake provider that injects throttling"""
+
+    def test_embeddings_complete_despite_throttling(self):
+        """Test that every text is embedded, in order, and batch size and concurrency adapt down"""
+        provider = FakeProvider(max_in_flight=2, max_batch=16)
+        shared = budget(concurrency=8, batch_size=64)
+        texts = [f"line {i}" * (i % 5 + 1) for i in range(500)]
+
+        vectors = RateLimitedEmbeddings(provider, shared, max_workers=8).embed_documents(texts)
+
+        assert vectors == [[float(len(t))] for t in texts]
+        assert provider.throttled > 0
+        assert provider.sizes[0] == 64
+        assert min(provider.sizes) <= 16
+        assert shared.limiter.throttled == provider.throttled
+
+    def test_budget_shared_across_concurrent_callers(self):
+        """Test that concurrent ingests sharing a budget never exceed the provider limit for long"""
+        provider = FakeProvider(max_in_flight=2, max_batch=1000)
+        shared = budget(concurrency=2, max_concurrency=2)
+        client = RateLimitedEmbeddings(provider, shared, max_workers=4)
+
+        threads = [threading.Thread(target=client.embed_documents, args=([f"t{i}"] * 300,)) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert provider.throttled == 0
+
+    def test_non_throttle_errors_are_raised(self):
+        """Test that other errors are not retried"""
+        calls = []
+
+        def fail():
+            calls.append(1)
+            raise ValueError("bad request")
+
+        with pytest.raises(ValueError):
+            budget().call(fail)
+        assert len(calls) == 1
+
+    def test_retries_give_up(self):
+        """Test that throttling beyond max_retries surfaces the error"""
+        shared = RateBudget(sleep=lambda s: None, max_retries=2)
+        with pytest.raises(ThrottledError):
+            shared.call(lambda: (_ for _ in ()).throw(ThrottledError("429")))
+
+    def test_llm_wrapper_retries(self):
+        """Test that the LLM wrapper retries throttled invocations and composes in chains"""
+        attempts = []
+
+        def flaky(prompt):
+            attempts.append(prompt)
+            if len(attempts) < 3:
+                raise ThrottledError("429")
+            return f"answer to {prompt}"
+
+        llm = RateLimitedLLM(RunnableLambda(flaky), budget())
+        chain = RunnableLambda(lambda q: q.upper()) | llm
+        assert chain.invoke("why") == "answer to WHY"
+        assert len(attempts) == 3
+
+    def test_shared_budget_registry(self):
+        """Test that the same key returns the same budget"""
+        assert RateBudget.shared("test:model") is RateBudget.shared("test:model")
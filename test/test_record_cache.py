@@ -0,0 +1,138 @@
+"""
+Unit tests for the columnar parsed record cache in utils/record_cache.py
+"""
+import dataclasses
+import math
+
+import pytest
+
+from utils.log_parser import parse_file
+from utils.record_cache import RecordCache, fingerprint, path_key, question_levels
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    path = tmp_path / "app.log"
+    lines = []
+    for i in range(300):
+        level = ("INFO", "WARN", "ERROR")[i % 3] if i < 200 else "INFO"
+        lines.append(f"2024-01-01 00:{i // 60:02d}:{i % 60:02d} {level} [svc-{i % 4}] request {i} took {i % 7}ms")
+        if i % 50 == 0:
+            lines.append("Traceback (most recent call last)")
+            lines.append("  at com.app.Handler.run(Handler.java:42)")
+    lines.append("no timestamp here")
+    path.write_text("\n".join(lines) + "\n")
+    return path
+
+
+def rows(records):
+    # nan timestamps never compare equal, compare them as None
+    return [{**dataclasses.asdict(r), "timestamp": None if math.isnan(r.timestamp) else r.timestamp}
+            for r in records]
+
+
+class TestFingerprint:
+    """Tests for identifying file contents"""
+
+    def test_changes_with_content(self, log_file):
+        """Test that appending to a log changes its fingerprint"""
+        before = fingerprint(str(log_file))
+        assert fingerprint(str(log_file)) == before
+        with open(log_file, "a") as f:
+            f.write("2024-01-01 01:00:00 INFO one more\n")
+        assert fingerprint(str(log_file)) != before
+
+    def test_path_key_differs_per_directory(self, tmp_path):
+        """Test that logs with the same name in different directories get different keys"""
+        a, b = str(tmp_path / "svc-a" / "app.log"), str(tmp_path / "svc-b" / "app.log")
+        assert path_key(a) != path_key(b)
+        assert path_key(a).startswith("app.log-") and path_key(a) == path_key(a)
+
+
+class TestRecordCache:
+    """Tests for writing and scanning cached records"""
+
+    def test_roundtrip_matches_parser(self, log_file, tmp_path):
+        """Test that cached records equal a fresh parse, texts and params included"""
+        records = parse_file(str(log_file))
+        cache = RecordCache(str(tmp_path / "cache"), row_group_size=64)
+        cache.write(str(log_file), records)
+
+        assert rows(cache.scan(str(log_file))) == rows(records)
+        assert len(cache.row_groups(str(log_file))) == -(-len(records) // 64)
+
+    def test_time_and_level_pushdown(self, log_file, tmp_path):
+        """Test that predicates filter rows and skip row groups outside the range"""
+        records = parse_file(str(log_file))
+        cache = RecordCache(str(tmp_path / "cache"), row_group_size=64)
+        cache.write(str(log_file), records)
+        start, end = records[100].timestamp, records[150].timestamp
+
+        found = list(cache.scan(str(log_file), start=start, end=end, levels=["ERROR"]))
+
+        assert found == [r for r in records if start <= r.timestamp <= end and r.level == "ERROR"]
+        skipped = [g for g in cache.row_groups(str(log_file)) if not g.may_match(start, end, {"ERROR"})]
+        assert skipped
+        assert all(not g.may_match(None, None, {"ERROR"}) for g in cache.row_groups(str(log_file))[-1:])
+
+    def test_records_parses_once(self, log_file, tmp_path, mocker):
+        """Test that an unchanged file is read from the cache on the second call"""
+        cache = RecordCache(str(tmp_path / "cache"))
+        parse = mocker.patch("utils.record_cache.parse_file", side_effect=parse_file)
+        first = cache.records(str(log_file))
+        second = cache.records(str(log_file))
+
+        assert parse.call_count == 1
+        assert rows(second) == rows(first)
+
+    def test_records_fingerprints_once(self, log_file, tmp_path, mocker):
+        """Test that a miss and a hit each hash the file a single time"""
+        import utils.record_cache
+        cache = RecordCache(str(tmp_path / "cache"))
+        spy = mocker.spy(utils.record_cache, "fingerprint")
+        cache.records(str(log_file))
+        assert spy.call_count == 1
+        cache.records(str(log_file))
+        assert spy.call_count == 2
+
+    def test_sources_skip_changed_files(self, log_file, tmp_path):
+        """Test that only logs whose cached records are current are listed"""
+        other = tmp_path / "other.log"
+        other.write_text("2024-01-01 00:00:00 INFO started\n")
+        cache = RecordCache(str(tmp_path / "cache"))
+        cache.records(str(log_file))
+        cache.records(str(other))
+        other.write_text("2024-01-02 00:00:00 INFO restarted\n")
+
+        assert cache.sources() == [str(log_file)]
+
+    def test_question_levels(self):
+        """Test that error and warning questions narrow the scanned levels"""
+        assert question_levels("which errors happened at 10:00?") == {"ERROR", "FATAL"}
+        assert question_levels("any warnings?") == {"WARN"}
+        assert question_levels("what happened at 10:00?") is None
+
+    def test_changed_file_misses(self, log_file, tmp_path):
+        """Test that a changed file is not served stale records"""
+        cache = RecordCache(str(tmp_path / "cache"))
+        cache.records(str(log_file))
+        log_file.write_text("2024-01-02 00:00:00 ERROR [db] disk full\n")
+
+        assert not cache.has(str(log_file))
+        assert [r.level for r in cache.records(str(log_file))] == ["ERROR"]
+
+    def test_stats_from_metadata(self, log_file, tmp_path):
+        """Test that counts and time span come from the row group statistics"""
+        records = parse_file(str(log_file))
+        cache = RecordCache(str(tmp_path / "cache"), row_group_size=64)
+        cache.write(str(log_file), records)
+
+        stats = cache.stats(str(log_file))
+        assert stats["records"] == len(records)
+        assert stats["levels"]["ERROR"] == sum(r.level == "ERROR" for r in records)
+        assert stats["first_timestamp"] == records[0].timestamp
+
+    def test_scan_without_cache_fails(self, log_file, tmp_path):
+        """Test that scanning an uncached file raises"""
+        with pytest.raises(KeyError):
+            list(RecordCache(str(tmp_path / "cache")).scan(str(log_file)))
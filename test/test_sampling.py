@@ -0,0 +1,109 @@
+"""
+Unit tests for budgeted stratified sampling in utils/sampling.py
+"""
+import random
+import pytest
+
+from utils.chunk_store import group_records
+from utils.log_parser import parse_record
+from utils.sampling import Reservoir, SamplingReport, annotate, budget_from_cost, stratified_sample
+
+
+def noisy_log(minutes=20):
+    lines = []
+    for minute in range(minutes):
+        for second in range(50):
+            lines.append(f"2024-01-01 00:{minute:02d}:{second:02d} INFO request {second} served")
+        lines.append(f"2024-01-01 00:{minute:02d}:59 DEBUG cache size {minute}")
+    lines.append("2024-01-01 00:10:30 ERROR payment gateway timeout")
+    lines.append("2024-01-01 00:11:30 INFO config reloaded by admin")
+    return [[parse_record(line)] for line in sorted(lines)]
+
+
+class TestReservoir:
+    """Tests for reservoir sampling"""
+
+    def test_keeps_at_most_size_items(self):
+        """Test that the reservoir is bounded and counts what it saw"""
+        reservoir = Reservoir(5, random.Random(1))
+        for i in range(100):
+            reservoir.add(i)
+        assert len(reservoir.items) == 5
+        assert reservoir.seen == 100
+
+    def test_is_roughly_uniform(self):
+        """Test that late items are as likely to be kept as early ones"""
+        late = 0
+        for seed in range(400):
+            reservoir = Reservoir(1, random.Random(seed))
+            for i in range(10):
+                reservoir.add(i)
+            late += reservoir.items[0] >= 5
+        assert 150 < late < 250
+
+
+class TestStratifiedSample:
+    """Tests for budgeted chunk selection"""
+
+    def test_under_budget_keeps_everything(self):
+        """Test that nothing is sampled when the budget is large enough"""
+        chunks = noisy_log(2)
+        kept, weights, report = stratified_sample(chunks, 10_000)
+        assert kept == list(range(len(chunks)))
+        assert set(weights) == {1.0}
+
+    def test_errors_and_rare_templates_kept(self):
+        """Test that errors and rare templates survive and the budget is respected"""
+        chunks = noisy_log()
+        kept, weights, report = stratified_sample(chunks, 100, window_seconds=60)
+        texts = [chunks[i][0].text for i in kept]
+        assert len(kept) <= 100
+        assert any("payment gateway timeout" in t for t in texts)
+        assert any("config reloaded" in t for t in texts)
+        assert report.kept_in_full == 2
+        assert report.total_chunks == len(chunks)
+
+    def test_weights_scale_back_to_totals(self):
+        """Test that weights of kept chunks add up to the number of chunks"""
+        chunks = noisy_log()
+        kept, weights, _ = stratified_sample(chunks, 200, window_seconds=60)
+        assert sum(weights) == pytest.approx(len(chunks), rel=0.02)
+
+    def test_every_window_is_represented(self):
+        """Test that sampling covers every time window"""
+        chunks = noisy_log()
+        kept, _, _ = stratified_sample(chunks, 60, window_seconds=60)
+        minutes = {chunks[i][0].text[14:16] for i in kept}
+        assert len(minutes) == 20
+
+    def test_budget_smaller_than_important_chunks(self):
+        """Test that the most severe chunks win when even they do not fit"""
+        chunks = noisy_log()
+        kept, _, _ = stratified_sample(chunks, 1)
+        assert "ERROR" in chunks[kept[0]][0].text
+
+    def test_deterministic(self):
+        """Test that the same seed gives the same sample"""
+        chunks = noisy_log()
+        assert stratified_sample(chunks, 80)[0] == stratified_sample(chunks, 80)[0]
+
+
+class TestBudgetHelpers:
+    """Tests for cost budgets, annotations and reports"""
+
+    def test_budget_from_cost(self):
+        """Test that a dollar budget turns into a vector budget"""
+        chunks = group_records([parse_record("x" * 400)] * 10)
+        # 100 tokens per chunk, $0.001 at $0.01 per 1k tokens buys 1 chunk
+        assert budget_from_cost(chunks, 0.001, cost_per_1k_tokens=0.01) == 1
+
+    def test_annotate(self):
+        """Test that sampled chunks are marked with their weight"""
+        assert annotate("line", 12.2).startswith("[sampled: stands for ~13 similar records]")
+        assert annotate("line", 1.0) == "line"
+
+    def test_report_round_trip(self, tmp_path):
+        """Test that a report can be saved and loaded"""
+        report = SamplingReport(total_chunks=10, kept_chunks=4, kept_in_full=1, sampled_strata=2, budget=4)
+        report.save(str(tmp_path / "r.json"))
+        assert SamplingReport.load(str(tmp_path / "r.json")).sampling_rate == 0.4
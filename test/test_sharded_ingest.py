@@ -0,0 +1,102 @@
+"""
+Unit tests for sharded single-file ingestion in utils/sharded_ingest.py
+"""
+import os
+import pytest
+
+from utils.chunk_store import group_records
+from utils.log_parser import parse_file
+from utils.sharded_ingest import ShardStats, WorkQueue, parse_sharded, process_shard, run_worker, shard_boundaries
+
+
+@pytest.fixture
+def big_log(tmp_path):
+    lines = []
+    for i in range(3000):
+        lines.append(f"2024-01-01 00:{i // 60 % 60:02d}:{i % 60:02d} INFO [api] request {i} served in {i % 97}ms")
+        if i % 250 == 0:
+            lines.append(f"2024-01-01 00:{i // 60 % 60:02d}:{i % 60:02d} ERROR [api] request {i} failed")
+            lines += ["Traceback (most recent call last):", "  File \"app.py\", line 3, in handle",
+                      "    raise ValueError(\"bad\")", "ValueError: bad"]
+    path = tmp_path / "big.log"
+    path.write_text("\n".join(lines) + "\n")
+    return path
+
+
+class TestShardBoundaries:
+    """Tests for record aligned byte ranges"""
+
+    def test_boundaries_are_record_starts(self, big_log):
+        """Test that shards cover the file and never start inside a record"""
+        boundaries = shard_boundaries(str(big_log), shard_bytes=4096)
+        assert boundaries[0] == 0 and boundaries[-1] == os.path.getsize(big_log)
+        assert boundaries == sorted(set(boundaries))
+        starts = {r.offset for r in parse_file(str(big_log))}
+        assert all(b in starts for b in boundaries[:-1])
+
+    def test_small_file_is_one_shard(self, big_log):
+        """Test that a file smaller than a shard is not split"""
+        assert shard_boundaries(str(big_log), shard_bytes=1 << 30) == [0, os.path.getsize(big_log)]
+
+
+class TestWorkQueue:
+    """Tests for the on-disk work queue"""
+
+    def test_claim_is_exclusive(self, tmp_path):
+        """Test that a task is handed out once and its result is kept"""
+        queue = WorkQueue(str(tmp_path / "q"))
+        queue.put("a", {"n": 1})
+        other = WorkQueue(str(tmp_path / "q"))
+        assert queue.claim() == ("a", {"n": 1})
+        assert other.claim() is None
+        queue.complete("a", {"answer": 2})
+        assert other.result("a") == {"answer": 2}
+        assert queue.names("done") == ["a"]
+
+    def test_stale_claims_are_requeued(self, tmp_path):
+        """Test that a task of a worker that died goes back to pending"""
+        queue = WorkQueue(str(tmp_path / "q"), lease_seconds=0)
+        queue.put("a", {})
+        queue.claim()
+        os.utime(os.path.join(queue.path, "claimed", "a.json"), (0, 0))
+        assert queue.requeue_stale() == 1
+        assert queue.names("pending") == ["a"]
+
+    def test_worker_records_failures(self, tmp_path):
+        """Test that a failing shard is marked failed with its error"""
+        queue = WorkQueue(str(tmp_path / "q"))
+        queue.put("a", {"path": str(tmp_path / "missing.log"), "start": 0, "end": 10, "index": 0, "chunk_size": 100})
+        assert run_worker(queue.path) == 0
+        assert "FileNotFoundError" in queue.error("a")
+
+
+class TestParseSharded:
+    """Tests for the parallel parse and merge"""
+
+    def test_matches_single_pass(self, big_log, tmp_path):
+        """Test that merged shards give the records, stats and chunks of a single pass"""
+        queue = str(tmp_path / "queue")
+        parsed = parse_sharded(str(big_log), queue, workers=3, shard_bytes=8192)
+        single = parse_file(str(big_log))
+
+        assert parsed.shards > 3
+        assert [(r.offset, r.length, r.template_id) for r in parsed.records] == \
+            [(r.offset, r.length, r.template_id) for r in single]
+        assert sum(r.has_stack_trace for r in parsed.records) == 12
+        assert parsed.stats == ShardStats.of(single)
+        assert all(len(chunk) for chunk in parsed.chunks)
+        assert not os.path.exists(queue)
+
+    def test_deterministic(self, big_log, tmp_path):
+        """Test that chunking does not depend on the number of workers"""
+        one = parse_sharded(str(big_log), str(tmp_path / "q1"), workers=1, shard_bytes=8192)
+        four = parse_sharded(str(big_log), str(tmp_path / "q4"), workers=4, shard_bytes=8192)
+        assert [[r.offset for r in c] for c in one.chunks] == [[r.offset for r in c] for c in four.chunks]
+
+    def test_process_shard(self, big_log):
+        """Test that one shard is parsed and chunked on its own"""
+        end = shard_boundaries(str(big_log), shard_bytes=4096)[1]
+        result = process_shard({"path": str(big_log), "start": 0, "end": end, "index": 0, "chunk_size": 100})
+        records = [r for r in parse_file(str(big_log)) if r.offset < end]
+        assert [[r.offset for r in c] for c in result["chunks"]] == [[r.offset for r in c] for c in group_records(records)]
+        assert result["stats"].records == len(records)
@@ -0,0 +1,117 @@
+"""
+Unit tests for the hierarchical summary tree in utils/summary_tree.py
+"""
+import threading
+
+from utils.log_parser import parse_record
+from utils.summary_tree import (SummaryTree, compact_text, is_summary_question, parse_time_range,
+                                segment_records)
+
+
+def hourly_log(hours=4):
+    records = []
+    for hour in range(hours):
+        for minute in range(0, 60, 10):
+            records.append(parse_record(f"2024-01-01 {hour:02d}:{minute:02d}:00 INFO job {minute} done"))
+        records.append(parse_record(f"2024-01-01 {hour:02d}:30:00 ERROR disk {hour} failing"))
+    return records
+
+
+def fake_summarize(text):
+    return f"summary({len(text.splitlines())})"
+
+
+class TestSegments:
+    """Tests for splitting records into segments"""
+
+    def test_time_segments(self):
+        """Test that time mode yields one segment per window with compacted text"""
+        segments = segment_records(hourly_log(), window_seconds=3600)
+        assert len(segments) == 4
+        assert segments[0].records == 7
+        assert segments[0].text.splitlines()[0].startswith("[1x]") and "ERROR" in segments[0].text.splitlines()[0]
+        assert "[6x]" in segments[0].text
+
+    def test_template_segments(self):
+        """Test that template mode groups event types"""
+        segments = segment_records(hourly_log(), mode="template", max_segments=2)
+        assert len(segments) == 2
+        assert sum(s.records for s in segments) == 28
+
+    def test_compact_text_limit(self):
+        """Test that compacted text respects the character budget"""
+        records = [parse_record(f"event type {chr(97 + i)} happened") for i in range(20)]
+        text = compact_text(records, max_chars=60)
+        assert text.endswith("more event types")
+
+
+class TestSummaryTree:
+    """Tests for building, querying and storing the tree"""
+
+    def test_build_reduces_to_root(self):
+        """Test that levels are reduced by fan_in until one root remains"""
+        segments = segment_records(hourly_log(hours=10), window_seconds=3600)
+        tree = SummaryTree.build(segments, fake_summarize, workers=3, fan_in=4)
+        assert [len(level) for level in tree.levels] == [10, 3, 1]
+        assert tree.root.children == [0, 1, 2]
+        assert tree.root.start == segments[0].start
+
+    def test_build_runs_in_parallel(self):
+        """Test that segments are summarized concurrently"""
+        barrier = threading.Barrier(3, timeout=5)
+
+        def summarize(text):
+            if text.startswith("[1x]"):
+                barrier.wait()
+            return "s"
+
+        SummaryTree.build(segment_records(hourly_log(hours=3), window_seconds=3600), summarize, workers=3)
+
+    def test_covering_whole_log_is_root(self):
+        """Test that whole-log questions read only the root"""
+        tree = SummaryTree.build(segment_records(hourly_log(hours=8), window_seconds=3600), fake_summarize, fan_in=2)
+        assert tree.covering() == [tree.root]
+
+    def test_covering_time_range(self):
+        """Test that a time range is covered by the smallest set of nodes"""
+        tree = SummaryTree.build(segment_records(hourly_log(hours=8), window_seconds=3600), fake_summarize, fan_in=2)
+        start = tree.levels[0][2].start
+        nodes = tree.covering(start, start + 2 * 3600)
+        assert [(n.level, n.start) for n in nodes] == [(1, start)]
+
+    def test_save_and_load(self, tmp_path):
+        """Test that a tree round trips through JSON"""
+        tree = SummaryTree.build(segment_records(hourly_log(), window_seconds=3600), fake_summarize, source="a.log")
+        tree.save(str(tmp_path / "summaries" / "a.json"))
+        loaded = SummaryTree.load(str(tmp_path / "summaries" / "a.json"))
+        assert loaded.source == "a.log"
+        assert loaded.root == tree.root
+
+    def test_empty(self):
+        """Test that an empty log gives an empty tree"""
+        assert SummaryTree.build([], fake_summarize).covering() == []
+
+
+class TestQuestions:
+    """Tests for summary question and time range detection"""
+
+    def test_summary_question(self):
+        """Test that summary questions are recognized"""
+        assert is_summary_question("Summarize this log")
+        assert not is_summary_question("show lines containing ORA-00060")
+
+    def test_bare_times_use_reference_day(self):
+        """Test that HH:MM times are placed on the log's day"""
+        reference = parse_record("2024-01-01 05:00:00 INFO x").timestamp
+        start, end = parse_time_range("summary between 02:00 and 03:30", reference)
+        assert end - start == 5400
+        assert start == reference - 3 * 3600
+
+    def test_full_timestamps(self):
+        """Test that full timestamps are used as is"""
+        start, end = parse_time_range("summarize 2024-01-01 01:00 to 2024-01-01 02:00")
+        assert end - start == 3600
+
+    def test_no_range(self):
+        """Test that questions without times cover the whole log"""
+        assert parse_time_range("summarize the log", 1.7e9) == (None, None)
@@ -0,0 +1,116 @@
+"""
+Unit tests for precomputed triage answers in utils/triage.py
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils.triage import DEFAULT_TRIAGE_QUESTIONS, TriageSet, load_questions, normalize
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    path = tmp_path / "app.log"
+    path.write_text("2024-01-01 00:00:00 ERROR [db] connection refused\n")
+    return path
+
+
+def answer(question):
+    return f"answer to {question}", ["app.log"], [f"context of {question}"]
+
+
+class TestLoadQuestions:
+    """Tests for configuring the triage question set"""
+
+    def test_defaults(self):
+        """Test that no configuration gives the default questions"""
+        assert load_questions() == DEFAULT_TRIAGE_QUESTIONS
+
+    def test_from_file(self, tmp_path):
+        """Test that blank lines and comments are skipped"""
+        path = tmp_path / "triage.txt"
+        path.write_text("# first look\nWhat failed?\n\nWhen did it start?\n")
+        assert load_questions(str(path)) == ["What failed?", "When did it start?"]
+
+    def test_normalize(self):
+        """Test that case, spacing and trailing punctuation do not matter"""
+        assert normalize("  What   FAILED? ") == normalize("what failed")
+
+
+class TestTriageSet:
+    """Tests for computing, serving and storing triage answers"""
+
+    def test_answers_in_background_and_saves(self, log_file, tmp_path):
+        """Test that every question is answered and the set reloads from disk"""
+        path = tmp_path / "triage" / "app.log.json"
+        triage = TriageSet(str(path), str(log_file), ["What failed?", "When did it start?"])
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            triage.start(answer, pool)
+            triage.wait()
+
+        assert triage.done
+        assert triage.status() == {"What failed?": "ready", "When did it start?": "ready"}
+        loaded = TriageSet.load(str(path))
+        assert loaded.get("what failed").answer == "answer to What failed?"
+        assert loaded.fingerprint == triage.fingerprint
+
+    def test_get_waits_for_running_question(self, log_file, tmp_path):
+        """Test that asking a question being computed waits for it instead of returning nothing"""
+        release = threading.Event()
+
+        def slow(question):
+            release.wait(5)
+            return answer(question)
+
+        triage = TriageSet(str(tmp_path / "t.json"), str(log_file), ["What failed?"])
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            triage.start(slow, pool)
+            assert triage.status() == {"What failed?": "running"}
+            assert triage.peek("What failed?") is None
+            threading.Timer(0.05, release.set).start()
+            assert triage.get("What failed?").answer == "answer to What failed?"
+        assert triage.get("something else") is None
+
+    def test_bounded_concurrency(self, log_file, tmp_path):
+        """Test that no more questions run at once than the executor allows"""
+        running, peak, lock = [0], [0], threading.Lock()
+
+        def counted(question):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            threading.Event().wait(0.02)
+            with lock:
+                running[0] -= 1
+            return answer(question)
+
+        triage = TriageSet(str(tmp_path / "t.json"), str(log_file), [f"q{i}" for i in range(6)])
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            triage.start(counted, pool)
+            triage.wait()
+        assert peak[0] <= 2
+        assert triage.done
+
+    def test_refresh_recomputes(self, log_file, tmp_path):
+        """Test that start skips answered questions unless refreshing"""
+        calls = []
+        triage = TriageSet(str(tmp_path / "t.json"), str(log_file), ["What failed?"])
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            for refresh in (False, False, True):
+                triage.start(lambda q: calls.append(q) or answer(q), pool, refresh=refresh)
+                triage.wait()
+        assert len(calls) == 2
+
+    def test_failures_are_reported(self, log_file, tmp_path):
+        """Test that a failing question is marked failed and has no answer"""
+        def failing(question):
+            raise RuntimeError("llm down")
+
+        triage = TriageSet(str(tmp_path / "t.json"), str(log_file), ["What failed?"])
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            triage.start(failing, pool)
+            triage.wait()
+        assert triage.status() == {"What failed?": "failed"}
+        assert triage.get("What failed?") is None
+        assert triage.done
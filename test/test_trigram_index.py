@@ -0,0 +1,124 @@
+"""
+Unit tests for the trigram index in utils/trigram_index.py
+"""
+import re
+import pytest
+
+import utils.trigram_index as trigram_index
+from utils.trigram_index import TrigramIndex, grep_intent, required_literals
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    lines = []
+    for i in range(500):
+        lines.append(f"2024-01-01 00:{i // 60:02d}:{i % 60:02d} INFO request {i:04x} served by api-{i % 3}")
+    lines[123] = "2024-01-01 00:02:03 ERROR ORA-00060: deadlock detected while waiting for resource"
+    lines[400] = "2024-01-01 00:06:40 WARN Timeout after 350ms calling billing"
+    path = tmp_path / "app.log"
+    path.write_text("\n".join(lines) + "\n")
+    return path, lines
+
+
+def grep(lines, test):
+    return [i for i, line in enumerate(lines) if test(line)]
+
+
+class TestGrepIntent:
+    """Tests for detecting grep-like questions"""
+
+    @pytest.mark.parametrize("prompt,pattern,regex,explicit", [
+        ("show lines containing ORA-00060", "ORA-00060", False, True),
+        ("where does request 7f3a… appear", "7f3a", False, False),
+        ("find \"connection reset\" in the log", "connection reset", False, True),
+        ("grep /timeout after \\d+ms/ please", "timeout after \\d+ms", True, True),
+        ("which lines match the regex 'user=\\w+ denied'", "user=\\w+ denied", True, True),
+    ])
+    def test_detects_lookups(self, prompt, pattern, regex, explicit):
+        """Test that literal and regex lookups are recognised"""
+        intent = grep_intent(prompt)
+        assert (intent.pattern, intent.regex, intent.explicit) == (pattern, regex, explicit)
+
+    @pytest.mark.parametrize("prompt", ["What went wrong?", "Summarize this log", "How many errors at 10:30?", None])
+    def test_ignores_analysis_questions(self, prompt):
+        """Test that ordinary questions keep going through retrieval"""
+        assert grep_intent(prompt) is None
+
+    @pytest.mark.parametrize("prompt", ["find the root cause of the failure",
+                                        "Can you find why the db connection failed?",
+                                        "which requests match the slow ones?", "summarize lines containing errors"])
+    def test_generic_verbs_need_a_literal(self, prompt):
+        """Test that find / match / containing followed by ordinary words is not a grep"""
+        assert grep_intent(prompt) is None
+
+    def test_invalid_regex_is_searched_literally(self):
+        """Test that a broken regex falls back to a literal search"""
+        assert grep_intent("which lines match the pattern 'foo(bar'").regex is False
+
+
+class TestRequiredLiterals:
+    """Tests for literal extraction from regexes"""
+
+    def test_literal_runs(self):
+        """Test that runs of at least three literal characters are required"""
+        assert required_literals(r"timeout after \d+ms calling") == ["timeout after ", "ms calling"]
+
+    def test_alternation_can_not_be_narrowed(self):
+        """Test that a top level alternation scans every block"""
+        assert required_literals("deadlock|timeout") is None
+
+
+class TestTrigramIndex:
+    """Tests for building and searching the index"""
+
+    def test_literal_search_matches_grep(self, log_file):
+        """Test that literal hits equal a full case-insensitive scan"""
+        path, lines = log_file
+        index = TrigramIndex.build(str(path))
+        for needle in ["ora-00060", "api-2", "0a1", "served"]:
+            hits = index.search(needle, limit=10_000)
+            assert [h.line for h in hits] == grep(lines, lambda line: needle in line.lower())
+        assert index.search("not in the log") == []
+
+    def test_regex_search_matches_grep(self, log_file):
+        """Test that regex hits equal a full scan and offsets point at the lines"""
+        path, lines = log_file
+        index = TrigramIndex.build(str(path))
+        pattern = r"timeout after \d+ms"
+        hits = index.search(pattern, regex=True)
+        assert [h.line for h in hits] == grep(lines, lambda line: re.search(pattern, line, re.IGNORECASE))
+        with open(path, "rb") as f:
+            f.seek(hits[0].offset)
+            assert f.readline().decode().rstrip("\n") == hits[0].text
+
+    def test_candidates_narrow_the_scan(self, log_file):
+        """Test that a rare literal only verifies a few blocks"""
+        path, _ = log_file
+        index = TrigramIndex.build(str(path))
+        assert len(index.candidate_blocks(["ORA-00060"])) == 1
+        assert len(index.candidate_blocks(["ab"])) == len(index.block_offsets)
+
+    def test_build_in_several_passes(self, log_file, monkeypatch):
+        """Test that building in small newline aligned passes gives the same index"""
+        path, _ = log_file
+        whole = TrigramIndex.build(str(path))
+        monkeypatch.setattr(trigram_index, "_BUILD_BYTES", 1000)
+        parts = TrigramIndex.build(str(path))
+        assert (whole.keys == parts.keys).all()
+        assert (whole.postings == parts.postings).all()
+        assert (whole.block_offsets == parts.block_offsets).all()
+
+    def test_save_and_load(self, log_file, tmp_path):
+        """Test that a saved index answers the same"""
+        path, _ = log_file
+        index = TrigramIndex.build(str(path))
+        index.save(str(tmp_path / "idx" / "app.log.npz"))
+        loaded = TrigramIndex.load(str(tmp_path / "idx" / "app.log.npz"))
+        assert loaded.search("deadlock") == index.search("deadlock")
+        assert loaded.file_path == str(path)
+
+    def test_empty_file(self, tmp_path):
+        """Test that an empty file builds an index without hits"""
+        path = tmp_path / "empty.log"
+        path.write_text("")
+        assert TrigramIndex.build(str(path)).search("error") == []
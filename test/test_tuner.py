@@ -0,0 +1,136 @@
+"""
+Unit tests for the chunking and retriever tuner in utils/tuner.py and utils/retrieval_config.py
+"""
+import json
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from utils.retrieval_config import RetrievalConfig
+from utils.tuner import (CachedEmbeddings, TuningResult, expand_grid, pareto_front, read_pairs, recommend,
+                         sweep)
+
+
+class WordEmbeddings(Embeddings):
+    """Bag of words over a tiny vocabulary, counts calls."""
+
+    VOCABULARY = ["payment", "timeout", "disk", "full", "deadlock", "heartbeat", "served", "request"]
+
+    def __init__(self):
+        self.documents = 0
+
+    def _vector(self, text):
+        words = text.lower().split()
+        return [float(sum(w.startswith(v) for w in words)) + 0.01 for v in self.VOCABULARY]
+
+    def embed_documents(self, texts):
+        self.documents += len(texts)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+@pytest.fixture
+def sample_log(tmp_path):
+    lines = [f"2024-01-01 00:00:{i % 60:02d} INFO request {i} served" for i in range(120)]
+    lines[40] = "2024-01-01 00:00:40 ERROR payment timeout after 30s"
+    lines[80] = "2024-01-01 00:01:20 ERROR disk full on /var"
+    path = tmp_path / "sample.log"
+    path.write_text("\n".join(lines) + "\n")
+    return path
+
+
+def result(recall, vectors, query_seconds, chunk_size=100):
+    return TuningResult(config=RetrievalConfig(chunk_size=chunk_size), recall=recall, vectors=vectors,
+                        ingest_seconds=0.0, query_seconds=query_seconds)
+
+
+class TestRetrievalConfig:
+    """Tests for the retrieval settings file"""
+
+    def test_defaults_match_the_old_hard_coded_values(self):
+        """Test that an absent config keeps chunk 100 / overlap 0 / mmr"""
+        config = RetrievalConfig.resolve(None)
+        assert (config.chunk_size, config.chunk_overlap, config.search_type) == (100, 0, "mmr")
+        assert config.search_kwargs() == {"k": 4, "fetch_k": 20, "lambda_mult": 0.5}
+
+    def test_save_and_load_ignores_metrics(self, tmp_path):
+        """Test that a tuner report row loads as a config"""
+        path = tmp_path / "retrieval.json"
+        path.write_text(json.dumps({"chunk_size": 500, "chunk_overlap": 50, "search_type": "similarity",
+                                    "k": 8, "recall": 1.0}))
+        config = RetrievalConfig.load(str(path))
+        assert config.search_kwargs() == {"k": 8}
+        config.save(str(tmp_path / "copy.json"))
+        assert RetrievalConfig.load(str(tmp_path / "copy.json")) == config
+
+    def test_invalid_settings(self):
+        """Test that impossible settings are rejected"""
+        with pytest.raises(ValueError):
+            RetrievalConfig(chunk_size=100, chunk_overlap=100)
+        with pytest.raises(ValueError):
+            RetrievalConfig(search_type="hybrid")
+
+
+class TestSweep:
+    """Tests for sweeping settings"""
+
+    def test_grid_skips_invalid_combinations(self):
+        """Test that overlaps at least the chunk size and fetch_k below k are dropped"""
+        chunkings, retrievers = expand_grid({"chunk_size": [50, 200], "chunk_overlap": [0, 100],
+                                             "search_type": ["similarity", "mmr"], "k": [4, 30],
+                                             "fetch_k": [20], "lambda_mult": [0.5]})
+        assert chunkings == [(50, 0), (200, 0), (200, 100)]
+        assert {"search_type": "mmr", "k": 30, "fetch_k": 20, "lambda_mult": 0.5} not in retrievers
+        assert len(retrievers) == 3
+
+    def test_sweep_scores_every_setting(self, sample_log, tmp_path):
+        """Test that recall, vectors and timings are reported and chunks are embedded once"""
+        pairs_path = tmp_path / "pairs.jsonl"
+        pairs_path.write_text(json.dumps({"question": "payment timeout", "expected": "payment timeout after"}) + "\n" +
+                              json.dumps({"question": "disk full", "expected": "disk full on /var"}) + "\n")
+        embeddings = WordEmbeddings()
+        results = sweep(str(sample_log), read_pairs(str(pairs_path)), embeddings,
+                        {"chunk_size": [60, 400], "chunk_overlap": [0], "search_type": ["similarity"], "k": [2]})
+        assert len(results) == 2
+        small, large = sorted(results, key=lambda r: r.config.chunk_size)
+        assert small.recall == 1.0
+        assert small.vectors > large.vectors
+        assert all(r.ingest_seconds >= 0 and r.query_seconds >= 0 for r in results)
+        assert embeddings.documents == small.vectors + large.vectors
+
+    def test_sweep_with_record_chunks(self, sample_log, tmp_path):
+        """Test that record chunking scores whole records and sweeps only overlap 0"""
+        pairs = [("payment timeout", "payment timeout after"), ("disk full", "disk full on /var")]
+        grid = {"chunk_size": [60, 400], "chunk_overlap": [0, 50], "search_type": ["similarity"], "k": [2]}
+        text = sweep(str(sample_log), pairs, WordEmbeddings(), grid)
+        results = sweep(str(sample_log), pairs, WordEmbeddings(), grid, records=True)
+        assert len(text) == 4
+        assert [(r.config.chunk_size, r.config.chunk_overlap) for r in results] == [(60, 0), (400, 0)]
+        # records are never split, at 60 bytes each one is a chunk of its own
+        assert results[0].vectors == 120 > results[1].vectors
+        assert results[0].recall == 1.0
+
+    def test_cached_embeddings(self):
+        """Test that repeated texts are embedded once"""
+        embeddings = WordEmbeddings()
+        cached = CachedEmbeddings(embeddings)
+        cached.embed_documents(["disk full", "disk full", "payment"])
+        assert cached.embed_documents(["payment"]) == [embeddings.embed_query("payment")]
+        assert embeddings.documents == 2
+
+
+class TestRecommendation:
+    """Tests for the Pareto front and the recommendation"""
+
+    def test_pareto_front(self):
+        """Test that dominated settings are dropped"""
+        a, b, c = result(1.0, 100, 0.01), result(0.8, 50, 0.01), result(0.8, 100, 0.02)
+        assert pareto_front([a, b, c]) == [a, b]
+
+    def test_recommend_cheapest_within_tolerance(self):
+        """Test that the tolerance trades a little recall for fewer vectors"""
+        a, b = result(1.0, 100, 0.01), result(0.9, 20, 0.01)
+        assert recommend([a, b]) is a
+        assert recommend([a, b], recall_tolerance=0.1) is b
+        assert recommend([]) is None
@@ -0,0 +1,179 @@
+import json
+import math
+import os
+import re
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.log_parser import LogRecord
+
+_ANOMALY_QUESTION = re.compile(
+    r"\b(wrong|fail\w*|error\w*|anomal\w*|issue\w*|problem\w*|incident\w*|root cause|broke\w*|"
+    r"spike\w*|unusual|outage|crash\w*|happened|changed?)\b", re.IGNORECASE)
+
+_SEVERITY_WEIGHT = {"FATAL": 1.5, "ERROR": 1.5, "WARN": 1.2}
+
+
+@dataclass
+class Anomaly:
+    kind: str
+    template: str
+    template_id: int
+    window_start: float
+    window_end: float
+    count: int
+    expected: float
+    score: float
+    example: str
+    offset: int
+
+    def describe(self) -> str:
+        window = f"{_format_time(self.window_start)} - {_format_time(self.window_end)}"
+        if self.kind == "spike":
+            what = f"rate spike: {self.count} occurrences in {window}, usually ~{self.expected:.1f} per window"
+        elif self.kind == "new":
+            what = f"new event first seen in {window}, {self.count} occurrences from then on"
+        else:
+            what = f"event stopped after {window}, expected ~{self.expected:.0f} more occurrences"
+        return f"[anomaly score {self.score:.1f}] {what}\ntemplate: {self.template}\nexample: {self.example}"
+
+
+def save_anomalies(path: str, anomalies: List[Anomaly], source: Optional[str] = None):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"source": source, "anomalies": [asdict(a) for a in anomalies]}, f)
+
+
+def load_anomalies(path: str) -> Tuple[Optional[str], List[Anomaly]]:
+    """The source log and its anomalies as saved by save_anomalies."""
+    with open(path) as f:
+        data = json.load(f)
+    return data["source"], [Anomaly(**a) for a in data["anomalies"]]
+
+
+def _format_time(value: float) -> str:
+    if value > 1e8:
+        return datetime.fromtimestamp(value, tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    return f"record {int(value)}"
+
+
+def is_anomaly_question(prompt: str) -> bool:
+    return bool(prompt and _ANOMALY_QUESTION.search(prompt))
+
+
+def window_positions(records: Sequence[LogRecord], window_seconds: float, max_windows: int, window_records: int):
+    """Return (window index per record, window start times, window width) using timestamps when the log has them."""
+    times = np.array([r.timestamp for r in records], dtype=np.float64)
+    valid = ~np.isnan(times)
+    if valid.any():
+        # continuation of the last known timestamp for lines that have none
+        index = np.where(valid, np.arange(len(times)), 0)
+        np.maximum.accumulate(index, out=index)
+        times = times[index]
+        times[np.isnan(times)] = times[valid][0]
+        start, span = times.min(), times.max() - times.min()
+        width = max(window_seconds, span / max_windows, 1e-9)
+    else:
+        times = np.arange(len(records), dtype=np.float64)
+        start, width = 0.0, float(max(window_records, math.ceil(len(records) / max_windows)))
+    windows = ((times - start) // width).astype(np.int64)
+    n_windows = int(windows.max()) + 1
+    return windows, start + width * np.arange(n_windows + 1), width
+
+
+def _median_with_fill(values: np.ndarray, group_start: np.ndarray, present: np.ndarray, fill: np.ndarray,
+                      n: int) -> np.ndarray:
+    """
+    Per group median of n values: the group's values (sorted, stored from
+    group_start) plus n - present copies of fill, without materializing them.
+    """
+    group = np.repeat(np.arange(len(present)), present)
+    below = np.bincount(group, weights=values < fill[group], minlength=len(present)).astype(np.int64)
+    missing = n - present
+
+    def nth(p):
+        # sorted order is: values below fill, the fill copies, the remaining values
+        before = np.minimum(p, below)
+        after = np.maximum(p - missing, below)
+        index = np.where(p < below, before, after)
+        picked = values[np.minimum(group_start + index, len(values) - 1)]
+        return np.where((p >= below) & (p < below + missing), fill, picked)
+
+    if n % 2:
+        return nth(np.full(len(present), n // 2))
+    return (nth(np.full(len(present), n // 2 - 1)) + nth(np.full(len(present), n // 2))) / 2
+
+
+def detect_anomalies(records: Sequence[LogRecord], window_seconds: float = 60.0, top_n: int = 10,
+                     spike_threshold: float = 4.0, min_count: int = 3, warmup: float = 0.1,
+                     max_windows: int = 2000, window_records: int = 1000) -> List[Anomaly]:
+    """
+    Bin template occurrences into windows and score rate spikes, templates that
+    appear after the warm-up part of the log and templates that stop appearing.
+    """
+    if not records:
+        return []
+
+    windows, edges, _ = window_positions(records, window_seconds, max_windows, window_records)
+    n_windows = len(edges) - 1
+    template_ids, inverse = np.unique(np.array([r.template_id for r in records], dtype=np.int64),
+                                      return_inverse=True)
+    n_templates = len(template_ids)
+    # only the (template, window) cells that occur are counted, most templates show up in few windows
+    cells, first_in_cell, cell_counts = np.unique(inverse * n_windows + windows, return_index=True,
+                                                  return_counts=True)
+    cell_template, cell_window = cells // n_windows, cells % n_windows
+    present = np.bincount(cell_template, minlength=n_templates)
+    group_start = np.concatenate([[0], np.cumsum(present)[:-1]])
+    first_window = cell_window[group_start]
+    last_window = cell_window[group_start + present - 1]
+    totals = np.bincount(cell_template, weights=cell_counts, minlength=n_templates).astype(np.int64)
+
+    weights = np.array([_SEVERITY_WEIGHT.get(records[rec].level, 1.0) for rec in first_in_cell[group_start]])
+
+    anomalies = []
+
+    def add(kind, t, w, count, expected, score):
+        rec = records[first_in_cell[np.searchsorted(cells, t * n_windows + w)]]
+        anomalies.append(Anomaly(kind=kind, template=rec.template, template_id=int(template_ids[t]),
+                                 window_start=float(edges[w]), window_end=float(edges[w + 1]),
+                                 count=int(count), expected=float(expected), score=float(score * weights[t]),
+                                 example=rec.text.split("\n", 1)[0], offset=rec.offset))
+
+    if n_windows > 1:
+        # robust per-template baseline: median and MAD over all windows, empty windows included
+        by_count = np.lexsort((cell_counts, cell_template))
+        median = _median_with_fill(cell_counts[by_count].astype(np.float64), group_start, present,
+                                   np.zeros(n_templates), n_windows)
+        deviation = np.abs(cell_counts - median[cell_template])
+        by_deviation = np.lexsort((deviation, cell_template))
+        # an empty window deviates from the median by the median itself
+        mad = _median_with_fill(deviation[by_deviation], group_start, present, median, n_windows)
+        scale = 1.4826 * mad + np.sqrt(median) + 1.0
+        # the z score grows with the count, so the peak is the largest count, earliest window on ties
+        by_peak = np.lexsort((cell_window, -cell_counts, cell_template))[group_start]
+        peak, peak_count = cell_window[by_peak], cell_counts[by_peak]
+        peak_z = (peak_count - median) / scale
+        warmup_windows = max(1, int(n_windows * warmup))
+
+        for t in np.nonzero((peak_z >= spike_threshold) & (peak_count >= min_count)
+                            & (first_window < warmup_windows))[0]:
+            add("spike", t, peak[t], peak_count[t], median[t], peak_z[t])
+
+        for t in np.nonzero(first_window >= warmup_windows)[0]:
+            add("new", t, first_window[t], totals[t], 0.0,
+                spike_threshold + math.log2(1 + totals[t]))
+
+        active = last_window - first_window + 1
+        rate = totals / active
+        missing = n_windows - 1 - last_window
+        expected_missing = rate * missing
+        for t in np.nonzero((missing > 0) & (expected_missing >= min_count) & (active >= 2))[0]:
+            add("disappeared", t, last_window[t], totals[t], expected_missing[t],
+                expected_missing[t] / math.sqrt(expected_missing[t]))
+
+    anomalies.sort(key=lambda a: a.score, reverse=True)
+    return anomalies[:top_n]
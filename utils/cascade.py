@@ -0,0 +1,139 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field, asdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.runnables import Runnable
+
+FAST, STRONG = "fast", "strong"
+
+_ANALYSIS = re.compile(r"\b(why|root.?cause|caus\w*|explain\w*|diagnos\w*|investigat\w*|correlat\w*|impact\w*|"
+                       r"fix\w*|recommend\w*|suggest\w*|compar\w*|trends?|patterns?|should|how (?:do|can|to))\b",
+                       re.IGNORECASE)
+_HEDGES = re.compile(r"\b(i don'?t know|not sure|unsure|cannot (?:be )?determined?|can'?t (?:tell|determine)|"
+                     r"unable to|no (?:relevant )?information|not enough (?:information|context)|"
+                     r"does not (?:contain|mention|provide)|doesn'?t (?:contain|mention|say)|unclear)\b",
+                     re.IGNORECASE)
+# identifiers an answer should not invent: codes, ids, hosts, long numbers
+_IDENTIFIER = re.compile(r"\b(?=[\w.\-:]*\d)[A-Za-z][\w.\-:]{3,}\b|\b\d{4,}\b")
+_MAX_LOOKUP_WORDS = 25
+
+
+def classify_question(prompt: str) -> str:
+    """'lookup' for counts, times and listings a small model handles, 'analysis' for reasoning questions."""
+    if _ANALYSIS.search(prompt) or len(prompt.split()) > _MAX_LOOKUP_WORDS:
+        return "analysis"
+    return "lookup"
+
+
+def self_check(answer: str, docs: List[Document]) -> Tuple[bool, Optional[str]]:
+    """Whether a fast tier answer can be returned as is, with the reason to escalate when not."""
+    if not answer.strip():
+        return False, "empty"
+    if _HEDGES.search(answer):
+        return False, "hedged"
+    context = " ".join(d.page_content for d in docs)
+    invented = [token for token in (t.rstrip(".:-") for t in _IDENTIFIER.findall(answer)) if token not in context]
+    if invented:
+        return False, f"ungrounded {invented[0]}"
+    return True, None
+
+
+@dataclass
+class Route:
+    question_class: str
+    tiers: List[str] = field(default_factory=list)
+    latency: Dict[str, float] = field(default_factory=dict)
+    escalated: bool = False
+    reason: Optional[str] = None
+    timestamp: float = field(default_factory=time.time)
+
+    @property
+    def answered_by(self) -> str:
+        return self.tiers[-1]
+
+
+class CascadeMetrics:
+    """Routing decisions and per tier latency of recent questions, optionally appended to a JSON lines file."""
+
+    def __init__(self, path: Optional[str] = None, max_routes: int = 10_000):
+        self.path = path
+        self.routes: "deque[Route]" = deque(maxlen=max_routes)
+        self._lock = threading.Lock()
+
+    def record(self, route: Route):
+        with self._lock:
+            self.routes.append(route)
+            if self.path:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path, "a") as f:
+                    f.write(json.dumps({**asdict(route), "answered_by": route.answered_by}) + "\n")
+
+    def summary(self) -> dict:
+        with self._lock:
+            routes = list(self.routes)
+        latency = {}
+        for tier in (FAST, STRONG):
+            values = [r.latency[tier] for r in routes if tier in r.latency]
+            if values:
+                p50, p95 = np.percentile(values, [50, 95])
+                latency[tier] = {"calls": len(values), "p50_s": float(p50), "p95_s": float(p95)}
+        totals = [sum(r.latency.values()) for r in routes]
+        escalations = sum(r.escalated for r in routes)
+        return {"questions": len(routes),
+                "classes": {c: sum(r.question_class == c for r in routes) for c in {r.question_class for r in routes}},
+                "answered_by": {t: sum(r.answered_by == t for r in routes) for t in (FAST, STRONG)},
+                "escalations": escalations, "escalation_rate": escalations / len(routes) if routes else 0.0,
+                "p50_answer_s": float(np.percentile(totals, 50)) if totals else 0.0, "latency": latency}
+
+
+class LLMCascade:
+    """
+    Lookup questions go to the fast model first and are escalated to the strong
+    model when the answer fails the self-check, analysis questions go straight
+    to the strong model.
+    """
+
+    def __init__(self, fast: Runnable, strong: Runnable, metrics: Optional[CascadeMetrics] = None,
+                 router: Callable[[str], str] = classify_question,
+                 check: Callable[[str, List[Document]], Tuple[bool, Optional[str]]] = self_check):
+        self.fast = fast
+        self.strong = strong
+        self.metrics = metrics or CascadeMetrics()
+        self.router = router
+        self.check = check
+
+    def answer(self, build: Callable[[Runnable], Runnable], inputs: dict, question: str,
+               docs: List[Document]) -> str:
+        """Run the chain built around each tier's model in turn, returns the accepted answer."""
+        route = Route(question_class=self.router(question))
+        try:
+            if route.question_class == "lookup":
+                try:
+                    answer = self._run(FAST, build(self.fast), inputs, route)
+                    ok, route.reason = self.check(answer, docs)
+                except Exception as e:
+                    # a local model that is down or overloaded should not fail the question
+                    ok, route.reason = False, f"error {type(e).__name__}"
+                if ok:
+                    return answer
+                route.escalated = True
+                print(f"escalated to the strong model, {route.reason}......")
+            return self._run(STRONG, build(self.strong), inputs, route)
+        finally:
+            self.metrics.record(route)
+
+    @staticmethod
+    def _run(tier: str, chain: Runnable, inputs: dict, route: Route) -> str:
+        start = time.perf_counter()
+        try:
+            return chain.invoke(inputs)
+        finally:
+            route.tiers.append(tier)
+            route.latency[tier] = time.perf_counter() - start
@@ -0,0 +1,277 @@
+import fcntl
+import json
+import mmap
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+
+from utils.log_parser import LogRecord
+
+CHUNK_DTYPE = np.dtype([("chunk_id", "<i8"), ("file_id", "<i4"), ("offset", "<i8"), ("length", "<i4"),
+                        ("timestamp", "<f8"), ("level", "i1"), ("template_id", "<u4")])
+LEVELS = [None, "TRACE", "DEBUG", "INFO", "NOTICE", "WARN", "ERROR", "FATAL"]
+_LEVEL_CODES = {level: code for code, level in enumerate(LEVELS)}
+
+BLOCK_SIZE = 1 << 20
+
+
+class BlockFile:
+    """
+    zlib compressed copy of a file in independent blocks, so a byte range can be
+    read by decompressing only the blocks it touches.
+    """
+
+    def __init__(self, path: str, cache_blocks: int = 16):
+        self.path = path
+        self.index = np.load(path + ".idx.npy")
+        self._cache: "OrderedDict[int, bytes]" = OrderedDict()
+        self._cache_blocks = cache_blocks
+        self._lock = threading.Lock()
+
+    @classmethod
+    def write(cls, source: str, path: str, block_size: int = BLOCK_SIZE) -> "BlockFile":
+        offsets = [0]
+        with open(source, "rb") as src, open(path, "wb") as dst:
+            while True:
+                block = src.read(block_size)
+                if not block:
+                    break
+                dst.write(zlib.compress(block, 6))
+                offsets.append(dst.tell())
+        np.save(path + ".idx.npy", np.array([block_size] + offsets, dtype=np.int64))
+        return cls(path)
+
+    @property
+    def block_size(self) -> int:
+        return int(self.index[0])
+
+    def __len__(self) -> int:
+        return max(0, len(self.index) - 2) * self.block_size
+
+    def _block(self, number: int) -> bytes:
+        with self._lock:
+            if number in self._cache:
+                self._cache.move_to_end(number)
+                return self._cache[number]
+        start, end = self.index[1 + number], self.index[2 + number]
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            data = zlib.decompress(f.read(end - start))
+        with self._lock:
+            self._cache[number] = data
+            if len(self._cache) > self._cache_blocks:
+                self._cache.popitem(last=False)
+        return data
+
+    def read(self, offset: int, length: int) -> bytes:
+        blocks = len(self.index) - 2
+        first, last = offset // self.block_size, (offset + length - 1) // self.block_size
+        data = b"".join(self._block(n) for n in range(first, min(last, blocks - 1) + 1))
+        start = offset - first * self.block_size
+        return data[start:start + length]
+
+
+class _MappedFile:
+
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) \
+            if os.path.getsize(path) else b""
+
+    def read(self, offset: int, length: int) -> bytes:
+        return self._map[offset:offset + length]
+
+    def __len__(self) -> int:
+        return len(self._map)
+
+
+class ChunkStore:
+    """
+    Append-only table of (chunk id, file id, byte offset, length, parsed fields).
+    Vectors only carry the chunk id, the text is read back from the original log
+    (memory-mapped) or from a block compressed copy kept next to the table.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._table_path = os.path.join(path, "chunks.bin")
+        self._files_path = os.path.join(path, "files.json")
+        self._lock_path = os.path.join(path, ".lock")
+        self._lock = threading.Lock()
+        self._readers: Dict[int, Any] = {}
+        self.files: List[dict] = []
+        self.table = np.empty(0, dtype=CHUNK_DTYPE)
+        self._refresh()
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def _refresh(self):
+        """Pick up files and chunks other analyzers sharing this directory added since we last looked."""
+        if os.path.exists(self._files_path):
+            with open(self._files_path) as f:
+                self.files = json.load(f)
+        if os.path.exists(self._table_path):
+            known = len(self.table)
+            if os.path.getsize(self._table_path) // CHUNK_DTYPE.itemsize > known:
+                # the table is append-only, only the rows past the ones we have are read
+                new = np.fromfile(self._table_path, dtype=CHUNK_DTYPE, offset=known * CHUNK_DTYPE.itemsize)
+                self.table = np.concatenate([self.table, new])
+
+    @contextmanager
+    def _writing(self):
+        # ids are positions in the shared table, every writer re-reads it under one lock before assigning them
+        with self._lock, open(self._lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _row(self, chunk_id: int):
+        if chunk_id >= len(self.table):
+            with self._lock:
+                self._refresh()
+        return self.table[chunk_id]
+
+    def add_file(self, file_path: str, compress: bool = False) -> int:
+        stat = os.stat(file_path)
+        # compressed before taking the lock, only the rename to its file id happens under it
+        staged = os.path.join(self.path, f".{os.getpid()}-{threading.get_ident()}.zblk")
+        if compress:
+            BlockFile.write(file_path, staged)
+        with self._writing():
+            file_id = len(self.files)
+            entry = {"file_id": file_id, "source": file_path, "path": os.path.abspath(file_path), "size": stat.st_size,
+                     "mtime": stat.st_mtime, "block_file": None}
+            if compress:
+                block_path = os.path.join(self.path, f"{file_id}.zblk")
+                os.replace(staged, block_path)
+                os.replace(staged + ".idx.npy", block_path + ".idx.npy")
+                entry["block_file"] = block_path
+            self.files.append(entry)
+            with open(self._files_path, "w") as f:
+                json.dump(self.files, f)
+        return file_id
+
+    def add_chunks(self, file_id: int, chunks: Sequence[Sequence[LogRecord]]) -> List[int]:
+        """Add chunks made of consecutive records, returns their chunk ids."""
+        rows = np.empty(len(chunks), dtype=CHUNK_DTYPE)
+        for i, records in enumerate(chunks):
+            first, last = records[0], records[-1]
+            levels = [_LEVEL_CODES.get(r.level, 0) for r in records]
+            rows[i] = (0, file_id, first.offset, last.offset + last.length - first.offset,
+                       first.timestamp, max(levels), first.template_id)
+        with self._writing():
+            rows["chunk_id"] = np.arange(len(self.table), len(self.table) + len(rows))
+            with open(self._table_path, "ab") as f:
+                rows.tofile(f)
+            self.table = np.concatenate([self.table, rows])
+        return rows["chunk_id"].tolist()
+
+    def _check_unchanged(self, entry: dict):
+        # offsets point into the file as it was at ingest, a rotated or rewritten log would return other lines
+        try:
+            stat = os.stat(entry["path"])
+        except FileNotFoundError:
+            raise ValueError(f"{entry['source']} was removed after it was ingested, ingest it again") from None
+        if stat.st_size != entry["size"] or stat.st_mtime != entry["mtime"]:
+            raise ValueError(f"{entry['source']} changed after it was ingested, ingest it again")
+
+    def _reader(self, file_id: int):
+        if file_id >= len(self.files):
+            with self._lock:
+                self._refresh()
+        entry = self.files[file_id]
+        if not entry["block_file"]:
+            # a compressed copy is immune to changes of the original, a memory map is not
+            self._check_unchanged(entry)
+        if file_id not in self._readers:
+            self._readers[file_id] = BlockFile(entry["block_file"]) if entry["block_file"] \
+                else _MappedFile(entry["path"])
+        return self._readers[file_id]
+
+    def read(self, file_id: int, offset: int, length: int) -> str:
+        return self._reader(file_id).read(offset, length).decode("utf-8", errors="replace")
+
+    def text(self, chunk_id: int) -> str:
+        row = self._row(chunk_id)
+        return self.read(int(row["file_id"]), int(row["offset"]), int(row["length"])).rstrip("\r\n")
+
+    def source(self, chunk_id: int) -> str:
+        return self.files[int(self._row(chunk_id)["file_id"])]["source"]
+
+    def metadata(self, chunk_id: int) -> dict:
+        row = self._row(chunk_id)
+        metadata = {"chunk_id": int(chunk_id), "source": self.source(chunk_id), "offset": int(row["offset"]),
+                    "level": LEVELS[int(row["level"])] or ""}
+        if not np.isnan(row["timestamp"]):
+            metadata["timestamp"] = float(row["timestamp"])
+        return metadata
+
+    def neighbours(self, chunk_id: int, before: int = 1, after: int = 1) -> List[int]:
+        """Chunk ids around chunk_id in the same file, chunk_id included."""
+        file_id = self._row(chunk_id)["file_id"]
+        ids = range(max(0, chunk_id - before), min(len(self.table), chunk_id + after + 1))
+        return [i for i in ids if self.table[i]["file_id"] == file_id]
+
+    def surrounding(self, chunk_id: int, lines_before: int = 3, lines_after: int = 3, window: int = 65536) -> str:
+        """The chunk text with a few raw lines before and after it, read straight from the file."""
+        row = self._row(chunk_id)
+        reader = self._reader(int(row["file_id"]))
+        offset, length = int(row["offset"]), int(row["length"])
+        start = max(0, offset - window)
+        # chunks start at a line start, so the bytes before end with a newline
+        before = reader.read(start, offset - start).split(b"\n")[:-1][-lines_before:] if lines_before else []
+        after = reader.read(offset + length, window).split(b"\n")[:lines_after] if lines_after else []
+        data = b"".join(line + b"\n" for line in before) + reader.read(offset, length) + b"\n".join(after)
+        return data.decode("utf-8", errors="replace").strip("\n")
+
+    def resolve(self, docs: List[Document]) -> List[Document]:
+        """Fill in the text of retrieved documents that only carry a chunk id."""
+        resolved = []
+        for doc in docs:
+            chunk_id = doc.metadata.get("chunk_id")
+            if chunk_id is not None and not doc.page_content:
+                doc = Document(id=doc.id, page_content=self.text(int(chunk_id)), metadata=doc.metadata)
+            resolved.append(doc)
+        return resolved
+
+
+def group_records(records: Sequence[LogRecord], chunk_size: int = 100) -> List[List[LogRecord]]:
+    """Consecutive records packed into chunks of about chunk_size bytes, records are never split."""
+    chunks, current, size = [], [], 0
+    for record in records:
+        if current and size + record.length > chunk_size:
+            chunks.append(current)
+            current, size = [], 0
+        current.append(record)
+        size += record.length
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def upsert_references(vector_store, texts: List[str], metadatas: List[dict], ids: List[str],
+                      batch_size: int = 100):
+    """
+    Embed texts and upsert vectors whose metadata carries the chunk reference
+    with an empty text field, so the index never stores the chunk text.
+    """
+    if hasattr(vector_store, "add_embeddings"):
+        vectors = vector_store.embeddings.embed_documents(texts)
+        vector_store.add_embeddings(vectors, metadatas, ids)
+        return
+    text_key = getattr(vector_store, "_text_key", "text")
+    for i in range(0, len(texts), batch_size):
+        vectors = vector_store.embeddings.embed_documents(texts[i:i + batch_size])
+        vector_store.index.upsert(vectors=[(id_, vector, {**metadata, text_key: ""}) for id_, vector, metadata
+                                           in zip(ids[i:i + batch_size], vectors, metadatas[i:i + batch_size])])
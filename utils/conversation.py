@@ -0,0 +1,114 @@
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+_CONNECTOR = re.compile(r"^\s*(and|but|so|also|then|ok(ay)?|what about|how about)\b", re.IGNORECASE)
+_BACK_REFERENCE = re.compile(
+    r"\b(after that|before that|right (after|before)|what happened (next|then|before)|the same|more about|"
+    r"(why|when|how) did (it|that|this|they)|(that|this|it|those|these|them) (one|error|event|request|line)s?)\b",
+    re.IGNORECASE)
+# bare this, it and there open plenty of standalone questions, only the demonstratives point back
+_PRONOUN = re.compile(r"\b(that|those|these|them)\b", re.IGNORECASE)
+# times, dates, identifiers, quoted strings and named services the previous turn may not have covered
+_NEW_ENTITY = re.compile(r"\b\d{1,2}:\d{2}\b|\b\d{4}-\d{2}-\d{2}\b|\b\d+\s*(am|pm)\b|[\"`][^\"`]+[\"`]|"
+                         r"\b(?=[\w.\-]*\d)[A-Za-z][\w.\-]{2,}\b|\b\d{3,}\b|"
+                         r"\b(?!(?:that|this|the|same|a|an)\b)[\w\-]+ (service|server|host|database|db|queue|job|pod)s?\b",
+                         re.IGNORECASE)
+_AFTER = re.compile(r"\b(after|afterwards|next|then|following|later|subsequent(ly)?)\b", re.IGNORECASE)
+_BEFORE = re.compile(r"\b(before|prior|preceding|earlier|leading up|previous(ly)?)\b", re.IGNORECASE)
+
+
+def is_follow_up(prompt: str) -> bool:
+    """Questions that only make sense together with the previous turn."""
+    if not prompt:
+        return False
+    if _CONNECTOR.search(prompt) or _BACK_REFERENCE.search(prompt):
+        return True
+    return len(prompt.split()) <= 6 and bool(_PRONOUN.search(prompt))
+
+
+def names_new_entities(prompt: str) -> bool:
+    """Whether a question brings up times or entities of its own, those need a fresh search."""
+    return bool(prompt) and bool(_NEW_ENTITY.search(prompt))
+
+
+def follow_up_window(prompt: str, span: int = 2) -> Tuple[int, int]:
+    """Neighbouring chunks (before, after) a follow-up asks about."""
+    after, before = bool(_AFTER.search(prompt)), bool(_BEFORE.search(prompt))
+    if after and not before:
+        return 0, span
+    if before and not after:
+        return span, 0
+    return 1, 1
+
+
+@dataclass
+class Conversation:
+    """
+    Questions, answers and the context documents of one session. Context only
+    grows by appending, so the prompt prefix (system prompt plus earlier
+    context) stays byte identical between turns and provider prefix caches hit.
+    """
+    max_turns: int = 10
+    max_context_docs: int = 48
+    history: List[Tuple[str, str]] = field(default_factory=list)
+    context: List[Document] = field(default_factory=list)
+    last_chunk_ids: List[int] = field(default_factory=list)
+
+    @property
+    def last_question(self) -> Optional[str]:
+        return self.history[-2][1] if len(self.history) >= 2 else None
+
+    def chunk_ids(self) -> set:
+        return {int(d.metadata["chunk_id"]) for d in self.context if d.metadata.get("chunk_id") is not None}
+
+    def reset_context(self):
+        self.context = []
+        self.last_chunk_ids = []
+
+    def extend(self, docs: List[Document]) -> List[Document]:
+        """Append docs not yet in the context, returns the context to answer from."""
+        seen = {(d.metadata.get("source"), d.metadata.get("chunk_id"), d.page_content) for d in self.context}
+        added = [d for d in docs if (d.metadata.get("source"), d.metadata.get("chunk_id"), d.page_content) not in seen]
+        if len(self.context) + len(added) > self.max_context_docs:
+            # starting over breaks the cached prefix once instead of on every turn
+            self.context = []
+        self.context = self.context + added
+        chunk_ids = [int(d.metadata["chunk_id"]) for d in added if d.metadata.get("chunk_id") is not None]
+        if chunk_ids:
+            self.last_chunk_ids = chunk_ids
+        return self.context
+
+    def record(self, question: str, answer: str):
+        self.history += [("human", question), ("ai", answer)]
+        self.history = self.history[-2 * self.max_turns:]
+
+
+class Conversations:
+    """Conversation per session id, the least recently used sessions are dropped."""
+
+    def __init__(self, max_sessions: int = 100, **conversation_kwargs):
+        self.max_sessions = max_sessions
+        self._conversation_kwargs = conversation_kwargs
+        self._sessions: "OrderedDict[str, Conversation]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, session_id: str) -> Conversation:
+        with self._lock:
+            if session_id not in self._sessions:
+                self._sessions[session_id] = Conversation(**self._conversation_kwargs)
+                if len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            self._sessions.move_to_end(session_id)
+            return self._sessions[session_id]
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
@@ -0,0 +1,145 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from utils.log_parser import LogRecord
+
+# each pattern captures the identifier in its first group
+DEFAULT_ID_PATTERNS = [
+    r"\b(?:trace[_\-.]?id|x-b3-traceid|request[_\-.]?id|req[_\-.]?id|x-request-id|correlation[_\-.]?id|"
+    r"transaction[_\-.]?id|txn[_\-.]?id)[\"']?\s*[=:]\s*[\"']?([\w\-]{6,})",
+    r"\btraceparent[\"']?\s*[=:]\s*[\"']?00-([0-9a-f]{32})-[0-9a-f]{16}-[0-9a-f]{2}\b",
+    r"\b([0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12})\b",
+]
+_QUESTION_TOKEN = re.compile(r"(?=[\w\-]*\d)[\w\-]{6,}")
+
+ENTRY_DTYPE = np.dtype([("key", "<u8"), ("file_id", "<i4"), ("offset", "<i8"), ("length", "<i4"),
+                        ("timestamp", "<f8")])
+
+
+def id_key(identifier: str) -> int:
+    return int.from_bytes(hashlib.blake2b(identifier.lower().encode("utf-8"), digest_size=8).digest(), "little")
+
+
+@dataclass
+class TimelineEvent:
+    source: str
+    timestamp: float
+    offset: int
+    text: str
+
+
+class CorrelationIndex:
+    """
+    Hash index from trace / request / correlation ids to the records that carry
+    them, across every ingested file. Ids are stored as 64 bit hashes in one
+    sorted table, a lookup is a binary search and hits are checked against the text.
+    """
+
+    def __init__(self, path: str, patterns: Optional[Sequence[str]] = None, max_occurrences: int = 1000):
+        self.path = path
+        self.patterns = [re.compile(p, re.IGNORECASE) for p in (patterns or DEFAULT_ID_PATTERNS)]
+        # an id on more records than this is an entity id (user, tenant), not a single request
+        self.max_occurrences = max_occurrences
+        self._table_path = os.path.join(path, "ids.npy")
+        self._files_path = os.path.join(path, "files.json")
+        self._lock = threading.Lock()
+        self.files: List[str] = []
+        self.table = np.empty(0, dtype=ENTRY_DTYPE)
+        self._loaded_mtime = None
+        self._refresh()
+
+    def __len__(self) -> int:
+        self._refresh()
+        return len(self.table)
+
+    def _refresh(self):
+        """Reload the table when another analyzer sharing this directory saved a newer one."""
+        try:
+            mtime = os.stat(self._table_path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime != self._loaded_mtime:
+            # files.json is written before the table, read after it, it always covers the table's file ids
+            table = np.load(self._table_path)
+            with open(self._files_path) as f:
+                files = json.load(f)
+            self.table, self.files, self._loaded_mtime = table, files, mtime
+
+    def extract_ids(self, text: str) -> List[str]:
+        found = []
+        for pattern in self.patterns:
+            for match in pattern.finditer(text):
+                if match.group(1) not in found:
+                    found.append(match.group(1))
+        return found
+
+    def add_records(self, file_path: str, records: Iterable[LogRecord]) -> int:
+        """Index the ids of every record of one file, returns the number of (id, record) entries."""
+        rows = []
+        for record in records:
+            for identifier in self.extract_ids(record.text):
+                rows.append((id_key(identifier), 0, record.offset, record.length, record.timestamp))
+        rows = np.array(rows, dtype=ENTRY_DTYPE)
+        os.makedirs(self.path, exist_ok=True)
+        # other analyzers save into the same directory, merge into what is on disk right now
+        with self._lock, open(os.path.join(self.path, ".lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                rows["file_id"] = len(self.files)
+                # read back later from processes started in other directories, like the chunk store's paths
+                files = self.files + [os.path.abspath(file_path)]
+                table = np.concatenate([self.table, rows])
+                table = table[np.lexsort((table["offset"], table["file_id"], table["timestamp"], table["key"]))]
+                with open(self._files_path, "w") as f:
+                    json.dump(files, f)
+                # np.save appends .npy to other names, the temporary name keeps the suffix
+                tmp = f"{self._table_path[:-4]}.tmp.npy"
+                np.save(tmp, table)
+                os.replace(tmp, self._table_path)
+                self.table, self.files = table, files
+                self._loaded_mtime = os.stat(self._table_path).st_mtime_ns
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        return len(rows)
+
+    def lookup(self, identifier: str) -> np.ndarray:
+        self._refresh()
+        key = np.uint64(id_key(identifier))
+        start, end = np.searchsorted(self.table["key"], key, "left"), np.searchsorted(self.table["key"], key, "right")
+        if end - start > self.max_occurrences:
+            return self.table[:0]
+        return self.table[start:end]
+
+    def _read(self, file_id: int, offset: int, length: int) -> str:
+        with open(self.files[file_id], "rb") as f:
+            f.seek(offset)
+            return f.read(length).decode("utf-8", errors="replace").rstrip("\r\n")
+
+    def timeline(self, identifier: str, max_events: int = 50) -> List[TimelineEvent]:
+        """Every record carrying the id in time order, whatever file or service it came from."""
+        events = []
+        for row in self.lookup(identifier)[:max_events]:
+            text = self._read(int(row["file_id"]), int(row["offset"]), int(row["length"]))
+            # a hash collision or a rewritten file shows up as text without the id
+            if identifier.lower() in text.lower():
+                events.append(TimelineEvent(source=self.files[int(row["file_id"])], timestamp=float(row["timestamp"]),
+                                            offset=int(row["offset"]), text=text))
+        return events
+
+    def find_ids(self, text: str) -> List[str]:
+        """Ids in free text that are in the index, also bare tokens as people write them in questions."""
+        candidates = self.extract_ids(text) + _QUESTION_TOKEN.findall(text)
+        found = []
+        for candidate in candidates:
+            if candidate not in found and len(self.lookup(candidate)):
+                found.append(candidate)
+        return found
@@ -0,0 +1,151 @@
+import hashlib
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+from langchain_ollama import OllamaEmbeddings
+from langchain_openai import OpenAIEmbeddings
+from langchain_pinecone import PineconeEmbeddings
+from pydantic import SecretStr
+
+from utils.rate_limiter import RateLimitedEmbeddings, estimate_tokens
+
+EmbedBatch = Callable[[List[str]], List[List[float]]]
+
+# models embedding a query exactly like a document, several queries can go out as one document request
+_SYMMETRIC = (OpenAIEmbeddings, OllamaEmbeddings)
+
+
+def query_batcher(embeddings: Embeddings) -> Optional[EmbedBatch]:
+    """A function embedding several queries in one provider request, None when the model has no such call."""
+    if isinstance(embeddings, RateLimitedEmbeddings):
+        inner = query_batcher(embeddings.embeddings)
+        if inner is None:
+            return None
+        budget = embeddings.budget
+        return lambda texts: budget.call(lambda: inner(texts), sum(estimate_tokens(t) for t in texts))
+    if hasattr(embeddings, "embed_queries"):
+        return embeddings.embed_queries
+    if isinstance(embeddings, PineconeEmbeddings):
+        # queries are embedded with the query parameters, embed_documents would use the passage ones
+        return lambda texts: [r["values"] for r in
+                              embeddings._embed_texts(texts, embeddings.model, embeddings.query_params)]
+    if isinstance(embeddings, _SYMMETRIC):
+        return embeddings.embed_documents
+    return None
+
+
+def client_key(embeddings: Embeddings) -> str:
+    """Fingerprint of a client's settings and credentials, clients with equal keys send the same requests."""
+    if isinstance(embeddings, RateLimitedEmbeddings):
+        return f"{client_key(embeddings.embeddings)}:{id(embeddings.budget)}"
+    settings = [(name, value.get_secret_value() if isinstance(value, SecretStr) else value)
+                for name, value in sorted(vars(embeddings).items())
+                if isinstance(value, (str, int, float, bool, SecretStr, type(None)))]
+    return f"{type(embeddings).__name__}:{hashlib.blake2b(repr(settings).encode(), digest_size=8).hexdigest()}"
+
+
+class MicroBatcher:
+    """
+    Collects single texts from concurrent callers for up to max_wait seconds or
+    max_batch texts, sends them as one call and hands every caller its vector.
+    A caller alone only pays max_wait on top of its own request.
+    """
+
+    def __init__(self, embed_batch: EmbedBatch, max_batch: int = 64, max_wait: float = 0.005,
+                 max_in_flight: int = 4):
+        self.embed_batch = embed_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self.requests = 0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._slots = threading.Semaphore(max_in_flight)
+        self._pool = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="embed-batch")
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def mean_batch_size(self) -> float:
+        return self.requests / self.batches if self.batches else 0.0
+
+    def embed(self, text: str) -> List[float]:
+        future = Future()
+        self._queue.put((text, future))
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._collect, name="embed-batcher", daemon=True)
+                self._thread.start()
+        return future.result()
+
+    def _collect(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            # bounded in-flight calls, requests arriving meanwhile go out in the next batch
+            self._slots.acquire()
+            self._pool.submit(self._send, batch)
+
+    def _send(self, batch):
+        try:
+            texts = list(dict.fromkeys(text for text, _ in batch))
+            vectors = dict(zip(texts, self.embed_batch(texts)))
+            with self._lock:
+                self.batches += 1
+                self.requests += len(batch)
+            for text, future in batch:
+                future.set_result(vectors[text])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._slots.release()
+
+
+class BatchingEmbeddings(Embeddings):
+    """Embeddings wrapper coalescing concurrent embed_query calls into batched requests."""
+
+    _batchers: Dict[Tuple, Optional[MicroBatcher]] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, embeddings: Embeddings, embed_batch: Optional[EmbedBatch] = None,
+                 batcher: Optional[MicroBatcher] = None, **batcher_kwargs):
+        self.embeddings = embeddings
+        if batcher is None:
+            embed_batch = embed_batch or query_batcher(embeddings)
+            batcher = MicroBatcher(embed_batch, **batcher_kwargs) if embed_batch else None
+        self.batcher = batcher
+        if self.batcher is None:
+            print(f"{type(embeddings).__name__} can not embed queries in batches, query batching is off......")
+
+    @classmethod
+    def shared(cls, key: str, embeddings: Embeddings, **kwargs) -> "BatchingEmbeddings":
+        """
+        Wraps this analyzer's client, only the batcher is shared, by every analyzer in this process
+        with the same model, client settings and batching settings, so their questions go out together.
+        """
+        batcher_key = (key, client_key(embeddings), tuple(sorted(kwargs.items())))
+        with cls._shared_lock:
+            if batcher_key not in cls._batchers:
+                embed_batch = query_batcher(embeddings)
+                cls._batchers[batcher_key] = MicroBatcher(embed_batch, **kwargs) if embed_batch else None
+            batcher = cls._batchers[batcher_key]
+        return cls(embeddings, batcher=batcher, **kwargs)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.batcher is None:
+            return self.embeddings.embed_query(text)
+        return self.batcher.embed(text)
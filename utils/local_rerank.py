@@ -0,0 +1,171 @@
+import math
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Protocol, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+_WORD = re.compile(r"[a-z0-9][a-z0-9_\-.]+")
+
+
+class VectorCache:
+    """Thread safe LRU of vectors by id, so hot chunks are never fetched from the vector service twice."""
+
+    def __init__(self, capacity: int = 50_000):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._vectors: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._vectors)
+
+    def get_many(self, ids: Sequence[str]) -> Tuple[Dict[str, np.ndarray], List[str]]:
+        found, missing = {}, []
+        with self._lock:
+            for id_ in ids:
+                if id_ in self._vectors:
+                    self._vectors.move_to_end(id_)
+                    found[id_] = self._vectors[id_]
+                else:
+                    missing.append(id_)
+            self.hits += len(found)
+            self.misses += len(missing)
+        return found, missing
+
+    def put_many(self, vectors: Dict[str, np.ndarray]):
+        with self._lock:
+            for id_, vector in vectors.items():
+                self._vectors[id_] = np.asarray(vector, dtype=np.float32)
+                self._vectors.move_to_end(id_)
+            while len(self._vectors) > self.capacity:
+                self._vectors.popitem(last=False)
+
+
+def fetch_vectors(vector_store, ids: List[str]) -> Dict[str, np.ndarray]:
+    """Vectors by id from the store: local stores read them from disk, Pinecone fetches them by id."""
+    if not ids:
+        return {}
+    if hasattr(vector_store, "get_vectors"):
+        return vector_store.get_vectors(ids)
+    index = getattr(vector_store, "index", None)
+    if index is not None and hasattr(index, "fetch"):
+        vectors = {}
+        for i in range(0, len(ids), 100):
+            response = index.fetch(ids=ids[i:i + 100])
+            found = response.vectors if hasattr(response, "vectors") else response["vectors"]
+            for id_, vector in found.items():
+                vectors[id_] = np.asarray(vector.values if hasattr(vector, "values") else vector["values"],
+                                          dtype=np.float32)
+        return vectors
+    return {}
+
+
+def mmr_select(candidates: np.ndarray, relevance: np.ndarray, k: int, lambda_mult: float = 0.5) -> List[int]:
+    """
+    Maximal marginal relevance with one matrix-vector product per pick: the
+    highest similarity of every candidate to the picked set is kept up to date
+    instead of recomputed.
+    """
+    if not len(candidates):
+        return []
+    norms = np.linalg.norm(candidates, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    unit = candidates / norms
+    # like LangChain's MMR the most relevant candidate always comes first
+    selected = [int(np.argmax(relevance))]
+    redundancy = unit @ unit[selected[0]]
+    picked = np.zeros(len(unit), dtype=bool)
+    picked[selected[0]] = True
+    for _ in range(min(k, len(unit)) - 1):
+        score = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        score[picked] = -np.inf
+        best = int(np.argmax(score))
+        selected.append(best)
+        picked[best] = True
+        redundancy = np.maximum(redundancy, unit @ unit[best])
+    return selected
+
+
+class Reranker(Protocol):
+    def __call__(self, query: str, docs: List[Document], relevance: np.ndarray) -> np.ndarray: ...
+
+
+class LexicalRecencyReranker:
+    """
+    Blends vector relevance with the share of query words found in the chunk and
+    with how recent the chunk is compared to the newest candidate.
+    """
+
+    def __init__(self, lexical_weight: float = 0.3, recency_weight: float = 0.1, half_life_seconds: float = 3600.0):
+        self.lexical_weight = lexical_weight
+        self.recency_weight = recency_weight
+        self.half_life_seconds = half_life_seconds
+
+    def __call__(self, query: str, docs: List[Document], relevance: np.ndarray) -> np.ndarray:
+        words = set(_WORD.findall(query.lower()))
+        lexical = np.array([len(words & set(_WORD.findall(d.page_content.lower()))) / len(words) if words else 0.0
+                            for d in docs], dtype=np.float32)
+        stamps = np.array([d.metadata.get("timestamp", math.nan) for d in docs], dtype=np.float64)
+        recency = np.zeros(len(docs), dtype=np.float32)
+        if not np.isnan(stamps).all():
+            age = np.nanmax(stamps) - stamps
+            recency = np.where(np.isnan(age), 0.0, 0.5 ** (age / self.half_life_seconds)).astype(np.float32)
+        return (1 - self.lexical_weight - self.recency_weight) * relevance + \
+            self.lexical_weight * lexical + self.recency_weight * recency
+
+
+class LocalMMRRetriever:
+    """
+    Fetches fetch_k candidates without their embeddings, takes the vectors from
+    a local LRU cache (fetching only the misses by id) and runs reranking and
+    MMR in NumPy on this side.
+    """
+
+    def __init__(self, vector_store, embeddings: Embeddings, cache: VectorCache, k: int = 4, fetch_k: int = 20,
+                 lambda_mult: float = 0.5, reranker: Optional[Reranker] = None,
+                 resolve: Optional[Callable[[List[Document]], List[Document]]] = None):
+        self.vector_store = vector_store
+        self.embeddings = embeddings
+        self.cache = cache
+        self.k = k
+        self.fetch_k = max(k, fetch_k)
+        self.lambda_mult = lambda_mult
+        self.reranker = reranker
+        self.resolve = resolve
+
+    def _candidates(self, query: str, vector: List[float]) -> List[Tuple[Document, float]]:
+        if hasattr(self.vector_store, "similarity_search_by_vector_with_score"):
+            return self.vector_store.similarity_search_by_vector_with_score(vector, k=self.fetch_k)
+        return self.vector_store.similarity_search_with_score(query, k=self.fetch_k)
+
+    def __call__(self, query: str) -> List[Document]:
+        vector = self.embeddings.embed_query(query)
+        hits = self._candidates(query, vector)
+        if not hits:
+            return []
+        docs = [doc for doc, _ in hits]
+        relevance = np.array([score for _, score in hits], dtype=np.float32)
+        if self.resolve is not None:
+            docs = self.resolve(docs)
+        if self.reranker is not None:
+            relevance = np.asarray(self.reranker(query, docs, relevance), dtype=np.float32)
+
+        ids = [doc.id for doc in docs]
+        found, missing = self.cache.get_many([id_ for id_ in ids if id_])
+        if missing:
+            fetched = fetch_vectors(self.vector_store, missing)
+            self.cache.put_many(fetched)
+            found.update(fetched)
+        if any(id_ not in found for id_ in ids):
+            # without a vector a candidate can only be ranked by relevance
+            order = np.argsort(-relevance, kind="stable")[:self.k]
+            return [docs[i] for i in order]
+
+        candidates = np.stack([found[id_] for id_ in ids])
+        selected = mmr_select(candidates, relevance, self.k, self.lambda_mult)
+        return [docs[i] for i in selected]
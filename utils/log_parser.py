@@ -0,0 +1,141 @@
+import math
+import mmap
+import os
+import re
+import zlib
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional
+
+_TIMESTAMP_PATTERNS = [
+    (re.compile(r"(\d{4}-\d{2}-\d{2})[T ](\d{2}:\d{2}:\d{2})(?:[.,](\d{1,9}))?"), "iso"),
+    (re.compile(r"(\d{2}/[A-Z][a-z]{2}/\d{4}):(\d{2}:\d{2}:\d{2})"), "clf"),
+]
+_LEVEL = re.compile(r"\b(TRACE|DEBUG|INFO|NOTICE|WARN|WARNING|ERROR|ERR|SEVERE|FATAL|CRITICAL)\b")
+_SERVICE = re.compile(r"\[([A-Za-z][\w.\-]*)\]")
+_CONTINUATION = re.compile(r"^(\s+|at |Caused by|Traceback|\.\.\. \d+ more)")
+_STACK_TRACE = re.compile(r"(Traceback \(most recent call last\)|^\s+at [\w.$<>]+\(|^Caused by: )", re.MULTILINE)
+
+_LEVEL_ALIASES = {"WARNING": "WARN", "ERR": "ERROR", "SEVERE": "ERROR", "CRITICAL": "FATAL"}
+
+# masked in this order, so that e.g. a uuid is not split into numbers first
+_PARAMETER_PATTERNS = [
+    re.compile(r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b"),
+    re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?\b"),
+    re.compile(r"\b0x[0-9a-fA-F]+\b"),
+    re.compile(r"\b(?=[0-9a-fA-F]*\d)[0-9a-fA-F]{8,}\b"),
+    re.compile(r"(?<![\w.])[-+]?\d+(?:\.\d+)?(?:ms|s|kb|mb|gb|%)?(?![\w.])", re.IGNORECASE),
+    re.compile(r"'[^']*'|\"[^\"]*\""),
+]
+_PARAMETER = re.compile("|".join(f"(?:{p.pattern})" for p in _PARAMETER_PATTERNS))
+
+WILDCARD = "<*>"
+SEVERE_LEVELS = {"WARN", "ERROR", "FATAL"}
+
+
+@dataclass
+class LogRecord:
+    offset: int
+    length: int
+    text: str
+    timestamp: float = math.nan
+    level: Optional[str] = None
+    service: Optional[str] = None
+    template: str = ""
+    template_id: int = 0
+    params: List[str] = field(default_factory=list)
+    lines: int = 1
+
+    @property
+    def has_stack_trace(self) -> bool:
+        return self.lines > 1 and bool(_STACK_TRACE.search(self.text))
+
+
+def parse_timestamp(line: str) -> float:
+    for pattern, kind in _TIMESTAMP_PATTERNS:
+        match = pattern.search(line[:64])
+        if not match:
+            continue
+        try:
+            if kind == "iso":
+                value = datetime.strptime(f"{match.group(1)} {match.group(2)}", "%Y-%m-%d %H:%M:%S")
+                fraction = float(f"0.{match.group(3)}") if match.group(3) else 0.0
+            else:
+                value = datetime.strptime(f"{match.group(1)} {match.group(2)}", "%d/%b/%Y %H:%M:%S")
+                fraction = 0.0
+        except ValueError:
+            continue
+        return value.replace(tzinfo=timezone.utc).timestamp() + fraction
+    return math.nan
+
+
+def template_of(message: str):
+    """Mask variable parts of a message, returns (template, template_id, params)."""
+    params = [m.group(0) for m in _PARAMETER.finditer(message)]
+    template = _PARAMETER.sub(WILDCARD, message).strip()
+    return template, zlib.crc32(template.encode("utf-8")), params
+
+
+def parse_record(text: str, offset: int = 0, length: Optional[int] = None, lines: int = 1) -> LogRecord:
+    first_line = text.split("\n", 1)[0]
+    record = LogRecord(offset=offset, length=len(text.encode("utf-8")) if length is None else length,
+                       text=text, timestamp=parse_timestamp(first_line), lines=lines)
+
+    message = first_line
+    for pattern, _ in _TIMESTAMP_PATTERNS:
+        message = pattern.sub("", message, count=1)
+    level = _LEVEL.search(message)
+    if level:
+        record.level = _LEVEL_ALIASES.get(level.group(1), level.group(1))
+        message = message[:level.start()] + message[level.end():]
+    service = _SERVICE.search(message)
+    if service:
+        record.service = service.group(1)
+    record.template, record.template_id, record.params = template_of(message)
+    return record
+
+
+def iter_records(path: str, start: int = 0, end: Optional[int] = None) -> Iterator[LogRecord]:
+    """
+    Parse a log file into records with byte offsets. Continuation lines (stack
+    traces, indented payloads) are folded into the record they belong to.
+    """
+    with open(path, "rb") as f:
+        if not os.fstat(f.fileno()).st_size:
+            return
+        # memory-mapped, so shard workers parsing ranges of one file share the page cache
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            data.seek(start)
+            offset = start
+            pending: List[bytes] = []
+            pending_offset = start
+
+            for raw in iter(data.readline, b""):
+                if end is not None and offset >= end:
+                    break
+                line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+                if pending and is_continuation(line):
+                    pending.append(raw)
+                else:
+                    if pending:
+                        yield _build(pending, pending_offset)
+                    pending = [raw]
+                    pending_offset = offset
+                offset += len(raw)
+
+            if pending:
+                yield _build(pending, pending_offset)
+
+
+def is_continuation(line: str) -> bool:
+    return bool(_CONTINUATION.match(line)) and math.isnan(parse_timestamp(line))
+
+
+def _build(lines: List[bytes], offset: int) -> LogRecord:
+    raw = b"".join(lines)
+    text = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+    return parse_record(text, offset=offset, length=len(raw), lines=len(lines))
+
+
+def parse_file(path: str) -> List[LogRecord]:
+    return list(iter_records(path))
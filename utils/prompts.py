@@ -1,4 +1,4 @@
-from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 
 prompt_template = ChatPromptTemplate.from_messages(
             [
@@ -11,3 +11,40 @@ prompt_template = ChatPromptTemplate.from_messages(
                 ("human", "{input}")
             ]
         )
+
+summary_prompt_template = ChatPromptTemplate.from_messages(
+            [
+                ("system", """You are an log analyzer that summarizes log events.
+                Each line is an event type with its number of occurrences, or a summary of a log segment.
+                Keep errors, warnings, failures and changes in behaviour with their times and counts.
+                Limit your response to a short paragraph.
+
+            """),
+                ("human", "{input}")
+            ]
+        )
+
+# system prompt and context come first and history last, so consecutive turns share a cacheable prefix
+conversation_prompt_template = ChatPromptTemplate.from_messages(
+            [
+                ("system", """You are an log analyzer that analyzes, summarizes, explains log events and suggests resolution.
+                Add emoji based on reoccurrence of the event.
+                Limit your response to concise sentences. Here is the context: 
+                {context}
+
+            """),
+                MessagesPlaceholder("history"),
+                ("human", "{input}")
+            ]
+        )
+
+rewrite_prompt_template = ChatPromptTemplate.from_messages(
+            [
+                ("system", """Rewrite the follow-up question about a log file into a standalone search query.
+                Use the previous question to resolve references like "that" or "it".
+                Reply with the query only.
+
+            """),
+                ("human", "Previous question: {previous}\nFollow-up: {input}")
+            ]
+        )
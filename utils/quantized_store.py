@@ -0,0 +1,281 @@
+import json
+import os
+import threading
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from langchain_core.vectorstores.utils import maximal_marginal_relevance
+
+QUANTIZATIONS = ("none", "int8", "binary")
+
+# number of set bits for every byte value, used for hamming distance on packed codes
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+_BLOCK_ROWS = 65536
+
+# candidates fetched per requested result before float32 rescoring, binary codes are coarser
+DEFAULT_RESCORE_FACTOR = {"none": 1, "int8": 4, "binary": 10}
+
+
+def truncate(vectors: np.ndarray, dimension: Optional[int]) -> np.ndarray:
+    """Matryoshka style truncation: keep the leading dimensions and re-normalize."""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    if dimension:
+        vectors = vectors[:, :dimension]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(vectors / norms, dtype=np.float32)
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-vector scalar quantization, returns (codes, scales)."""
+    scales = np.abs(vectors).max(axis=1)
+    scales[scales == 0] = 1.0
+    codes = np.rint(vectors / scales[:, None] * 127).astype(np.int8)
+    return codes, (scales / 127).astype(np.float32)
+
+
+def quantize_binary(vectors: np.ndarray) -> np.ndarray:
+    return np.packbits(vectors > 0, axis=1)
+
+
+class QuantizedIndex:
+    """
+    Append-only on-disk vector index that keeps only compact codes in memory.
+
+    Full precision vectors are appended to vectors.f32 and read back through a
+    memory map for rescoring, so resident memory is 1 byte (int8) or 1 bit
+    (binary) per dimension instead of 4.
+    """
+
+    def __init__(self, path: str, dimension: int = 1024, quantization: str = "int8",
+                 truncate_dim: Optional[int] = None, rescore_factor: Optional[int] = None):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"quantization must be one of {QUANTIZATIONS}")
+        if truncate_dim and truncate_dim > dimension:
+            raise ValueError("truncate_dim can not be larger than dimension")
+
+        self.path = path
+        self.quantization = quantization
+        self.dimension = truncate_dim or dimension
+        self.rescore_factor = max(1, rescore_factor or DEFAULT_RESCORE_FACTOR[quantization])
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta["dimension"] != self.dimension or meta["quantization"] != quantization:
+                raise ValueError(f"index at {path} was built with {meta}")
+        else:
+            with open(meta_path, "w") as f:
+                json.dump({"dimension": self.dimension, "quantization": quantization}, f)
+
+        self._vectors_path = os.path.join(path, "vectors.f32")
+        self._codes_path = os.path.join(path, "codes.bin")
+        self._scales_path = os.path.join(path, "scales.f32")
+        self._ids_path = os.path.join(path, "ids.txt")
+
+        self.ids: List[str] = []
+        if os.path.exists(self._ids_path):
+            with open(self._ids_path) as f:
+                self.ids = [line.rstrip("\n") for line in f]
+        self._codes = self._load_codes()
+        self._scales = np.fromfile(self._scales_path, dtype=np.float32) \
+            if os.path.exists(self._scales_path) else np.empty(0, dtype=np.float32)
+        self._full = None
+        self._rows = {}
+
+    @property
+    def code_width(self) -> int:
+        if self.quantization == "binary":
+            return (self.dimension + 7) // 8
+        return self.dimension
+
+    def _load_codes(self) -> np.ndarray:
+        dtype = {"none": np.float32, "int8": np.int8, "binary": np.uint8}[self.quantization]
+        if self.quantization == "none" or not os.path.exists(self._codes_path):
+            return np.empty((0, self.code_width), dtype=dtype)
+        return np.fromfile(self._codes_path, dtype=dtype).reshape(-1, self.code_width)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def memory_bytes(self) -> int:
+        """Resident bytes used by the in-memory search structures."""
+        if self.quantization == "none":
+            return len(self) * self.dimension * 4
+        return self._codes.nbytes + self._scales.nbytes
+
+    def add(self, ids: List[str], vectors: Any, on_add: Optional[Callable[[], None]] = None):
+        """
+        Append vectors, on_add runs under the same lock right before the rows are
+        written so a caller can store per-row data that stays aligned with them.
+        """
+        vectors = truncate(vectors, self.dimension)
+        if vectors.shape[1] != self.dimension:
+            raise ValueError(f"expected vectors of dimension {self.dimension}, got {vectors.shape[1]}")
+        if len(ids) != len(vectors):
+            raise ValueError("ids and vectors must have the same length")
+
+        with self._lock:
+            if on_add is not None:
+                on_add()
+            with open(self._vectors_path, "ab") as f:
+                vectors.tofile(f)
+            if self.quantization == "int8":
+                codes, scales = quantize_int8(vectors)
+                with open(self._scales_path, "ab") as f:
+                    scales.tofile(f)
+                self._scales = np.concatenate([self._scales, scales])
+            elif self.quantization == "binary":
+                codes = quantize_binary(vectors)
+            if self.quantization != "none":
+                with open(self._codes_path, "ab") as f:
+                    codes.tofile(f)
+                self._codes = np.concatenate([self._codes, codes])
+            with open(self._ids_path, "a") as f:
+                f.writelines(f"{i}\n" for i in ids)
+            self.ids.extend(ids)
+            self._full = None
+
+    def full_vectors(self) -> np.ndarray:
+        if self._full is None or len(self._full) != len(self):
+            self._full = np.memmap(self._vectors_path, dtype=np.float32, mode="r",
+                                   shape=(len(self), self.dimension)) if len(self) else \
+                np.empty((0, self.dimension), dtype=np.float32)
+        return self._full
+
+    def rows_of(self, ids: Iterable[str]) -> List[Optional[int]]:
+        with self._lock:
+            if len(self._rows) != len(self.ids):
+                self._rows = {id_: row for row, id_ in enumerate(self.ids)}
+            return [self._rows.get(id_) for id_ in ids]
+
+    def _approximate_scores(self, query: np.ndarray) -> np.ndarray:
+        if self.quantization == "none":
+            full = self.full_vectors()
+            return np.concatenate([full[i:i + _BLOCK_ROWS] @ query
+                                   for i in range(0, len(full), _BLOCK_ROWS)])
+
+        scores = np.empty(len(self), dtype=np.float32)
+        if self.quantization == "int8":
+            q_codes, _ = quantize_int8(query[None, :])
+            q = q_codes[0].astype(np.float32)
+            for i in range(0, len(self), _BLOCK_ROWS):
+                # int8 products are exact in float32 and go through BLAS instead of a slow integer matmul
+                block = self._codes[i:i + _BLOCK_ROWS].astype(np.float32)
+                scores[i:i + _BLOCK_ROWS] = (block @ q) * self._scales[i:i + _BLOCK_ROWS]
+        else:
+            q = quantize_binary(query[None, :])[0]
+            for i in range(0, len(self), _BLOCK_ROWS):
+                hamming = _POPCOUNT[np.bitwise_xor(self._codes[i:i + _BLOCK_ROWS], q)].sum(axis=1, dtype=np.int32)
+                scores[i:i + _BLOCK_ROWS] = -hamming
+        return scores
+
+    def search(self, query: Any, k: int = 4, fetch_k: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Return (row, cosine score) pairs, candidates come from the codes and are rescored in float32."""
+        if not len(self):
+            return []
+        query = truncate(query, self.dimension)[0]
+        approx = self._approximate_scores(query)
+        n_candidates = min(len(self), max(k * self.rescore_factor, fetch_k or 0))
+        candidates = np.argpartition(-approx, n_candidates - 1)[:n_candidates]
+        candidates.sort()
+        rescored = self.full_vectors()[candidates] @ query
+        order = np.argsort(-rescored)[:max(k, fetch_k or 0)]
+        return [(int(candidates[i]), float(rescored[i])) for i in order]
+
+
+class QuantizedVectorStore(VectorStore):
+    """LangChain vector store backed by a local QuantizedIndex, usable in place of PineconeVectorStore."""
+
+    def __init__(self, path: str, embedding: Embeddings, dimension: int = 1024, quantization: str = "int8",
+                 truncate_dim: Optional[int] = None, rescore_factor: Optional[int] = None):
+        self.index = QuantizedIndex(path, dimension=dimension, quantization=quantization,
+                                    truncate_dim=truncate_dim, rescore_factor=rescore_factor)
+        self.embedding = embedding
+        self._docs_path = os.path.join(path, "docs.jsonl")
+        self._docs: List[dict] = []
+        if os.path.exists(self._docs_path):
+            with open(self._docs_path) as f:
+                self._docs = [json.loads(line) for line in f]
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        return self.add_embeddings(self.embedding.embed_documents(texts), metadatas, ids, texts)
+
+    def add_embeddings(self, vectors: List[List[float]], metadatas: Optional[List[dict]] = None,
+                       ids: Optional[List[str]] = None, texts: Optional[List[str]] = None) -> List[str]:
+        """Add precomputed vectors, texts may be left out when they are resolved from a chunk store."""
+        if not len(vectors):
+            return []
+        metadatas = metadatas or [{} for _ in vectors]
+        ids = ids or [str(uuid.uuid4()) for _ in vectors]
+        texts = texts or ["" for _ in vectors]
+        if not len(metadatas) == len(ids) == len(texts) == len(vectors):
+            raise ValueError("vectors, metadatas, ids and texts must have the same length")
+        docs = [{"page_content": t, "metadata": m} for t, m in zip(texts, metadatas)]
+
+        def write_docs():
+            # docs go in under the index lock after the vectors passed validation, rows stay aligned
+            with open(self._docs_path, "a") as f:
+                f.writelines(json.dumps(d) + "\n" for d in docs)
+            self._docs.extend(docs)
+
+        self.index.add(ids, vectors, on_add=write_docs)
+        return ids
+
+    def _document(self, row: int) -> Document:
+        doc = self._docs[row]
+        return Document(id=self.index.ids[row], page_content=doc["page_content"], metadata=doc["metadata"])
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        vector = self.embedding.embed_query(query)
+        return [(self._document(row), score) for row, score in self.index.search(vector, k)]
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4,
+                                               **kwargs: Any) -> List[Tuple[Document, float]]:
+        return [(self._document(row), score) for row, score in self.index.search(embedding, k)]
+
+    def get_vectors(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        """Full precision vectors by id, read from the memory-mapped vector file."""
+        found = [(id_, row) for id_, row in zip(ids, self.index.rows_of(ids)) if row is not None]
+        full = self.index.full_vectors()
+        return {id_: np.array(full[row]) for id_, row in found}
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def _select_relevance_score_fn(self):
+        return self._cosine_relevance_score_fn
+
+    def max_marginal_relevance_search(self, query: str, k: int = 4, fetch_k: int = 20,
+                                      lambda_mult: float = 0.5, **kwargs: Any) -> List[Document]:
+        vector = truncate(self.embedding.embed_query(query), self.index.dimension)[0]
+        hits = self.index.search(vector, k, fetch_k=fetch_k)
+        if not hits:
+            return []
+        rows = sorted(row for row, _ in hits)
+        candidates = self.index.full_vectors()[rows]
+        selected = maximal_marginal_relevance(vector, candidates, lambda_mult=lambda_mult, k=k)
+        return [self._document(rows[i]) for i in selected]
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   path: str = "local_index", **kwargs: Any) -> "QuantizedVectorStore":
+        store = cls(path, embedding, **kwargs)
+        store.add_texts(texts, metadatas)
+        return store
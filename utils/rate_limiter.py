@@ -0,0 +1,231 @@
+import random
+import re
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.runnables import Runnable, RunnableConfig
+
+_THROTTLE_MESSAGE = re.compile(r"\b429\b|rate.?limit|throttl|too many requests|quota", re.IGNORECASE)
+
+
+def is_throttle_error(error: Exception) -> bool:
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status == 429:
+        return True
+    name = type(error).__name__.lower()
+    return "ratelimit" in name or "throttl" in name or bool(_THROTTLE_MESSAGE.search(str(error)))
+
+
+def estimate_tokens(text: Any) -> int:
+    return max(1, len(str(text)) // 4)
+
+
+class TokenBucket:
+    """Thread safe token bucket refilled continuously at rate_per_minute."""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self._clock = clock
+        self._updated = clock()
+        self._cond = threading.Condition()
+
+    def _refill(self):
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount: float = 1.0):
+        # requests larger than the bucket would never fit, let them through once the bucket is full
+        amount = min(amount, self.capacity)
+        with self._cond:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                self._cond.wait((amount - self.tokens) / self.rate)
+
+    def drain(self):
+        """Empty the bucket, used when the provider says we are over the limit anyway."""
+        with self._cond:
+            self._refill()
+            self.tokens = 0.0
+
+
+class AdaptiveLimiter:
+    """
+    AIMD control of in-flight calls and batch size: additive increase while calls
+    succeed under the latency target, multiplicative decrease on throttling.
+    Without an explicit target, calls slower than latency_factor times the
+    median of recent successful calls count as over target.
+    """
+
+    def __init__(self, concurrency: int = 4, max_concurrency: int = 32, batch_size: int = 64,
+                 min_batch_size: int = 1, max_batch_size: int = 512, target_latency: Optional[float] = None,
+                 latency_factor: float = 3.0, min_samples: int = 20, window: int = 200):
+        self.limit = float(concurrency)
+        self.max_concurrency = max_concurrency
+        self.batch_size = batch_size
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.target_latency = target_latency
+        self.latency_factor = latency_factor
+        self.min_samples = min_samples
+        self.in_flight = 0
+        self.throttled = 0
+        self._latencies: "deque[float]" = deque(maxlen=window)
+        self._cond = threading.Condition()
+
+    @property
+    def current_target(self) -> Optional[float]:
+        """The explicit target, or one derived from the observed p50 once there are enough samples."""
+        if self.target_latency is not None:
+            return self.target_latency
+        if len(self._latencies) < self.min_samples:
+            return None
+        return self.latency_factor * statistics.median(self._latencies)
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= max(1, int(self.limit)):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, latency: float, throttled: bool = False):
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self.throttled += 1
+                self.limit = max(1.0, self.limit / 2)
+                self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+            else:
+                target = self.current_target
+                self._latencies.append(latency)
+                if target and latency > target:
+                    self.limit = max(1.0, self.limit * 0.9)
+                else:
+                    self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+                    self.batch_size = min(self.max_batch_size, self.batch_size + max(1, self.batch_size // 8))
+            self._cond.notify_all()
+
+
+class RateBudget:
+    """Requests/minute and tokens/minute buckets plus an adaptive limiter, shared by everything using one provider."""
+
+    _shared: Dict[str, "RateBudget"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, requests_per_minute: float = 500, tokens_per_minute: float = 1_000_000,
+                 max_retries: int = 6, base_backoff: float = 1.0, max_backoff: float = 60.0,
+                 sleep: Callable[[float], None] = time.sleep, **limiter_kwargs):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.limiter = AdaptiveLimiter(**limiter_kwargs)
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._sleep = sleep
+
+    @classmethod
+    def shared(cls, key: str, **kwargs) -> "RateBudget":
+        with cls._shared_lock:
+            if key not in cls._shared:
+                cls._shared[key] = cls(**kwargs)
+            return cls._shared[key]
+
+    def backoff(self, attempt: int, error: Exception):
+        self.requests.drain()
+        retry_after = getattr(error, "retry_after", None)
+        delay = retry_after or min(self.max_backoff, self.base_backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+        print(f"throttled, retrying in {delay:.1f}s......")
+        self._sleep(delay)
+
+    def call(self, fn: Callable[[], Any], tokens: int = 1, max_retries: Optional[int] = None) -> Any:
+        max_retries = self.max_retries if max_retries is None else max_retries
+        attempt = 0
+        while True:
+            self.requests.acquire(1)
+            self.tokens.acquire(tokens)
+            self.limiter.acquire()
+            start = time.monotonic()
+            try:
+                result = fn()
+            except Exception as e:
+                throttled = is_throttle_error(e)
+                self.limiter.release(time.monotonic() - start, throttled=throttled)
+                if not throttled or attempt >= max_retries:
+                    raise
+                self.backoff(attempt, e)
+                attempt += 1
+                continue
+            self.limiter.release(time.monotonic() - start)
+            return result
+
+
+class RateLimitedEmbeddings(Embeddings):
+    """Embeddings wrapper that batches adaptively and retries throttled calls."""
+
+    def __init__(self, embeddings: Embeddings, budget: RateBudget, max_workers: int = 8):
+        self.embeddings = embeddings
+        self.budget = budget
+        self.max_workers = max_workers
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        results = {}
+        cursor = [0]
+        lock = threading.Lock()
+
+        def worker():
+            while True:
+                # batch size is read for every batch, so it follows the limiter while a large ingest runs
+                with lock:
+                    start = cursor[0]
+                    if start >= len(texts):
+                        return
+                    end = cursor[0] = start + self.budget.limiter.batch_size
+                results[start] = self._embed(texts[start:end])
+
+        # the limiter decides how many of these workers actually have a call in flight
+        workers = max(1, min(self.max_workers, -(-len(texts) // self.budget.limiter.batch_size)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for future in [pool.submit(worker) for _ in range(workers)]:
+                future.result()
+        return [vector for start in sorted(results) for vector in results[start]]
+
+    def _embed(self, batch: List[str]) -> List[List[float]]:
+        tokens = sum(estimate_tokens(t) for t in batch)
+        try:
+            return self.budget.call(lambda: self.embeddings.embed_documents(batch), tokens, max_retries=0)
+        except Exception as e:
+            if not is_throttle_error(e):
+                raise
+            self.budget.backoff(0, e)
+        # a throttled batch is re-split to the batch size the limiter has backed off to
+        size = self.budget.limiter.batch_size
+        if len(batch) > size:
+            return [vector for i in range(0, len(batch), size) for vector in self._embed(batch[i:i + size])]
+        return self.budget.call(lambda: self.embeddings.embed_documents(batch), tokens)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.budget.call(lambda: self.embeddings.embed_query(text), estimate_tokens(text))
+
+
+class RateLimitedLLM(Runnable):
+    """Runnable wrapper around a chat model or LLM that spends from a RateBudget."""
+
+    def __init__(self, llm: Runnable, budget: RateBudget, max_output_tokens: int = 512):
+        self.llm = llm
+        self.budget = budget
+        self.max_output_tokens = max_output_tokens
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        tokens = estimate_tokens(input) + self.max_output_tokens
+        return self.budget.call(lambda: self.llm.invoke(input, config, **kwargs), tokens)
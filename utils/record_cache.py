@@ -0,0 +1,229 @@
+import glob
+import hashlib
+import json
+import math
+import mmap
+import os
+import re
+import shutil
+import tempfile
+import zlib
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from utils.log_parser import LogRecord, parse_file
+
+# bump when the parser or the layout changes, older caches are then parsed again
+FORMAT_VERSION = 1
+DEFAULT_ROW_GROUP = 65_536
+_SAMPLE_BYTES = 1 << 16
+_SAMPLES = 16
+_SEPARATOR = "\x1f"
+_QUESTION_LEVELS = [(re.compile(r"\b(errors?|fail\w*|exceptions?|crash\w*)\b", re.IGNORECASE), {"ERROR", "FATAL"}),
+                    (re.compile(r"\bwarn\w*\b", re.IGNORECASE), {"WARN"})]
+
+
+def fingerprint(path: str) -> str:
+    """
+    Size plus a hash of the head, the tail and evenly spaced blocks of the file.
+    Cheap on multi-gigabyte logs and changes when a log is appended to or rotated.
+    """
+    size = os.path.getsize(path)
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(path, "rb") as f:
+        for i in range(_SAMPLES + 1):
+            f.seek(max(0, min(size - _SAMPLE_BYTES, size * i // _SAMPLES)))
+            digest.update(f.read(_SAMPLE_BYTES))
+    return f"v{FORMAT_VERSION}-{digest.hexdigest()}"
+
+
+def path_key(path: str) -> str:
+    """
+    File name for artifacts derived from a log: its basename for readability
+    plus a hash of the absolute path, so svc-a/app.log and svc-b/app.log differ.
+    """
+    digest = hashlib.blake2b(os.path.abspath(path).encode("utf-8"), digest_size=8).hexdigest()
+    return f"{os.path.basename(path)}-{digest}"
+
+
+def question_levels(prompt: str) -> Optional[set]:
+    """Levels a question asks about, None when it does not narrow them down."""
+    levels = set()
+    for pattern, names in _QUESTION_LEVELS:
+        if pattern.search(prompt):
+            levels |= names
+    return levels or None
+
+
+@dataclass
+class RowGroup:
+    name: str
+    rows: int
+    min_offset: int
+    max_offset: int
+    min_timestamp: Optional[float]
+    max_timestamp: Optional[float]
+    levels: Dict[str, int]
+
+    def may_match(self, start: Optional[float], end: Optional[float], levels: Optional[set]) -> bool:
+        if start is not None or end is not None:
+            if self.min_timestamp is None:
+                return False
+            if start is not None and self.max_timestamp < start:
+                return False
+            if end is not None and self.min_timestamp > end:
+                return False
+        return levels is None or bool(levels & set(self.levels))
+
+
+class RecordCache:
+    """
+    Parsed records of each log on disk, one directory per file fingerprint.
+    Columns are stored compressed per row group, with timestamp, offset and
+    level statistics kept in the metadata so scans skip groups without
+    opening them. Record texts are read back from the log by offset.
+    """
+
+    def __init__(self, path: str, row_group_size: int = DEFAULT_ROW_GROUP):
+        self.path = path
+        self.row_group_size = row_group_size
+        os.makedirs(path, exist_ok=True)
+
+    def _dir(self, key: str) -> str:
+        return os.path.join(self.path, key)
+
+    def metadata(self, file_path: str, key: Optional[str] = None) -> Optional[dict]:
+        """Metadata of the cached records, key is the file fingerprint when the caller already has it."""
+        meta_path = os.path.join(self._dir(key or fingerprint(file_path)), "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path) as f:
+            return json.load(f)
+
+    def has(self, file_path: str, key: Optional[str] = None) -> bool:
+        return self.metadata(file_path, key) is not None
+
+    def sources(self) -> List[str]:
+        """Logs with cached records that still match their current contents."""
+        sources = []
+        for meta_path in sorted(glob.glob(os.path.join(self.path, "*", "meta.json"))):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if os.path.exists(meta["source"]) and fingerprint(meta["source"]) == meta["fingerprint"]:
+                sources.append(meta["source"])
+        return sources
+
+    def write(self, file_path: str, records: List[LogRecord], key: Optional[str] = None) -> str:
+        key = key or fingerprint(file_path)
+        tmp = tempfile.mkdtemp(dir=self.path, prefix=".tmp-")
+        levels, services, templates = {None: 0}, {None: 0}, {}
+        groups = []
+        for i, start in enumerate(range(0, len(records), self.row_group_size)):
+            group = records[start:start + self.row_group_size]
+            name = f"rg-{i:05d}"
+            columns = {
+                "offset": np.array([r.offset for r in group], dtype=np.int64),
+                "length": np.array([r.length for r in group], dtype=np.int32),
+                "lines": np.array([r.lines for r in group], dtype=np.int32),
+                "timestamp": np.array([r.timestamp for r in group], dtype=np.float64),
+                "level": np.array([levels.setdefault(r.level, len(levels)) for r in group], dtype=np.int16),
+                "service": np.array([services.setdefault(r.service, len(services)) for r in group], dtype=np.int32),
+                "template": np.array([templates.setdefault(r.template, len(templates)) for r in group],
+                                     dtype=np.int32),
+                "param_count": np.array([len(r.params) for r in group], dtype=np.int32),
+                "params": np.frombuffer(_SEPARATOR.join(p for r in group for p in r.params).encode("utf-8"),
+                                        dtype=np.uint8),
+            }
+            np.savez_compressed(os.path.join(tmp, f"{name}.npz"), **columns)
+            stamps = columns["timestamp"][~np.isnan(columns["timestamp"])]
+            groups.append({"name": name, "rows": len(group),
+                           "min_offset": int(columns["offset"][0]), "max_offset": int(columns["offset"][-1]),
+                           "min_timestamp": float(stamps.min()) if len(stamps) else None,
+                           "max_timestamp": float(stamps.max()) if len(stamps) else None,
+                           "levels": dict(Counter(r.level for r in group if r.level))})
+        meta = {"version": FORMAT_VERSION, "fingerprint": key, "source": os.path.abspath(file_path),
+                "records": len(records), "levels": list(levels), "services": list(services),
+                "templates": list(templates), "row_groups": groups}
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        shutil.rmtree(self._dir(key), ignore_errors=True)
+        os.replace(tmp, self._dir(key))
+        return key
+
+    def row_groups(self, file_path: str) -> List[RowGroup]:
+        meta = self.metadata(file_path)
+        return [RowGroup(**g) for g in meta["row_groups"]] if meta else []
+
+    def scan(self, file_path: str, start: Optional[float] = None, end: Optional[float] = None,
+             levels: Optional[Iterable[str]] = None, meta: Optional[dict] = None) -> Iterator[LogRecord]:
+        """Records in file order matching a time range and levels, reading only row groups that may match."""
+        meta = meta or self.metadata(file_path)
+        if meta is None:
+            raise KeyError(f"no cached records for {file_path}")
+        levels = set(levels) if levels is not None else None
+        templates = [(t, zlib.crc32(t.encode("utf-8"))) for t in meta["templates"]]
+        with open(file_path, "rb") as f:
+            if not os.fstat(f.fileno()).st_size:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                for group in meta["row_groups"]:
+                    if not RowGroup(**group).may_match(start, end, levels):
+                        continue
+                    with np.load(os.path.join(self._dir(meta["fingerprint"]), f"{group['name']}.npz")) as columns:
+                        yield from self._rows(columns, meta, templates, data, start, end, levels)
+
+    @staticmethod
+    def _rows(columns, meta, templates, data, start, end, levels) -> Iterator[LogRecord]:
+        timestamp = columns["timestamp"]
+        level = columns["level"]
+        mask = np.ones(len(timestamp), dtype=bool)
+        if start is not None:
+            mask &= timestamp >= start
+        if end is not None:
+            mask &= timestamp <= end
+        if levels is not None:
+            codes = [i for i, name in enumerate(meta["levels"]) if name in levels]
+            mask &= np.isin(level, codes)
+        counts = columns["param_count"]
+        ends = np.cumsum(counts)
+        flat = columns["params"].tobytes().decode("utf-8").split(_SEPARATOR) if counts.sum() else []
+        offset, length, lines, service, template = (columns[c] for c in
+                                                     ("offset", "length", "lines", "service", "template"))
+        for row in np.flatnonzero(mask):
+            position, size = int(offset[row]), int(length[row])
+            template_text, template_id = templates[template[row]]
+            yield LogRecord(offset=position, length=size,
+                            text=data[position:position + size].decode("utf-8", errors="replace").rstrip("\r\n"),
+                            timestamp=float(timestamp[row]), level=meta["levels"][level[row]],
+                            service=meta["services"][service[row]], template=template_text, template_id=template_id,
+                            params=flat[ends[row] - counts[row]:ends[row]], lines=int(lines[row]))
+
+    def records(self, file_path: str, key: Optional[str] = None) -> List[LogRecord]:
+        """Cached records of a file, parsed and cached first when the file is new or changed."""
+        # fingerprinting samples the whole file, do it once for the lookup and the write
+        key = key or fingerprint(file_path)
+        meta = self.metadata(file_path, key)
+        if meta is not None:
+            return list(self.scan(file_path, meta=meta))
+        records = parse_file(file_path)
+        self.write(file_path, records, key)
+        return records
+
+    def stats(self, file_path: str, key: Optional[str] = None) -> Optional[dict]:
+        """Record count, time span and level counts from the metadata alone."""
+        meta = self.metadata(file_path, key)
+        if meta is None:
+            return None
+        groups = [RowGroup(**g) for g in meta["row_groups"]]
+        firsts = [g.min_timestamp for g in groups if g.min_timestamp is not None]
+        lasts = [g.max_timestamp for g in groups if g.max_timestamp is not None]
+        levels: Dict[str, int] = {}
+        for group in groups:
+            for level, n in group.levels.items():
+                levels[level] = levels.get(level, 0) + n
+        return {"records": meta["records"], "row_groups": len(groups),
+                "first_timestamp": min(firsts) if firsts else math.nan,
+                "last_timestamp": max(lasts) if lasts else math.nan, "levels": levels}
@@ -0,0 +1,52 @@
+import json
+import os
+from dataclasses import dataclass, asdict, fields
+from typing import Optional, Union
+
+SEARCH_TYPES = ("similarity", "mmr")
+
+
+@dataclass
+class RetrievalConfig:
+    """Chunking and retriever settings, the defaults are the values ingest and rag always used."""
+    chunk_size: int = 100
+    chunk_overlap: int = 0
+    search_type: str = "mmr"
+    k: int = 4
+    fetch_k: int = 20
+    lambda_mult: float = 0.5
+
+    def __post_init__(self):
+        if self.search_type not in SEARCH_TYPES:
+            raise ValueError(f"search_type must be one of {SEARCH_TYPES}")
+        if not 0 <= self.chunk_overlap < self.chunk_size:
+            raise ValueError("chunk_overlap must be at least 0 and smaller than chunk_size")
+
+    def search_kwargs(self) -> dict:
+        if self.search_type == "mmr":
+            return {"k": self.k, "fetch_k": max(self.fetch_k, self.k), "lambda_mult": self.lambda_mult}
+        return {"k": self.k}
+
+    def describe(self) -> str:
+        retrieval = f"mmr k={self.k} fetch_k={self.fetch_k} lambda={self.lambda_mult}" \
+            if self.search_type == "mmr" else f"similarity k={self.k}"
+        return f"chunk {self.chunk_size}/{self.chunk_overlap} {retrieval}"
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(asdict(self), f, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> "RetrievalConfig":
+        with open(path) as f:
+            data = json.load(f)
+        # tuner reports may carry metrics next to the settings
+        known = {f.name for f in fields(cls)}
+        return cls(**{key: value for key, value in data.items() if key in known})
+
+    @classmethod
+    def resolve(cls, config: Optional[Union[str, "RetrievalConfig"]]) -> "RetrievalConfig":
+        if config is None:
+            return cls()
+        return config if isinstance(config, cls) else cls.load(config)
@@ -0,0 +1,154 @@
+import json
+import math
+import os
+import random
+from collections import Counter
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.anomaly import window_positions
+from utils.log_parser import SEVERE_LEVELS, LogRecord
+
+# price of embedding 1k tokens, used to turn a dollar budget into a vector budget
+DEFAULT_COST_PER_1K_TOKENS = 0.00013
+
+
+class Reservoir:
+    """Uniform sample of at most size items from a stream (Algorithm R)."""
+
+    def __init__(self, size: int, rng: random.Random):
+        self.size = size
+        self.seen = 0
+        self.items = []
+        self._rng = rng
+
+    def add(self, item):
+        self.seen += 1
+        if len(self.items) < self.size:
+            self.items.append(item)
+        else:
+            j = self._rng.randrange(self.seen)
+            if j < self.size:
+                self.items[j] = item
+
+
+@dataclass
+class SamplingReport:
+    total_chunks: int
+    kept_chunks: int
+    kept_in_full: int
+    sampled_strata: int
+    budget: int
+    template_counts: Dict[str, int] = field(default_factory=dict)
+    rates: Dict[str, float] = field(default_factory=dict)
+    source: Optional[str] = None
+
+    @property
+    def sampling_rate(self) -> float:
+        return self.kept_chunks / self.total_chunks if self.total_chunks else 1.0
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(asdict(self), f)
+
+    @classmethod
+    def load(cls, path: str) -> "SamplingReport":
+        with open(path) as f:
+            return cls(**json.load(f))
+
+    def describe(self) -> str:
+        return (f"Ingest was sampled: {self.kept_chunks} of {self.total_chunks} chunks embedded, "
+                f"{self.kept_in_full} warning/error/rare chunks kept in full. "
+                f"Sampled chunks are marked with the number of similar records they represent.")
+
+
+def budget_from_cost(chunks: Sequence[Sequence[LogRecord]], max_cost: float,
+                     cost_per_1k_tokens: float = DEFAULT_COST_PER_1K_TOKENS) -> int:
+    tokens = sum(r.length for chunk in chunks for r in chunk) / 4
+    if not chunks or tokens == 0:
+        return 0
+    return int(max_cost / cost_per_1k_tokens * 1000 / (tokens / len(chunks)))
+
+
+def _keep_in_full(chunk: Sequence[LogRecord], template_counts: Counter, rare_threshold: int) -> int:
+    """Priority of chunks that are never sampled, 0 means the chunk may be sampled."""
+    if any(r.level in ("ERROR", "FATAL") for r in chunk):
+        return 4
+    if any(r.has_stack_trace for r in chunk):
+        return 3
+    if any(r.level in SEVERE_LEVELS for r in chunk):
+        return 2
+    if any(template_counts[r.template_id] <= rare_threshold for r in chunk):
+        return 1
+    return 0
+
+
+def stratified_sample(chunks: Sequence[Sequence[LogRecord]], max_vectors: int, window_seconds: float = 300.0,
+                      rare_threshold: int = 5, seed: int = 0) -> Tuple[List[int], List[float], SamplingReport]:
+    """
+    Choose at most max_vectors chunks: warnings, errors, stack traces and rare
+    templates are kept in full, the rest is reservoir sampled per
+    (time window, template) stratum. Returns kept chunk indexes, the weight of
+    each kept chunk (records it stands for) and a report with the rates.
+    """
+    template_counts = Counter(r.template_id for chunk in chunks for r in chunk)
+    report = SamplingReport(total_chunks=len(chunks), kept_chunks=len(chunks), kept_in_full=0, sampled_strata=0,
+                            budget=max_vectors, template_counts={str(k): v for k, v in template_counts.items()})
+    if len(chunks) <= max_vectors:
+        report.kept_in_full = len(chunks)
+        return list(range(len(chunks))), [1.0] * len(chunks), report
+
+    priority = [_keep_in_full(chunk, template_counts, rare_threshold) for chunk in chunks]
+    full = [i for i, p in enumerate(priority) if p]
+    if len(full) >= max_vectors:
+        # not even the important chunks fit, keep the most severe ones
+        full = sorted(sorted(full, key=lambda i: priority[i], reverse=True)[:max_vectors])
+        report.kept_in_full = report.kept_chunks = len(full)
+        return full, [1.0] * len(full), report
+
+    windows, _, _ = window_positions([chunk[0] for chunk in chunks], window_seconds, 2000, 1000)
+    strata: Dict[Tuple[int, int], List[int]] = {}
+    for i, p in enumerate(priority):
+        if not p:
+            strata.setdefault((int(windows[i]), chunks[i][0].template_id), []).append(i)
+
+    # every stratum gets one slot while the budget allows, the rest is shared in proportion to size
+    remaining = max_vectors - len(full)
+    keys = sorted(strata, key=lambda k: len(strata[k]), reverse=True)
+    quota = {k: 0 for k in keys}
+    for k in keys[:remaining]:
+        quota[k] = 1
+    spare = remaining - sum(quota.values())
+    if spare > 0:
+        extra = np.array([len(strata[k]) - quota[k] for k in keys], dtype=np.float64)
+        share = np.floor(extra / extra.sum() * spare).astype(int) if extra.sum() else np.zeros(len(keys), int)
+        for k, n in zip(keys, share):
+            quota[k] += int(n)
+
+    rng = random.Random(seed)
+    kept = {i: 1.0 for i in full}
+    for k in keys:
+        if not quota[k]:
+            continue
+        reservoir = Reservoir(quota[k], rng)
+        for i in strata[k]:
+            reservoir.add(i)
+        weight = len(strata[k]) / len(reservoir.items)
+        report.rates[f"{k[0]}:{k[1]}"] = 1.0 / weight
+        for i in reservoir.items:
+            kept[i] = weight
+
+    order = sorted(kept)
+    report.kept_chunks = len(order)
+    report.kept_in_full = len(full)
+    report.sampled_strata = sum(1 for k in keys if quota[k])
+    return order, [kept[i] for i in order], report
+
+
+def annotate(text: str, weight: Optional[float]) -> str:
+    if weight and weight > 1:
+        return f"[sampled: stands for ~{math.ceil(weight)} similar records]\n{text}"
+    return text
@@ -0,0 +1,220 @@
+import json
+import math
+import mmap
+import os
+import pickle
+import shutil
+import socket
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from utils.chunk_store import group_records
+from utils.log_parser import LogRecord, is_continuation, iter_records
+
+DEFAULT_SHARD_BYTES = 64 << 20
+
+
+def shard_boundaries(path: str, shard_bytes: int = DEFAULT_SHARD_BYTES) -> List[int]:
+    """
+    Byte offsets splitting a file into ranges of about shard_bytes. Every
+    boundary is the start of a record, never a continuation line, so shards
+    parse independently into exactly the records of a whole-file parse.
+    """
+    size = os.path.getsize(path)
+    boundaries = [0]
+    if not size:
+        return boundaries + [0]
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        target = shard_bytes
+        while target < size:
+            data.seek(target)
+            data.readline()
+            # move past continuation lines so a stack trace stays with its record
+            while data.tell() < size:
+                position = data.tell()
+                line = data.readline().decode("utf-8", errors="replace").rstrip("\r\n")
+                if not is_continuation(line):
+                    data.seek(position)
+                    break
+            if data.tell() >= size:
+                break
+            if data.tell() > boundaries[-1]:
+                boundaries.append(data.tell())
+            target = max(target + shard_bytes, data.tell() + 1)
+    return boundaries + [size]
+
+
+@dataclass
+class ShardStats:
+    records: int = 0
+    bytes: int = 0
+    first_timestamp: Optional[float] = None
+    last_timestamp: Optional[float] = None
+    levels: Dict[str, int] = field(default_factory=dict)
+    templates: Dict[int, int] = field(default_factory=dict)
+
+    @classmethod
+    def of(cls, records: List[LogRecord]) -> "ShardStats":
+        stamps = [r.timestamp for r in records if not math.isnan(r.timestamp)]
+        return cls(records=len(records), bytes=sum(r.length for r in records),
+                   first_timestamp=min(stamps) if stamps else None, last_timestamp=max(stamps) if stamps else None,
+                   levels=dict(Counter(r.level for r in records if r.level)),
+                   templates=dict(Counter(r.template_id for r in records)))
+
+    @classmethod
+    def merge(cls, parts: List["ShardStats"]) -> "ShardStats":
+        firsts = [p.first_timestamp for p in parts if p.first_timestamp is not None]
+        lasts = [p.last_timestamp for p in parts if p.last_timestamp is not None]
+        levels, templates = Counter(), Counter()
+        for part in parts:
+            levels.update(part.levels)
+            templates.update(part.templates)
+        return cls(records=sum(p.records for p in parts), bytes=sum(p.bytes for p in parts),
+                   first_timestamp=min(firsts) if firsts else None, last_timestamp=max(lasts) if lasts else None,
+                   levels=dict(levels), templates=dict(templates))
+
+
+class WorkQueue:
+    """
+    Task queue in a directory. A task is claimed by renaming its file from
+    pending/ to claimed/, which is atomic on a local or shared POSIX filesystem,
+    so workers on several machines can drain the same queue.
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 600.0):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        for name in ("pending", "claimed", "done", "failed"):
+            os.makedirs(os.path.join(path, name), exist_ok=True)
+
+    def _file(self, state: str, name: str, suffix: str = ".json") -> str:
+        return os.path.join(self.path, state, name + suffix)
+
+    def put(self, name: str, task: dict):
+        tmp = self._file("pending", name, ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(task, f)
+        os.replace(tmp, self._file("pending", name))
+
+    def names(self, state: str) -> List[str]:
+        return sorted(n[:-5] for n in os.listdir(os.path.join(self.path, state)) if n.endswith(".json"))
+
+    def claim(self) -> Optional[Tuple[str, dict]]:
+        for name in self.names("pending"):
+            try:
+                os.rename(self._file("pending", name), self._file("claimed", name))
+            except FileNotFoundError:
+                continue  # another worker was faster
+            os.utime(self._file("claimed", name))
+            with open(self._file("claimed", name)) as f:
+                return name, json.load(f)
+        return None
+
+    def complete(self, name: str, result):
+        tmp = self._file("done", name, ".tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self._file("done", name, ".pkl"))
+        os.replace(self._file("claimed", name), self._file("done", name))
+
+    def fail(self, name: str, error: str):
+        with open(self._file("failed", name), "w") as f:
+            json.dump({"error": error, "worker": socket.gethostname()}, f)
+        os.remove(self._file("claimed", name))
+
+    def requeue_stale(self) -> int:
+        """Put tasks back whose worker stopped without finishing them within the lease."""
+        count = 0
+        for name in self.names("claimed"):
+            try:
+                if time.time() - os.path.getmtime(self._file("claimed", name)) > self.lease_seconds:
+                    os.rename(self._file("claimed", name), self._file("pending", name))
+                    count += 1
+            except FileNotFoundError:
+                continue
+        return count
+
+    def result(self, name: str):
+        with open(self._file("done", name, ".pkl"), "rb") as f:
+            return pickle.load(f)
+
+    def error(self, name: str) -> Optional[str]:
+        if not os.path.exists(self._file("failed", name)):
+            return None
+        with open(self._file("failed", name)) as f:
+            return json.load(f)["error"]
+
+
+def process_shard(task: dict) -> dict:
+    """Parse, template and chunk one byte range."""
+    records = list(iter_records(task["path"], task["start"], task["end"]))
+    return {"index": task["index"], "chunks": group_records(records, chunk_size=task["chunk_size"]),
+            "stats": ShardStats.of(records)}
+
+
+def run_worker(queue_path: str) -> int:
+    """Drain a queue, returns the number of shards this worker processed."""
+    queue = WorkQueue(queue_path)
+    processed = 0
+    while True:
+        claimed = queue.claim()
+        if claimed is None:
+            return processed
+        name, task = claimed
+        try:
+            queue.complete(name, process_shard(task))
+            processed += 1
+        except Exception as e:
+            queue.fail(name, repr(e))
+
+
+@dataclass
+class ShardedParse:
+    chunks: List[List[LogRecord]]
+    stats: ShardStats
+    shards: int
+
+    @property
+    def records(self) -> List[LogRecord]:
+        return [r for chunk in self.chunks for r in chunk]
+
+
+def parse_sharded(path: str, queue_path: str, workers: int = 4, shard_bytes: int = DEFAULT_SHARD_BYTES,
+                  chunk_size: int = 100, poll_seconds: float = 0.5, keep_queue: bool = False) -> ShardedParse:
+    """
+    Parse one file in record aligned shards on worker processes coordinated
+    through an on-disk queue. Results are merged in shard order, so the records
+    are exactly those of a single pass and chunks only differ in never spanning
+    a shard boundary.
+    """
+    boundaries = shard_boundaries(path, shard_bytes)
+    # results left by an earlier interrupted run would be merged as ours
+    shutil.rmtree(queue_path, ignore_errors=True)
+    queue = WorkQueue(queue_path)
+    names = [f"shard-{i:06d}" for i in range(len(boundaries) - 1)]
+    for i, name in enumerate(names):
+        queue.put(name, {"path": os.path.abspath(path), "start": boundaries[i], "end": boundaries[i + 1],
+                         "index": i, "chunk_size": chunk_size})
+
+    workers = max(1, min(workers, len(names)))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for future in [pool.submit(run_worker, queue_path) for _ in range(workers)]:
+            future.result()
+
+    # shards claimed by workers on other machines may still be running
+    while len(queue.names("done")) + len(queue.names("failed")) < len(names):
+        if queue.requeue_stale():
+            run_worker(queue_path)
+        time.sleep(poll_seconds)
+
+    failed = {name: queue.error(name) for name in names if queue.error(name)}
+    if failed:
+        raise RuntimeError(f"{len(failed)} shards failed: {failed}")
+    results = [queue.result(name) for name in names]
+    if not keep_queue:
+        shutil.rmtree(queue_path, ignore_errors=True)
+    return ShardedParse(chunks=[chunk for r in results for chunk in r["chunks"]],
+                        stats=ShardStats.merge([r["stats"] for r in results]), shards=len(names))
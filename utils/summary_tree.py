@@ -0,0 +1,182 @@
+import json
+import math
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
+from datetime import datetime, timezone
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.anomaly import window_positions
+from utils.log_parser import LogRecord, parse_timestamp
+
+_SUMMARY_QUESTION = re.compile(
+    r"\b(summar\w*|overview|overall|recap|tl;?dr|whole (log|file)|entire (log|file))\b",
+    re.IGNORECASE)
+_DATETIME = re.compile(r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}(?::\d{2})?")
+_TIME = re.compile(r"\b(\d{1,2}):(\d{2})(?::(\d{2}))?\b")
+
+
+@dataclass
+class Segment:
+    start: float
+    end: float
+    text: str
+    records: int
+
+
+@dataclass
+class SummaryNode:
+    level: int
+    start: float
+    end: float
+    summary: str
+    children: List[int] = field(default_factory=list)
+
+
+def is_summary_question(prompt: str) -> bool:
+    return bool(prompt and _SUMMARY_QUESTION.search(prompt))
+
+
+def compact_text(records: Sequence[LogRecord], max_chars: int) -> str:
+    """One line per template with its count and first example, severe templates first."""
+    groups = {}
+    for record in records:
+        group = groups.setdefault(record.template_id, [0, record])
+        group[0] += 1
+    severe = {"FATAL": 0, "ERROR": 1, "WARN": 2}
+    ordered = sorted(groups.values(), key=lambda g: severe.get(g[1].level, 3))
+    lines, size = [], 0
+    for count, example in ordered:
+        line = f"[{count}x] {example.text.split(chr(10), 1)[0]}"
+        if size + len(line) > max_chars:
+            lines.append(f"... {len(ordered) - len(lines)} more event types")
+            break
+        lines.append(line)
+        size += len(line) + 1
+    return "\n".join(lines)
+
+
+def segment_records(records: Sequence[LogRecord], mode: str = "time", window_seconds: float = 300.0,
+                    max_segments: int = 64, max_chars: int = 6000) -> List[Segment]:
+    if not records:
+        return []
+    windows, edges, _ = window_positions(records, window_seconds, max_segments, window_records=1000)
+
+    if mode == "time":
+        segments = []
+        for w in range(len(edges) - 1):
+            members = [records[i] for i in np.nonzero(windows == w)[0]]
+            if members:
+                segments.append(Segment(start=float(edges[w]), end=float(edges[w + 1]),
+                                        text=compact_text(members, max_chars), records=len(members)))
+        return segments
+
+    if mode == "template":
+        by_template = {}
+        for record in records:
+            by_template.setdefault(record.template_id, []).append(record)
+        groups = sorted(by_template.values(), key=len, reverse=True)
+        per_segment = max(1, math.ceil(len(groups) / max_segments))
+        start, end = float(edges[0]), float(edges[-1])
+        segments = []
+        for i in range(0, len(groups), per_segment):
+            members = [r for group in groups[i:i + per_segment] for r in group]
+            segments.append(Segment(start=start, end=end, text=compact_text(members, max_chars),
+                                    records=len(members)))
+        return segments
+
+    raise ValueError("mode must be 'time' or 'template'")
+
+
+class SummaryTree:
+    """Summaries of log segments reduced level by level up to a single root."""
+
+    def __init__(self, levels: List[List[SummaryNode]], source: Optional[str] = None):
+        self.levels = levels
+        self.source = source
+
+    @property
+    def root(self) -> Optional[SummaryNode]:
+        return self.levels[-1][0] if self.levels and self.levels[-1] else None
+
+    @classmethod
+    def build(cls, segments: Sequence[Segment], summarize: Callable[[str], str], workers: int = 4,
+              fan_in: int = 8, source: Optional[str] = None) -> "SummaryTree":
+        if not segments:
+            return cls([], source)
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            summaries = list(pool.map(summarize, [s.text for s in segments]))
+            level = [SummaryNode(level=0, start=s.start, end=s.end, summary=text)
+                     for s, text in zip(segments, summaries)]
+            levels = [level]
+            while len(level) > 1:
+                groups = [list(range(i, min(i + fan_in, len(level)))) for i in range(0, len(level), fan_in)]
+                texts = ["\n\n".join(f"{_format_range(level[c].start, level[c].end)}\n{level[c].summary}" for c in group)
+                         for group in groups]
+                summaries = list(pool.map(summarize, texts))
+                level = [SummaryNode(level=len(levels), start=min(level[c].start for c in group),
+                                     end=max(level[c].end for c in group), summary=text, children=group)
+                         for group, text in zip(groups, summaries)]
+                levels.append(level)
+        return cls(levels, source)
+
+    def covering(self, start: Optional[float] = None, end: Optional[float] = None) -> List[SummaryNode]:
+        """Smallest set of nodes whose time spans cover [start, end), the root for the whole log."""
+        if self.root is None:
+            return []
+        start = -math.inf if start is None else start
+        end = math.inf if end is None else end
+
+        found = []
+
+        def visit(node: SummaryNode):
+            if node.end <= start or node.start >= end:
+                return
+            if (node.start >= start and node.end <= end) or not node.children:
+                found.append(node)
+                return
+            for child in node.children:
+                visit(self.levels[node.level - 1][child])
+
+        visit(self.root)
+        return found
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"source": self.source, "levels": [[asdict(n) for n in level] for level in self.levels]}, f)
+
+    @classmethod
+    def load(cls, path: str) -> "SummaryTree":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls([[SummaryNode(**n) for n in level] for level in data["levels"]], data.get("source"))
+
+
+def _format_range(start: float, end: float) -> str:
+    if start > 1e8:
+        fmt = lambda v: datetime.fromtimestamp(v, tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        return f"{fmt(start)} - {fmt(end)}"
+    return f"records {int(start)} - {int(end)}"
+
+
+def node_label(node: SummaryNode) -> str:
+    return _format_range(node.start, node.end)
+
+
+def parse_time_range(prompt: str, reference: Optional[float] = None) -> Tuple[Optional[float], Optional[float]]:
+    """Find a time range in a question, bare HH:MM times are taken on the day of the reference timestamp."""
+    stamps = [parse_timestamp(m.group(0) + (":00" if m.group(0).count(":") == 1 else ""))
+              for m in _DATETIME.finditer(prompt)]
+    if not stamps and reference is not None and reference > 1e8:
+        day = math.floor(reference / 86400) * 86400
+        stamps = [day + int(h) * 3600 + int(m) * 60 + int(s or 0) for h, m, s in _TIME.findall(prompt)]
+    stamps = sorted(s for s in stamps if not math.isnan(s))
+    if len(stamps) >= 2:
+        return stamps[0], stamps[-1]
+    if len(stamps) == 1:
+        return stamps[0], stamps[0] + 3600
+    return None, None
@@ -0,0 +1,154 @@
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import Executor, Future, wait as wait_futures
+from dataclasses import dataclass, asdict, field
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from utils.record_cache import fingerprint
+
+DEFAULT_TRIAGE_QUESTIONS = [
+    "Summarize the errors in this log.",
+    "What is the most likely root cause of the failures?",
+    "Give a timeline of the main events.",
+]
+
+Answer = Tuple[str, List[str], List[str]]
+
+
+def load_questions(questions: Optional[Union[str, Sequence[str]]] = None) -> List[str]:
+    """Triage questions from a list, from a file with one question per line, or the defaults."""
+    if questions is None:
+        return list(DEFAULT_TRIAGE_QUESTIONS)
+    if isinstance(questions, str):
+        with open(questions, encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+    return list(questions)
+
+
+def normalize(question: str) -> str:
+    return re.sub(r"\s+", " ", question.strip().lower()).rstrip("?.! ")
+
+
+@dataclass
+class TriageAnswer:
+    question: str
+    answer: str
+    sources: List[str] = field(default_factory=list)
+    contexts: List[str] = field(default_factory=list)
+    seconds: float = 0.0
+    answered_at: float = field(default_factory=time.time)
+
+
+class TriageSet:
+    """
+    Answers to the triage questions about one ingested file, computed in the
+    background and saved next to the index after each answer.
+    """
+
+    def __init__(self, path: str, file_path: str, questions: Sequence[str]):
+        self.path = path
+        self.file_path = file_path
+        self.questions = list(questions)
+        self.fingerprint = fingerprint(file_path) if os.path.exists(file_path) else None
+        self.answers: Dict[str, TriageAnswer] = {}
+        self.errors: Dict[str, str] = {}
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str) -> "TriageSet":
+        with open(path) as f:
+            data = json.load(f)
+        triage = cls.__new__(cls)
+        triage.path = path
+        triage.file_path = data["file_path"]
+        triage.questions = data["questions"]
+        triage.fingerprint = data["fingerprint"]
+        triage.answers = {normalize(a["question"]): TriageAnswer(**a) for a in data["answers"]}
+        triage.errors = {}
+        triage._futures = {}
+        triage._lock = threading.Lock()
+        return triage
+
+    def is_current(self) -> bool:
+        """Whether the log still exists with the contents the answers were computed from."""
+        return os.path.exists(self.file_path) and fingerprint(self.file_path) == self.fingerprint
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._lock:
+            data = {"file_path": self.file_path, "fingerprint": self.fingerprint, "questions": self.questions,
+                    "answers": [asdict(a) for a in self.answers.values()]}
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+
+    def start(self, answer: Callable[[str], Answer], executor: Executor, refresh: bool = False):
+        """Submit every question that has no answer yet, or all of them on refresh."""
+        with self._lock:
+            for question in self.questions:
+                key = normalize(question)
+                running = key in self._futures and not self._futures[key].done()
+                if running or (key in self.answers and not refresh):
+                    continue
+                self.errors.pop(key, None)
+                self._futures[key] = executor.submit(self._run, question, answer)
+
+    def _run(self, question: str, answer: Callable[[str], Answer]) -> Optional[TriageAnswer]:
+        start = time.perf_counter()
+        try:
+            text, sources, contexts = answer(question)
+        except Exception as e:
+            print(f"triage question failed : {question} {e}")
+            with self._lock:
+                self.errors[normalize(question)] = str(e)
+            return None
+        result = TriageAnswer(question=question, answer=text, sources=sources, contexts=contexts,
+                              seconds=time.perf_counter() - start)
+        with self._lock:
+            self.answers[normalize(question)] = result
+        self.save()
+        return result
+
+    def get(self, question: str, timeout: Optional[float] = None) -> Optional[TriageAnswer]:
+        """The answer to a triage question, waiting for it when it is being computed right now."""
+        key = normalize(question)
+        with self._lock:
+            future = self._futures.get(key)
+            answer = self.answers.get(key)
+        if future is not None and not future.done():
+            # the same question is already in flight, waiting is faster than asking again
+            return future.result(timeout)
+        return answer
+
+    def peek(self, question: str) -> Optional[TriageAnswer]:
+        """The stored answer, never waits."""
+        with self._lock:
+            return self.answers.get(normalize(question))
+
+    def status(self) -> Dict[str, str]:
+        with self._lock:
+            states = {}
+            for question in self.questions:
+                key = normalize(question)
+                future = self._futures.get(key)
+                if future is not None and not future.done():
+                    states[question] = "running"
+                elif key in self.errors:
+                    states[question] = "failed"
+                else:
+                    states[question] = "ready" if key in self.answers else "pending"
+            return states
+
+    def wait(self, timeout: Optional[float] = None):
+        with self._lock:
+            futures = list(self._futures.values())
+        wait_futures(futures, timeout)
+
+    @property
+    def done(self) -> bool:
+        return all(state in ("ready", "failed") for state in self.status().values())
@@ -0,0 +1,226 @@
+import mmap
+import os
+import re
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # python < 3.11
+    import sre_parse
+
+_LOWER = np.arange(256, dtype=np.uint8)
+_LOWER[ord("A"):ord("Z") + 1] += 32
+_NEWLINE = 10
+_BUILD_BYTES = 16 << 20
+
+_QUOTED = re.compile(r"[\"'`“‘]([^\"'`”’]{2,})[\"'`”’]")
+_SLASHED = re.compile(r"(?:^|\s)/(.+)/(?:\s|$)")
+_GREP = re.compile(r"\bgrep(?: for)?\s+(\S+)", re.IGNORECASE)
+_EXPLICIT = re.compile(r"\b(?:containing|contains|matching|match|lines with|occurrences? of|"
+                       r"search for|find)\s+(?:the\s+)?(?:string\s+|text\s+|pattern\s+|regex\s+)?(\S+)", re.IGNORECASE)
+# after generic verbs like "find" only codes and ids are searched, not words of an ordinary question
+_LITERAL = re.compile(r"\d|[\-_.:=/@#]|^[A-Z]{3,}$")
+_REGEX_WORD = re.compile(r"\bregex\b|\bpattern\b", re.IGNORECASE)
+_IDENTIFIER = re.compile(r"\b(?=[\w\-.:]*\d)(?=[\w\-.:]*[A-Za-z])[\w][\w\-.:]{3,}\b")
+_WHERE = re.compile(r"\b(where|which lines?|show|list|appear|occur|mention)", re.IGNORECASE)
+
+
+@dataclass
+class GrepIntent:
+    pattern: str
+    regex: bool
+    explicit: bool
+
+
+@dataclass
+class Hit:
+    line: int
+    offset: int
+    text: str
+
+
+def trigram_keys(data: np.ndarray) -> np.ndarray:
+    data = data.astype(np.uint32)
+    return (data[:-2] << 16) | (data[1:-1] << 8) | data[2:]
+
+
+def required_literals(pattern: str) -> Optional[List[str]]:
+    """Literal runs every match of the regex must contain, None when the pattern can not be narrowed."""
+    try:
+        parsed = sre_parse.parse(pattern)
+    except re.error:
+        return None
+    literals, current = [], []
+    for op, arg in parsed:
+        if op is sre_parse.LITERAL:
+            current.append(chr(arg))
+            continue
+        if current:
+            literals.append("".join(current))
+            current = []
+        if op is sre_parse.BRANCH:
+            # a top level alternation has no literal every match needs
+            return None
+    if current:
+        literals.append("".join(current))
+    literals = [l for l in literals if len(l) >= 3]
+    return literals or None
+
+
+def grep_intent(prompt: str) -> Optional[GrepIntent]:
+    """Detect literal / regex lookup questions like "show lines containing ORA-00060"."""
+    intent = _detect(prompt)
+    if intent and intent.regex:
+        try:
+            re.compile(intent.pattern)
+        except re.error:
+            intent.regex = False
+    return intent
+
+
+def _detect(prompt: str) -> Optional[GrepIntent]:
+    if not prompt:
+        return None
+    slashed = _SLASHED.search(prompt)
+    if slashed:
+        return GrepIntent(slashed.group(1), regex=True, explicit=True)
+    quoted = _QUOTED.search(prompt)
+    if quoted:
+        return GrepIntent(_strip_ellipsis(quoted.group(1)), regex=bool(_REGEX_WORD.search(prompt)), explicit=True)
+    for verb, needs_literal in ((_GREP, False), (_EXPLICIT, True)):
+        explicit = verb.search(prompt)
+        operand = _strip_ellipsis(explicit.group(1)).rstrip("?.,") if explicit else ""
+        if len(operand) >= 3 and (not needs_literal or _LITERAL.search(operand)):
+            return GrepIntent(operand, regex=bool(_REGEX_WORD.search(prompt)), explicit=True)
+    identifier = _IDENTIFIER.search(prompt.replace("…", " "))
+    if identifier and _WHERE.search(prompt):
+        return GrepIntent(_strip_ellipsis(identifier.group(0)).rstrip("?.,:"), regex=False, explicit=False)
+    return None
+
+
+def _strip_ellipsis(text: str) -> str:
+    return text.rstrip("…").removesuffix("...").strip()
+
+
+class TrigramIndex:
+    """
+    Case-insensitive trigram index over blocks of lines of one log file.
+    Postings are stored CSR style: sorted trigram keys, their start positions and
+    the block numbers, so the whole index is three numpy arrays.
+    """
+
+    def __init__(self, file_path: str, keys: np.ndarray, starts: np.ndarray, postings: np.ndarray,
+                 block_offsets: np.ndarray, lines_per_block: int):
+        self.file_path = file_path
+        self.keys = keys
+        self.starts = starts
+        self.postings = postings
+        self.block_offsets = block_offsets
+        self.lines_per_block = lines_per_block
+        self._map = None
+
+    @classmethod
+    def build(cls, file_path: str, lines_per_block: int = 16) -> "TrigramIndex":
+        size = os.path.getsize(file_path)
+        data = np.memmap(file_path, dtype=np.uint8, mode="r") if size else np.empty(0, dtype=np.uint8)
+        pairs, line_starts = [], [np.zeros(1, dtype=np.int64)]
+        start, base_line = 0, 0
+        while start < size:
+            end = min(size, start + _BUILD_BYTES)
+            if end < size:
+                # cut at a newline so no line spans two passes
+                cut = np.flatnonzero(data[end:min(size, end + (1 << 20))] == _NEWLINE)
+                end = end + int(cut[0]) + 1 if len(cut) else min(size, end + (1 << 20))
+            chunk = _LOWER[data[start:end]]
+            newline = chunk == _NEWLINE
+            line = base_line + np.cumsum(newline) - newline
+            line_starts.append(start + np.flatnonzero(newline).astype(np.int64) + 1)
+            if len(chunk) >= 3:
+                valid = ~(newline[:-2] | newline[1:-1] | newline[2:])
+                blocks = (line[:-2][valid] // lines_per_block).astype(np.uint64)
+                pairs.append(np.unique((trigram_keys(chunk)[valid].astype(np.uint64) << np.uint64(32)) | blocks))
+            base_line += int(newline.sum())
+            start = end
+
+        merged = np.unique(np.concatenate(pairs)) if pairs else np.empty(0, dtype=np.uint64)
+        keys, starts = np.unique((merged >> np.uint64(32)).astype(np.uint32), return_index=True)
+        line_starts = np.concatenate(line_starts)
+        line_starts = line_starts[line_starts < size] if size else line_starts[:0]
+        return cls(file_path, keys, starts.astype(np.int64), (merged & np.uint64(0xFFFFFFFF)).astype(np.uint32),
+                   line_starts[::lines_per_block].copy(), lines_per_block)
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez_compressed(path, keys=self.keys, starts=self.starts, postings=self.postings,
+                            block_offsets=self.block_offsets, lines_per_block=self.lines_per_block,
+                            file_path=self.file_path)
+
+    @classmethod
+    def load(cls, path: str) -> "TrigramIndex":
+        data = np.load(path)
+        return cls(str(data["file_path"]), data["keys"], data["starts"], data["postings"], data["block_offsets"],
+                   int(data["lines_per_block"]))
+
+    @property
+    def nbytes(self) -> int:
+        return self.keys.nbytes + self.starts.nbytes + self.postings.nbytes + self.block_offsets.nbytes
+
+    def _posting(self, key: int) -> np.ndarray:
+        i = np.searchsorted(self.keys, key)
+        if i >= len(self.keys) or self.keys[i] != key:
+            return np.empty(0, dtype=np.uint32)
+        end = self.starts[i + 1] if i + 1 < len(self.starts) else len(self.postings)
+        return self.postings[self.starts[i]:end]
+
+    def candidate_blocks(self, literals: Optional[List[str]]) -> np.ndarray:
+        all_blocks = np.arange(len(self.block_offsets), dtype=np.uint32)
+        if not literals:
+            return all_blocks
+        keys = set()
+        for literal in literals:
+            encoded = _LOWER[np.frombuffer(literal.encode("utf-8"), dtype=np.uint8)]
+            if len(encoded) >= 3:
+                keys.update(int(k) for k in trigram_keys(encoded))
+        if not keys:
+            return all_blocks
+        postings = sorted((self._posting(k) for k in keys), key=len)
+        candidates = postings[0]
+        for posting in postings[1:]:
+            if not len(candidates):
+                break
+            candidates = np.intersect1d(candidates, posting, assume_unique=True)
+        return candidates
+
+    def _block_bytes(self, block: int) -> bytes:
+        if self._map is None:
+            with open(self.file_path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(self.file_path) else b""
+        start = int(self.block_offsets[block])
+        end = int(self.block_offsets[block + 1]) if block + 1 < len(self.block_offsets) else len(self._map)
+        return self._map[start:end]
+
+    def search(self, pattern: str, regex: bool = False, ignore_case: bool = True, limit: int = 200) -> List[Hit]:
+        """Trigram candidate filtering followed by exact verification of the candidate lines."""
+        if regex:
+            matcher = re.compile(pattern, re.IGNORECASE if ignore_case else 0)
+            literals = required_literals(pattern)
+            test = lambda line: matcher.search(line) is not None
+        else:
+            needle = pattern.lower() if ignore_case else pattern
+            literals = [pattern]
+            test = (lambda line: needle in line.lower()) if ignore_case else (lambda line: needle in line)
+
+        hits = []
+        for block in self.candidate_blocks(literals):
+            offset = int(self.block_offsets[block])
+            for i, raw in enumerate(self._block_bytes(int(block)).split(b"\n")):
+                line = raw.decode("utf-8", errors="replace").rstrip("\r")
+                if line and test(line):
+                    hits.append(Hit(line=int(block) * self.lines_per_block + i, offset=offset, text=line))
+                    if len(hits) >= limit:
+                        return hits
+                offset += len(raw) + 1
+        return hits
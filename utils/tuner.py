@@ -0,0 +1,154 @@
+import itertools
+import json
+import time
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from langchain_community.document_loaders import TextLoader
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import InMemoryVectorStore
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from utils.chunk_store import group_records
+from utils.log_parser import parse_file
+from utils.retrieval_config import RetrievalConfig
+
+DEFAULT_GRID = {
+    "chunk_size": [100, 250, 500, 1000],
+    "chunk_overlap": [0, 50],
+    "search_type": ["similarity", "mmr"],
+    "k": [4, 8],
+    "fetch_k": [20, 50],
+    "lambda_mult": [0.25, 0.5, 0.75],
+}
+
+
+@dataclass
+class TuningResult:
+    config: RetrievalConfig
+    recall: float
+    vectors: int
+    ingest_seconds: float
+    query_seconds: float
+
+    def to_dict(self) -> dict:
+        return {**asdict(self.config), "recall": self.recall, "vectors": self.vectors,
+                "ingest_seconds": self.ingest_seconds, "query_seconds": self.query_seconds}
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeds each distinct text once per sweep, chunkings and retriever settings share vectors."""
+
+    def __init__(self, embeddings: Embeddings):
+        self.embeddings = embeddings
+        self._documents: Dict[str, List[float]] = {}
+        self._queries: Dict[str, List[float]] = {}
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        missing = list(dict.fromkeys(t for t in texts if t not in self._documents))
+        if missing:
+            self._documents.update(zip(missing, self.embeddings.embed_documents(missing)))
+        return [self._documents[t] for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        if text not in self._queries:
+            self._queries[text] = self.embeddings.embed_query(text)
+        return self._queries[text]
+
+
+def read_pairs(path: str) -> List[Tuple[str, str]]:
+    """JSON lines with a question and the log line (or a distinctive part of it) that answers it."""
+    pairs = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                pairs.append((record["question"], record["expected"]))
+    return pairs
+
+
+def expand_grid(grid: Optional[dict] = None) -> Tuple[List[Tuple[int, int]], List[dict]]:
+    """Valid (chunk_size, overlap) pairs and distinct retriever settings of a grid."""
+    grid = {**DEFAULT_GRID, **(grid or {})}
+    chunkings = [(size, overlap) for size, overlap in itertools.product(grid["chunk_size"], grid["chunk_overlap"])
+                 if overlap < size]
+    retrievers = []
+    for search_type, k in itertools.product(grid["search_type"], grid["k"]):
+        if search_type == "similarity":
+            retrievers.append({"search_type": search_type, "k": k})
+            continue
+        for fetch_k, lambda_mult in itertools.product(grid["fetch_k"], grid["lambda_mult"]):
+            if fetch_k >= k:
+                retrievers.append({"search_type": search_type, "k": k, "fetch_k": fetch_k, "lambda_mult": lambda_mult})
+    return chunkings, retrievers
+
+
+def sweep(file_path: str, pairs: Sequence[Tuple[str, str]], embeddings: Embeddings,
+          grid: Optional[dict] = None, records: bool = False) -> List[TuningResult]:
+    """
+    Ingest the sample once per chunking and score every retriever setting on the question set.
+    With records the sample is chunked like ingest does with the chunk store, record cache, budgets or
+    shards: whole records grouped by group_records, which has no overlap, so only overlap 0 is swept.
+    """
+    cached = CachedEmbeddings(embeddings)
+    docs = TextLoader(file_path).load()
+    parsed = parse_file(file_path) if records else None
+    chunkings, retrievers = expand_grid(grid)
+    if records:
+        chunkings = list(dict.fromkeys((size, 0) for size, _ in chunkings))
+    results = []
+    for chunk_size, chunk_overlap in chunkings:
+        start = time.perf_counter()
+        if records:
+            chunks = [Document(page_content="\n".join(r.text for r in group), metadata={"source": file_path})
+                      for group in group_records(parsed, chunk_size=chunk_size)]
+        else:
+            chunks = RecursiveCharacterTextSplitter(chunk_size=chunk_size,
+                                                    chunk_overlap=chunk_overlap).split_documents(docs)
+        store = InMemoryVectorStore(embedding=cached)
+        store.add_documents(chunks)
+        ingest_seconds = time.perf_counter() - start
+
+        for settings in retrievers:
+            config = RetrievalConfig(chunk_size=chunk_size, chunk_overlap=chunk_overlap, **settings)
+            retriever = store.as_retriever(search_type=config.search_type, search_kwargs=config.search_kwargs())
+            hits, start = 0, time.perf_counter()
+            for question, expected in pairs:
+                found = retriever.invoke(question)
+                hits += any(expected in d.page_content for d in found)
+            query_seconds = (time.perf_counter() - start) / max(1, len(pairs))
+            results.append(TuningResult(config=config, recall=hits / max(1, len(pairs)), vectors=len(chunks),
+                                        ingest_seconds=ingest_seconds, query_seconds=query_seconds))
+    return results
+
+
+def pareto_front(results: Sequence[TuningResult]) -> List[TuningResult]:
+    """Settings no other setting beats on recall, vectors and query latency at once."""
+    def dominates(a: TuningResult, b: TuningResult) -> bool:
+        no_worse = a.recall >= b.recall and a.vectors <= b.vectors and a.query_seconds <= b.query_seconds
+        better = a.recall > b.recall or a.vectors < b.vectors or a.query_seconds < b.query_seconds
+        return no_worse and better
+
+    return [r for r in results if not any(dominates(other, r) for other in results)]
+
+
+def recommend(results: Sequence[TuningResult], recall_tolerance: float = 0.0) -> Optional[TuningResult]:
+    """Cheapest Pareto-optimal setting whose recall is within tolerance of the best one."""
+    front = pareto_front(results)
+    if not front:
+        return None
+    best = max(r.recall for r in front)
+    candidates = [r for r in front if r.recall >= best - recall_tolerance]
+    return min(candidates, key=lambda r: (r.vectors, r.query_seconds, -r.recall))
+
+
+def format_report(results: Sequence[TuningResult], recommended: Optional[TuningResult] = None) -> str:
+    front = {id(r) for r in pareto_front(results)}
+    lines = [f"{'setting':<44}{'recall':>8}{'vectors':>9}{'ingest s':>10}{'query ms':>10}"]
+    for r in sorted(results, key=lambda r: (-r.recall, r.vectors, r.query_seconds)):
+        mark = "*" if r is recommended else ("+" if id(r) in front else " ")
+        lines.append(f"{mark} {r.config.describe():<42}{r.recall:>8.2f}{r.vectors:>9}{r.ingest_seconds:>10.2f}"
+                     f"{r.query_seconds * 1000:>10.1f}")
+    lines.append("+ Pareto-optimal, * recommended")
+    return "\n".join(lines)